@@ -0,0 +1,49 @@
+"""Memory used per cached guild, before and after the slotted Server model.
+
+Run from the repository root: python -m bench.models
+"""
+
+import tracemalloc
+
+from spicier.models import GuildState, Server
+
+GUILDS = 100_000
+
+
+class DictServer:
+    """The Server model as it was before __slots__"""
+
+    def __init__(self, server_id, channel=None, prefix=None):
+        self.server_id = server_id
+        self.channel = channel
+        self.prefix = prefix
+
+
+def measure(factory) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    objects = [factory(1 << 60 | i) for i in range(GUILDS)]
+
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del objects
+
+    return size / GUILDS
+
+
+def main():
+    results = {
+        "dict Server": measure(lambda i: DictServer(i, i, "!")),
+        "slotted Server": measure(lambda i: Server(i, i, "!", "en")),
+        "slotted GuildState": measure(lambda i: GuildState(i, Server(i, i, "!"))),
+    }
+
+    for name, size in results.items():
+        print(f"{name:<20} {size:8.1f} bytes/guild")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Memory used per queued track, full wavelink tracks against queue entries.
+
+Run from the repository root: python -m bench.queue
+"""
+
+import json
+import tracemalloc
+
+import wavelink
+
+from spicier.models import QueueEntry
+from spicier.models.track import encode_track
+
+TRACKS = 10_000
+
+
+def info(i: int) -> dict:
+    identifier = f"{i:011d}"
+    return {
+        "identifier": identifier,
+        "isSeekable": True,
+        "author": f"Some Artist {i}",
+        "length": 180_000 + i,
+        "isStream": False,
+        "position": 0,
+        "title": f"Some Artist {i} - A Song Title Of Usual Length (Official Video)",
+        "uri": f"https://www.youtube.com/watch?v={identifier}",
+        "sourceName": "youtube",
+    }
+
+
+def measure(factory) -> float:
+    # Each track is built from a parsed response, what it keeps of the
+    # response stays allocated once the response itself is dropped
+    responses = [
+        json.dumps({"track": encode_track(info(i)), "info": info(i)})
+        for i in range(TRACKS)
+    ]
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    objects = []
+    for response in responses:
+        entry = json.loads(response)
+        objects.append(factory(entry["track"], entry["info"]))
+    del entry
+
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del objects
+
+    return size / TRACKS
+
+
+def main():
+    results = {
+        "YouTubeTrack": measure(lambda id, info: wavelink.YouTubeTrack(id, info)),
+        "QueueEntry": measure(lambda id, info: QueueEntry.from_info(id, info, 1 << 60)),
+    }
+
+    for name, size in results.items():
+        print(f"{name:<20} {size:8.1f} bytes/track")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,16 @@ from .cache import Cache
 from .config import Config
 from .core import EventHandler, tools
 from .database import Database
-from .manager import ServerManager
+from .manager import (
+    HistoryManager,
+    IdleManager,
+    NodeManager,
+    QueueManager,
+    SearchManager,
+    ServerManager,
+    SkipManager,
+)
+from .metrics import Exporter
 
 
 class Setup:
@@ -15,16 +24,42 @@ class Setup:
 
     @staticmethod
     async def database(bot: commands.Bot):
-        """Sets up database"""
+        """Sets up database, the bot runs in degraded mode until it is ready"""
         database: Database = bot.db
         await database.start()
 
+        if not database.pool:
+            bot.logger.error(
+                "Database unavailable, running with default settings until it is up"
+            )
+            return
+
         try:
             await database.setup()
         except Exception as exception:
-            raise exception
+            bot.logger.error(f"Database setup failed: {exception}")
+
+    @staticmethod
+    async def cache(bot: commands.Bot):
+        """Warms up the server cache for every guild the bot is in"""
+        await bot.wait_until_ready()
+        await bot.db.wait_until_ready()
 
-        assert database.pool, "Database was not initialized correctly!"
+        warmed = await bot.server_manager.warm(guild.id for guild in bot.guilds)
+        bot.logger.info(f"Warmed up cache for {warmed} servers")
+
+    @staticmethod
+    async def metrics(bot: commands.Bot):
+        """Serves the metrics for Prometheus, when a port is configured"""
+        options = bot.config.metrics
+
+        if not options["port"]:
+            return
+
+        try:
+            await bot.exporter.start(options["host"], options["port"])
+        except OSError as exception:
+            bot.logger.error(f"Failed to start metrics exporter: {exception}")
 
     @staticmethod
     async def events(bot: commands.Bot):
@@ -35,6 +70,25 @@ class Setup:
     async def managers(bot: commands.Bot):
         """Sets up managers"""
         bot.server_manager = ServerManager(bot.cache, bot.db, bot.config)
+        await bot.server_manager.start()
+
+        bot.queue_manager = QueueManager(bot, bot.db, bot.config)
+        await bot.queue_manager.start()
+
+        bot.skip_manager = SkipManager(bot.db, bot.config)
+        await bot.skip_manager.start()
+
+        bot.history_manager = HistoryManager(bot.db, bot.config)
+        await bot.history_manager.start()
+
+        bot.search_manager = SearchManager(bot.db, bot.config)
+        await bot.search_manager.start()
+
+        bot.node_manager = NodeManager(bot, bot.config)
+        await bot.node_manager.start()
+
+        bot.idle_manager = IdleManager(bot, bot.config)
+        await bot.idle_manager.start()
 
     @staticmethod
     async def cogs(bot: commands.Bot):
@@ -50,19 +104,27 @@ class SpicerBot(commands.Bot):
     config: Config
     cache: Cache
     db: Database
+    exporter: Exporter
 
     COGS_DIR = "spicier/cogs"
 
     server_manager: ServerManager
+    queue_manager: QueueManager
+    skip_manager: SkipManager
+    history_manager: HistoryManager
+    search_manager: SearchManager
+    node_manager: NodeManager
+    idle_manager: IdleManager
 
     def __init__(self):
         self.handler = None
         self.logger = None
 
         self.config = Config()
-        self.cache = Cache()
+        self.cache = Cache.from_config(self.config.cache)
 
-        self.db = Database(self.config.database)
+        self.db = Database(self.config.database, self.config.database_options)
+        self.exporter = Exporter()
 
         super().__init__(**self.params)
 
@@ -85,14 +147,45 @@ class SpicerBot(commands.Bot):
 
     async def setup_hook(self):
         """Sets up the bot"""
-        await Setup.database(self)
+        # Runs alongside gateway login and Lavalink node creation
+        self.loop.create_task(Setup.database(self))
+
+        await Setup.metrics(self)
         await Setup.managers(self)
         await Setup.events(self)
         await Setup.cogs(self)
 
+        self.loop.create_task(Setup.cache(self))
+
     async def close(self):
         """Raises when bot is closing"""
         self.logger.info("Closing bot...")
+
+        if hasattr(self, "idle_manager"):
+            await self.idle_manager.close()
+
+        if hasattr(self, "node_manager"):
+            await self.node_manager.close()
+
+        if hasattr(self, "queue_manager"):
+            await self.queue_manager.close()
+
+        if hasattr(self, "skip_manager"):
+            await self.skip_manager.close()
+
+        if hasattr(self, "history_manager"):
+            await self.history_manager.close()
+
+        if hasattr(self, "search_manager"):
+            await self.search_manager.close()
+
+        if hasattr(self, "server_manager"):
+            await self.server_manager.close()
+
+        await self.db.close()
+        await self.cache.close()
+        await self.exporter.close()
+
         await super().close()
 
     async def on_message(self, msg):
@@ -108,10 +201,4 @@ class SpicerBot(commands.Bot):
         if not message.guild:
             return self.config.prefix
 
-        prefix = await self.server_manager.get_prefix(message.guild.id)
-
-        if prefix:
-            return prefix
-
-        await self.server_manager.set_prefix(message.guild.id, self.config.prefix)
-        return self.config.prefix
+        return await self.server_manager.get_prefix(message.guild.id)
@@ -0,0 +1,5 @@
+from .backend import CacheBackend, CacheStats
+from .cache import Cache
+from .lru import LRUBackend
+from .redis import RedisBackend
+from .shared import SharedMemoryBackend
@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+from typing import Optional, Protocol
+
+from spicier.models import Server
+
+
+@dataclass
+class CacheStats:
+    """Counters reported by every cache backend"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class CacheBackend(Protocol):
+    """Storage used by Cache
+
+    Shared backends are visible to every bot process on every host, so their
+    entries don't have to be invalidated when another process changes a server.
+    """
+
+    maxsize: int
+    shared: bool
+
+    async def get(self, key: int) -> Optional[Server]: ...
+
+    async def set(self, key: int, server: Server) -> None: ...
+
+    async def delete(self, key: int) -> None: ...
+
+    async def clear(self) -> None: ...
+
+    async def stats(self) -> CacheStats: ...
+
+    async def close(self) -> None: ...
@@ -0,0 +1,56 @@
+from spicier.errors import BadConfig
+from spicier.models import Server
+
+from .backend import CacheBackend, CacheStats
+from .lru import LRUBackend
+from .redis import RedisBackend
+from .shared import SharedMemoryBackend
+
+
+class Cache:
+    """Server cache on top of a pluggable backend"""
+
+    def __init__(self, backend: CacheBackend = None):
+        self._backend = backend or LRUBackend()
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """Create the cache with the backend selected in the config"""
+        name = config.get("backend", "lru")
+
+        if name == "lru":
+            return cls(LRUBackend(config["size"]))
+
+        if name == "shared_memory":
+            return cls(SharedMemoryBackend(**config.get("shared_memory", {})))
+
+        if name == "redis":
+            return cls(RedisBackend(maxsize=config["size"], **config.get("redis", {})))
+
+        raise BadConfig(ValueError(f"Unknown cache backend: {name}"))
+
+    @property
+    def maxsize(self) -> int:
+        return self._backend.maxsize
+
+    @property
+    def shared(self) -> bool:
+        return self._backend.shared
+
+    async def get_server(self, server_id: int) -> Server:
+        return await self._backend.get(server_id)
+
+    async def set_server(self, server_id: int, server: Server):
+        await self._backend.set(server_id, server)
+
+    async def expire_server(self, server_id: int):
+        await self._backend.delete(server_id)
+
+    async def clear(self):
+        await self._backend.clear()
+
+    async def stats(self) -> CacheStats:
+        return await self._backend.stats()
+
+    async def close(self):
+        await self._backend.close()
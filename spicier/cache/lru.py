@@ -0,0 +1,55 @@
+from typing import Optional
+
+from cachetools import LRUCache
+
+from spicier.models import Server
+
+from .backend import CacheStats
+
+
+class _CountingLRUCache(LRUCache):
+    def __init__(self, maxsize: int, stats: CacheStats):
+        super().__init__(maxsize=maxsize)
+        self._stats = stats
+
+    def popitem(self):
+        # Only called by cachetools when the cache is full
+        self._stats.evictions += 1
+        return super().popitem()
+
+
+class LRUBackend:
+    """In-process LRU, entries are kept as objects"""
+
+    shared = False
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._stats = CacheStats()
+        self._servers = _CountingLRUCache(maxsize, self._stats)
+
+    async def get(self, key: int) -> Optional[Server]:
+        server = self._servers.get(key)
+
+        if server is None:
+            self._stats.misses += 1
+        else:
+            self._stats.hits += 1
+
+        return server
+
+    async def set(self, key: int, server: Server):
+        self._servers[key] = server
+
+    async def delete(self, key: int):
+        self._servers.pop(key, None)
+
+    async def clear(self):
+        # cachetools clears through popitem, which would count as evictions
+        self._servers = _CountingLRUCache(self.maxsize, self._stats)
+
+    async def stats(self) -> CacheStats:
+        return self._stats
+
+    async def close(self):
+        pass
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from typing import Optional
+
+from spicier.models import Server
+
+from .backend import CacheStats
+
+cache_logger = logging.getLogger("spicier.cache")
+
+
+class RedisError(Exception):
+    """Raised when the server replies with an error"""
+
+
+class RedisBackend:
+    """Servers kept in one hash on any server speaking the Redis protocol.
+
+    Talks RESP directly over a single connection, so no client library is
+    required. Connection errors and timeouts are logged and treated as misses.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        key: str = "spicer:servers",
+        maxsize: int = 10000,
+        timeout: float = 1.0,
+    ):
+        self.maxsize = maxsize
+        self._host = host
+        self._port = port
+        self._key = key
+        self._timeout = timeout
+        self._stats = CacheStats()
+
+        self._reader: asyncio.StreamReader = None
+        self._writer: asyncio.StreamWriter = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            self._host, self._port
+        )
+
+    async def _disconnect(self):
+        if self._writer:
+            self._writer.close()
+
+        self._reader = self._writer = None
+
+    async def _command(self, *args):
+        payload = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode()
+            payload.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+
+        async with self._lock:
+            try:
+                return await asyncio.wait_for(
+                    self._exchange(b"".join(payload)), self._timeout
+                )
+            except BaseException as error:
+                # A reply left half read would answer the next command
+                await self._disconnect()
+
+                if not isinstance(error, (OSError, asyncio.IncompleteReadError)):
+                    raise
+
+                cache_logger.error(f"Redis command {args[0]} failed: {error!r}")
+                return None
+
+    async def _exchange(self, payload: bytes):
+        if not self._writer:
+            await self._connect()
+
+        self._writer.write(payload)
+        await self._writer.drain()
+
+        return await self._reply()
+
+    async def _reply(self):
+        line = await self._reader.readuntil(b"\r\n")
+        kind, value = line[:1], line[1:-2]
+
+        if kind == b"+":
+            return value
+        if kind == b"-":
+            raise RedisError(value.decode())
+        if kind == b":":
+            return int(value)
+        if kind == b"$":
+            if int(value) < 0:
+                return None
+            data = await self._reader.readexactly(int(value) + 2)
+            return data[:-2]
+        if kind == b"*":
+            if int(value) < 0:
+                return None
+            return [await self._reply() for _ in range(int(value))]
+
+        raise RedisError(f"Unknown reply type: {line!r}")
+
+    async def get(self, key: int) -> Optional[Server]:
+        data = await self._command("HGET", self._key, key)
+
+        if data is None:
+            self._stats.misses += 1
+            return None
+
+        self._stats.hits += 1
+        return Server.loads(data)
+
+    async def set(self, key: int, server: Server):
+        added = await self._command("HSET", self._key, key, server.dumps())
+
+        # Keep the hash within maxsize, dropping a random server like an LRU
+        # would drop the oldest one
+        if not added or (await self._command("HLEN", self._key) or 0) <= self.maxsize:
+            return
+
+        try:
+            victim = await self._command("HRANDFIELD", self._key)
+        except RedisError as error:  # Redis < 6.2
+            cache_logger.error(f"Failed to evict a server: {error}")
+            return
+
+        if victim is not None and await self._command("HDEL", self._key, victim):
+            self._stats.evictions += 1
+
+    async def delete(self, key: int):
+        await self._command("HDEL", self._key, key)
+
+    async def clear(self):
+        await self._command("DEL", self._key)
+
+    async def stats(self) -> CacheStats:
+        return self._stats
+
+    async def close(self):
+        async with self._lock:
+            await self._disconnect()
@@ -0,0 +1,157 @@
+import random
+import struct
+import zlib
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+
+from spicier.models import Server
+
+from .backend import CacheStats
+
+HEADER = struct.Struct("<8sII")  # magic, slot count, payload size
+SLOT = struct.Struct("<IqIH")  # sequence, key, crc32, payload length
+KEY = struct.Struct("<q")
+
+MAGIC = b"SPICER01"
+PAYLOAD = 96
+WINDOW = 8
+
+
+class SharedMemoryBackend:
+    """Fixed-size hash table in named shared memory, shared by every process
+    on the host.
+
+    There is no cross-process lock: writers bump a per-slot sequence number
+    to an odd value while writing and every slot carries a crc32, so a reader
+    that races a writer sees a torn slot and treats it as a miss.
+    """
+
+    # Only processes on this host see the table, changes made on other hosts
+    # still have to invalidate it
+    shared = False
+
+    def __init__(self, name: str = "spicer-cache", slots: int = 65536):
+        self.maxsize = slots
+        self._stats = CacheStats()
+        self._slots = slots
+        self._slot_size = SLOT.size + PAYLOAD
+
+        size = HEADER.size + slots * self._slot_size
+
+        try:
+            self._memory = self._open(name, create=True, size=size)
+            HEADER.pack_into(self._memory.buf, 0, MAGIC, slots, PAYLOAD)
+        except FileExistsError:
+            self._memory = self._open(name)
+
+        if HEADER.unpack_from(self._memory.buf, 0) != (MAGIC, slots, PAYLOAD):
+            raise ValueError(f"Shared memory '{name}' has an incompatible layout")
+
+    @staticmethod
+    def _open(name: str, **kwargs) -> shared_memory.SharedMemory:
+        # The table outlives any single process, it must not be unlinked when
+        # the process that opened it exits
+        try:
+            return shared_memory.SharedMemory(name, track=False, **kwargs)
+        except TypeError:  # Python < 3.13 always tracks
+            memory = shared_memory.SharedMemory(name, **kwargs)
+            resource_tracker.unregister(memory._name, "shared_memory")
+            return memory
+
+    def _offset(self, index: int) -> int:
+        return HEADER.size + index * self._slot_size
+
+    def _window(self, key: int):
+        home = ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) % self._slots
+        return [(home + i) % self._slots for i in range(WINDOW)]
+
+    def _read(self, index: int) -> Optional[tuple[int, bytes]]:
+        buf = self._memory.buf
+        offset = self._offset(index)
+
+        seq, key, crc, length = SLOT.unpack_from(buf, offset)
+        if seq & 1 or not key or length > PAYLOAD:
+            return None
+
+        start = offset + SLOT.size
+        payload = bytes(buf[start : start + length])
+
+        if SLOT.unpack_from(buf, offset)[0] != seq:
+            return None
+
+        if zlib.crc32(KEY.pack(key) + payload) != crc:
+            return None
+
+        return key, payload
+
+    def _write(self, index: int, key: int, payload: bytes):
+        buf = self._memory.buf
+        offset = self._offset(index)
+
+        seq = SLOT.unpack_from(buf, offset)[0] | 1
+        struct.pack_into("<I", buf, offset, seq)
+
+        crc = zlib.crc32(KEY.pack(key) + payload)
+        SLOT.pack_into(buf, offset, seq, key, crc, len(payload))
+        start = offset + SLOT.size
+        buf[start : start + len(payload)] = payload
+
+        struct.pack_into("<I", buf, offset, (seq + 1) & 0xFFFFFFFF)
+
+    def _find(self, key: int) -> Optional[tuple[int, bytes]]:
+        for index in self._window(key):
+            slot = self._read(index)
+            if slot and slot[0] == key:
+                return index, slot[1]
+
+        return None
+
+    async def get(self, key: int) -> Optional[Server]:
+        found = self._find(key)
+
+        if not found:
+            self._stats.misses += 1
+            return None
+
+        self._stats.hits += 1
+        return Server.loads(found[1])
+
+    async def set(self, key: int, server: Server):
+        payload = server.dumps()
+
+        if len(payload) > PAYLOAD:
+            return await self.delete(key)
+
+        window = self._window(key)
+        free = None
+
+        for index in window:
+            slot = self._read(index)
+
+            if slot and slot[0] == key:
+                return self._write(index, key, payload)
+
+            if not slot and free is None:
+                free = index
+
+        if free is None:
+            free = random.choice(window)
+            self._stats.evictions += 1
+
+        self._write(free, key, payload)
+
+    async def delete(self, key: int):
+        found = self._find(key)
+
+        if found:
+            self._write(found[0], 0, b"")
+
+    async def clear(self):
+        start = HEADER.size
+        self._memory.buf[start:] = bytes(len(self._memory.buf) - start)
+
+    async def stats(self) -> CacheStats:
+        return self._stats
+
+    async def close(self):
+        self._memory.close()
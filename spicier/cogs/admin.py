@@ -53,7 +53,31 @@ class AdminCog(commands.Cog, AdminService):
         """
         Display the cache
         """
-        await ctx.reply(self.bot.cache._servers)
+        stats = await self.bot.cache.stats()
+        await ctx.reply(f"{stats}\n{dict(self.bot.server_manager.counters)}")
+
+    @admin.command(name="db")
+    @commands.is_owner()
+    async def db_command(self, ctx):
+        """
+        Display database latency and pool saturation
+        """
+        pool = self.bot.db.pool_stats()
+        lines = [
+            f"pool {pool.in_use}/{pool.max_size} in use, {pool.idle} idle, "
+            f"{pool.waiters} waiting, "
+            f"acquire avg {pool.avg_acquire_time * 1000:.1f}ms "
+            f"max {pool.max_acquire_time * 1000:.1f}ms"
+        ]
+
+        for stats in self.bot.db.executor.summary()[:15]:
+            lines.append(
+                f"{stats['statement']}: {stats['count']} calls, "
+                f"avg {stats['mean'] * 1000:.1f}ms, p95 <{stats['p95'] * 1000:g}ms, "
+                f"{stats['rows']} rows, {stats['errors']} errors"
+            )
+
+        await ctx.reply("```\n" + "\n".join(lines) + "\n```")
 
 
 async def setup(bot):
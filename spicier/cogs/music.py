@@ -1,14 +1,19 @@
 import asyncio
 import logging
-from typing import Optional, Union
+import time
+from typing import Optional
 
 import wavelink
 from discord import VoiceChannel, VoiceState
-from discord.ext import commands, tasks
+from discord.ext import commands
 from wavelink.abc import Playable
 
 from spicier.config import Config
+from spicier.database.tables import PlaylistTable
+from spicier.errors import DatabaseUnavailable
 from spicier.manager import ServerManager
+from spicier.metrics import REGISTRY
+from spicier.models import SpicierPlayer
 
 from .service import CustomFilters, MusicService, utils
 
@@ -27,9 +32,21 @@ class MusicCog(commands.Cog, MusicService):
         self.config = bot.config
         self.bot = bot
 
+        # Playlists still being added to a queue
+        self._enqueues: set[asyncio.Task] = set()
+
+        self.gap = REGISTRY.histogram(
+            "spicier_track_gap_seconds",
+            "Time from the end of a track until the next one is sent or started",
+        )
+        self.first_audio = REGISTRY.histogram(
+            "spicier_time_to_first_audio_seconds",
+            "Time from a play command until its track is sent or started",
+        )
+
         super().__init__(bot, CustomFilters(), music_logger)
 
-        bot.loop.create_task(self.create_nodes(self.config.lavalink))
+        bot.loop.create_task(bot.node_manager.connect())
 
     @commands.command(name="connect", aliases=["join"])
     @commands.check(utils.user_connected)
@@ -40,6 +57,7 @@ class MusicCog(commands.Cog, MusicService):
         Connect to a voice channel.
         """
         vc: wavelink.Player = await self.handler.connect(ctx, channel=channel)
+        await self.apply_settings(vc)
         return await self.message_connected(ctx, vc)
 
     @commands.command(name="disconnect", aliases=["leave"])
@@ -57,31 +75,61 @@ class MusicCog(commands.Cog, MusicService):
         self,
         ctx: commands.Context,
         *,
-        track: Union[wavelink.YouTubeTrack, wavelink.YouTubePlaylist] = None,
+        track: str = None,
     ):
         """
         Play a song* with the given search query.
         """
-        tracks, vc = await self.handler.play(
+        requested = time.perf_counter()
+
+        resolution, vc = await self.handler.play(
             ctx,
             track,
             self.resume_command,
             self.connect_command,
         ) or (None, None)
 
-        if not any((tracks, vc)):
+        if not any((resolution, vc)):
+            return
+
+        # The reply goes out while the track is being sent
+        playing = self.start_playing(vc, requested)
+
+        if resolution.total < 2:
+            await asyncio.gather(
+                playing, self.message_play_single(ctx, vc, resolution.tracks[0])
+            )
             return
 
-        if not vc.track:
-            now = vc.queue.get()
-            await vc.play(now)
+        _, message = await asyncio.gather(
+            playing, self.message_play_multiple(ctx, vc, resolution)
+        )
+
+        if resolution.rest:
+            task = asyncio.create_task(
+                self.handler.enqueue_rest(
+                    vc,
+                    resolution,
+                    ctx.author.id,
+                    lambda loaded: self.message_play_progress(
+                        ctx, message, vc, resolution, loaded
+                    ),
+                )
+            )
+            self._enqueues.add(task)
+            task.add_done_callback(self._enqueues.discard)
+
+    async def start_playing(self, vc: SpicierPlayer, requested: float):
+        """Play the first queued track if nothing is playing yet"""
+        if vc.track:
+            return
 
-        if len(tracks) < 2:
-            return await self.message_play_single(ctx, vc, tracks[0])
+        vc.requested_at = requested
+        await vc.play(vc.next())
 
-        return await self.message_play_multiple(ctx, vc, tracks)
+        self.first_audio.observe(time.perf_counter() - requested, stage="send")
 
-    @commands.group(name="queue", aliases=["q"])
+    @commands.group(name="queue", aliases=["q"], invoke_without_command=True)
     @commands.check(utils.player_check)
     async def queue_group(self, ctx: commands.Context, arg: Optional[int] = 0):
         """
@@ -104,6 +152,40 @@ class MusicCog(commands.Cog, MusicService):
         """
         return await self.clear_command(ctx)
 
+    @queue_group.command(name="remove", aliases=["rm"])
+    @commands.check(utils.voice_check)
+    async def queue_remove_command(
+        self, ctx: commands.Context, start: int, end: Optional[int] = None
+    ):
+        """
+        Remove the track at a position, or every track from start to end.
+        """
+        removed = await self.handler.queue_remove(ctx, start, end)
+
+        return await self.message_queue_removed(ctx, removed)
+
+    @queue_group.command(name="move", aliases=["mv"])
+    @commands.check(utils.voice_check)
+    async def queue_move_command(
+        self, ctx: commands.Context, source: int, destination: int
+    ):
+        """
+        Move the track at a position to another position.
+        """
+        track = await self.handler.queue_move(ctx, source, destination)
+
+        return await self.message_queue_moved(ctx, track, destination)
+
+    @queue_group.command(name="dedupe", aliases=["unique"])
+    @commands.check(utils.voice_check)
+    async def queue_dedupe_command(self, ctx: commands.Context):
+        """
+        Remove tracks queued more than once, keeping the first.
+        """
+        removed = await self.handler.queue_dedupe(ctx)
+
+        return await self.message_queue_deduped(ctx, removed)
+
     @commands.command(name="clear", aliases=["reset"])
     @commands.check(utils.voice_check)
     async def clear_command(self, ctx: commands.Context):
@@ -119,8 +201,19 @@ class MusicCog(commands.Cog, MusicService):
     @commands.check(utils.player_check)
     async def skip_command(self, ctx: commands.Context, arg: Optional[str]):
         """
-        Skip the current song.
+        Skip the current song, or vote to skip it when others are listening.
         """
+        if not arg and self.config.skip["vote"]:
+            # Only listeners in the player's channel vote
+            if not await utils.voice_check(ctx):
+                raise commands.CheckFailure("Not in the player's channel")
+
+            votes, required = await self.handler.vote_skip(ctx, self.bot.skip_manager)
+
+            if votes < required:
+                vc: wavelink.Player = await utils.get_player(ctx)
+                return await self.message_skip_vote(ctx, vc.track, votes, required)
+
         prev_track, next_track = await self.handler.skip(
             ctx, self.force_skip_command, self.skip_all_command, arg=arg
         )
@@ -141,6 +234,7 @@ class MusicCog(commands.Cog, MusicService):
 
     @commands.command(name="force_skip", aliases=["fs"])
     @commands.check(utils.voice_check)
+    @commands.check(utils.dj_check)
     async def force_skip_command(self, ctx: commands.Context):
         """
         Force skip the current song.
@@ -187,6 +281,9 @@ class MusicCog(commands.Cog, MusicService):
         """
         vc = await self.handler.volume(ctx, vol)
 
+        state = await self.server_manager.open_state(ctx.guild.id)
+        state.player.volume = vc.volume
+
         if not vol:
             return await self.message_volume_current(ctx, vc.volume)
 
@@ -228,6 +325,9 @@ class MusicCog(commands.Cog, MusicService):
         """
         await self.handler.filter(ctx, mode=mode)
 
+        state = await self.server_manager.open_state(ctx.guild.id)
+        state.player.filter = mode
+
         return await self.message_filter_set(ctx, mode)
 
     @filter_group.command(name="reset", aliases=["clear"])
@@ -237,6 +337,9 @@ class MusicCog(commands.Cog, MusicService):
         Reset the filter mode.
         """
         await self.handler.filter_reset(ctx)
+
+        state = await self.server_manager.open_state(ctx.guild.id)
+        state.player.filter = None
         return await self.message_filter_clear(ctx)
 
     @filter_group.command(name="current", aliases=["show"])
@@ -249,62 +352,173 @@ class MusicCog(commands.Cog, MusicService):
 
         return await self.message_filter_current(ctx, filter, description)
 
+    @commands.group(name="playlist", aliases=["pl"])
+    async def playlist_group(self, ctx: commands.Context):
+        """
+        Playlist group.
+        """
+        if not ctx.invoked_subcommand:
+            return await ctx.send_help(ctx.command)
+
+    @playlist_group.command(name="save")
+    @commands.check(utils.player_check)
+    async def playlist_save_command(self, ctx: commands.Context, *, name: str):
+        """
+        Save the current track and queue as a playlist.
+        """
+        count = await self.handler.playlist_save(ctx, self.playlists, name)
+        return await self.message_playlist_saved(ctx, name, count)
+
+    @playlist_group.command(name="load", aliases=["play"])
+    @commands.check(utils.user_connected)
+    async def playlist_load_command(self, ctx: commands.Context, *, name: str):
+        """
+        Add a saved playlist to the queue.
+        """
+        vc, count = await self.handler.playlist_load(ctx, self.playlists, name)
+        return await self.message_playlist_loaded(ctx, vc, name, count)
+
+    @playlist_group.command(name="list")
+    async def playlist_list_command(self, ctx: commands.Context):
+        """
+        List your playlists.
+        """
+        playlists = await self.playlists.user_playlists(ctx.author.id)
+        return await self.message_playlists(ctx, playlists)
+
+    @playlist_group.command(name="delete", aliases=["remove"])
+    async def playlist_delete_command(self, ctx: commands.Context, *, name: str):
+        """
+        Delete one of your playlists.
+        """
+        await self.handler.playlist_delete(ctx, self.playlists, name)
+        return await self.message_playlist_deleted(ctx, name)
+
+    @commands.command(name="history", aliases=["recent"])
+    async def history_command(self, ctx: commands.Context):
+        """
+        Show the recently played songs.
+        """
+        self.require_database()
+
+        recent = await self.bot.history_manager.recent(ctx.guild.id)
+        plays, played = await self.bot.history_manager.total(ctx.guild.id)
+        return await self.message_history(ctx, recent, plays, played)
+
+    @commands.command(name="top")
+    async def top_command(self, ctx: commands.Context):
+        """
+        Show the most played songs.
+        """
+        self.require_database()
+
+        top = await self.bot.history_manager.top(ctx.guild.id)
+        plays, played = await self.bot.history_manager.total(ctx.guild.id)
+        return await self.message_top(ctx, top, plays, played)
+
+    def require_database(self):
+        if not self.bot.db.ready:
+            raise DatabaseUnavailable()
+
+    @property
+    def playlists(self) -> PlaylistTable:
+        self.require_database()
+        return self.bot.db.playlist
+
+    async def apply_settings(self, vc: wavelink.Player):
+        """Apply the player settings remembered for the guild"""
+        state = self.server_manager.state(vc.guild.id)
+
+        if not state:
+            return
+
+        if state.player.volume != vc.volume:
+            await vc.set_volume(state.player.volume)
+
+        if state.player.filter:
+            await vc.set_filter(self.filters.modes[state.player.filter])
+
     @commands.Cog.listener()
     async def on_wavelink_node_ready(self, node: wavelink.Node):
         music_logger.info(f"Node: <{node.identifier}> is ready!")
 
+        await self.bot.wait_until_ready()
+
+        for player in await self.bot.queue_manager.restore():
+            await self.apply_settings(player)
+
+    @commands.Cog.listener()
+    async def on_wavelink_track_start(self, player: SpicierPlayer, track):
+        self.bot.history_manager.started(player.guild.id)
+
+        if player.ended_at:
+            self.gap.observe(time.perf_counter() - player.ended_at, stage="start")
+            player.ended_at = None
+
+        if player.requested_at:
+            elapsed = time.perf_counter() - player.requested_at
+            self.first_audio.observe(elapsed, stage="start")
+            player.requested_at = None
+
+        self.bot.idle_manager.update(player)
+
+        # Ready before this track ends, so the next one starts with a send
+        player.prefetch()
+        await self.server_manager.get_channel(player.guild.id)
+
     @commands.Cog.listener()
     async def on_wavelink_track_end(
-        self, player: wavelink.Player, track: wavelink.Track, reason
+        self, player: SpicierPlayer, track: wavelink.Track, reason
     ):
+        ended = time.perf_counter()
+
+        self.bot.skip_manager.reset(player.guild.id)
+
+        if isinstance(track, wavelink.Track):
+            self.bot.history_manager.finished(player.guild.id, track, reason)
+
+        # Nothing is awaited before the next track is sent
+        next: Optional[Playable] = None
+        if not player.track and not player.queue.is_empty:
+            next = player.next()
+            await player.play(next)
+
+            player.ended_at = ended
+            self.gap.observe(time.perf_counter() - ended, stage="send")
+
+        self.bot.idle_manager.update(player)
+
+        if player.track and not next:
+            return
+
         channel = self.bot.get_channel(
             await self.server_manager.get_channel(player.guild.id)
         )
 
-        if player.track:
-            return
-
-        if player.queue.is_empty:
+        if not next:
             return await self.message_queue_empty(channel)
 
-        next: Playable = player.queue.get()
-        await player.play(next)
-
         return await self.message_next_track(channel, player, next)
 
     @commands.Cog.listener()
     async def on_voice_state_update(
         self, member, before: VoiceState, after: VoiceState
     ):
+        if before.channel and before.channel != after.channel:
+            self.bot.skip_manager.retract(member.guild.id, member.id)
+
         if member.id == self.bot.user.id and after.channel is None:
+            self.bot.idle_manager.cancel(member.guild.id)
+
             player = await utils.get_player(before.channel.guild)
             if player is not None:
                 await player.disconnect()
-
-        elif (
-            not after.channel
-            and self.bot.user in before.channel.members
-            and len(before.channel.members) <= 2
-        ):
-            player = await utils.get_player(before.channel.guild)
-            await self.dead(player, before)
-
-    @tasks.loop(count=1)
-    async def dead(self, player: wavelink.Player, voice: VoiceState):
-        if not voice:
             return
 
-        if len(voice.channel.members) > 1:
-            return
-
-        try:
-            await player.disconnect()
-        except Exception:
-            pass
-
-    @dead.before_loop
-    async def before_disconnect(self):
-        await asyncio.sleep(self.config.leave_time)
+        # Someone joined or left the bot's channel, or the bot moved
+        player = await utils.get_player(member.guild)
+        if player is not None and player.channel in (before.channel, after.channel):
+            self.bot.idle_manager.update(player)
 
 
 async def setup(bot):
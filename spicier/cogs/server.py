@@ -44,7 +44,7 @@ class ServerCog(commands.Cog):
         """
         Reset the prefix for the server.
         """
-        await self.server_manager.set_prefix(ctx.guild.id, self.config.prefix)
+        await self.server_manager.set_prefix(ctx.guild.id, None)
 
         return await ctx.reply(
             f"The prefix for this server has been reset to `{self.config.prefix}`."
@@ -58,10 +58,6 @@ class ServerCog(commands.Cog):
         """
         prefix = await self.server_manager.get_prefix(ctx.guild.id)
 
-        if not prefix:
-            await self.server_manager.set_prefix(ctx.guild.id, self.config.prefix)
-            prefix = self.config.prefix
-
         return await ctx.reply(f"The prefix for this server is `{prefix}`.")
 
 
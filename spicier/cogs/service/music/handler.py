@@ -1,15 +1,24 @@
+import asyncio
+import json
 import logging
 import re
-from typing import Callable, Union
+import time
+from typing import Awaitable, Callable
 
 import wavelink
 from discord import File, VoiceChannel
 from discord.ext import commands
 from discord.ext.commands import Parameter
+from wavelink.errors import LavalinkException, LoadTrackError
 from wavelink.queue import WaitQueue
 
+from spicier.database.tables import PlaylistTable
+from spicier.manager import SearchManager, SkipManager
+from spicier.manager.search import Resolution
+from spicier.models import QueueEntry, SpicierPlayer
 from spicier.errors import (
     InvalidVolume,
+    PlaylistNotFound,
     QueueEmpty,
     SearchNotFound,
     VoiceConnectionError,
@@ -37,62 +46,104 @@ class CommandArgs:
 class MusicHandler:
     """Handles logic behind music commands"""
 
-    def __init__(self, filters: CustomFilters, logger: logging.Logger):
+    def __init__(
+        self, filters: CustomFilters, logger: logging.Logger, searches: SearchManager
+    ):
         self.filters = filters
         self.logger = logger
+        self.searches = searches
         self.args = CommandArgs()
 
-    async def _youtube_search(self, query: str):
-        result = await wavelink.YouTubeTrack.search(query=query, return_first=True)
-
-        if not result:
-            raise SearchNotFound(query)
-
-        return result
-    
     async def play(
         self,
         ctx: commands.Context,
-        track: Union[str, wavelink.abc.Playable],
+        track: str,
         resume: Callable,
         connect: Callable,
-    ) -> tuple[list[wavelink.YouTubeTrack], wavelink.Player]:
-        self.logger.info(f"Handling play command with track: {track}" + f" {type(track)}")
+    ) -> tuple[Resolution, wavelink.Player]:
+        self.logger.info(f"Handling play command with track: {track}")
 
-        if not await utils.bot_connected(ctx) and not track:
-            await connect(ctx)
-            return
+        if not track:
+            if not await utils.bot_connected(ctx):
+                await connect(ctx)
+                return
 
-        vc = await utils.get_player(ctx)
+            vc = await utils.get_player(ctx)
 
-        if not track and vc.is_paused() and vc.track:
-            return await resume(ctx)
+            if vc.is_paused() and vc.track:
+                return await resume(ctx)
 
-        if not track and not vc.is_paused():
             raise commands.MissingRequiredArgument(
                 Parameter("Track", Parameter.POSITIONAL_OR_KEYWORD)
             )
 
-        tracks = []
-        if isinstance(track, wavelink.YouTubeTrack):
-            tracks.append(track)
+        # Joining the channel and resolving the track overlap
+        connected = ctx.voice_client is not None
+        try:
+            vc, resolution = await self._concurrently(
+                utils.get_player(ctx), self.searches.resolve(track)
+            )
 
-        if isinstance(track, wavelink.YouTubePlaylist):
-            tracks.extend([t for t in track.tracks])
+            if not resolution.tracks:
+                raise SearchNotFound(track)
+        except Exception as exception:
+            # Don't stay in a channel joined for a track that can't be played
+            if not connected and ctx.voice_client:
+                await ctx.voice_client.disconnect(force=True)
 
-        elif isinstance(track, str):
-            try:
-                tracks.append(await self._youtube_search(track))
-            except Exception:
+            if isinstance(exception, (LavalinkException, LoadTrackError)):
                 raise WrongArgument(message="Invalid search query.")
+            raise
 
-        if not tracks:
-            raise SearchNotFound(track)
+        for t in resolution.tracks:
+            vc.queue.put(QueueEntry.from_track(t, ctx.author.id))
 
-        for t in tracks:
-            vc.queue.put(t)
+        return resolution, vc
 
-        return tracks, vc
+    @staticmethod
+    async def _concurrently(*coros: Awaitable) -> list:
+        """Run the coroutines together, the others are cancelled if one fails"""
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            # Wait for the cancelled ones, so a join can't finish after this
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def enqueue_rest(
+        self,
+        vc: wavelink.Player,
+        resolution: Resolution,
+        requester: int,
+        progress: Callable[[int], Awaitable],
+        chunk_size: int = 100,
+        interval: float = 2.0,
+    ) -> int:
+        """Queue the rest of a playlist in chunks, yielding to the event loop
+        between them and reporting progress at most every interval seconds"""
+        loaded = len(resolution.tracks)
+        reported = time.monotonic()
+
+        for chunk in resolution.chunks(chunk_size, requester):
+            # Stop once the player left or another one took its place
+            if not vc.is_connected() or vc.guild.voice_client is not vc:
+                break
+
+            vc.queue.extend(chunk)
+            loaded += len(chunk)
+
+            await asyncio.sleep(0)
+
+            if time.monotonic() - reported >= interval:
+                await progress(loaded)
+                reported = time.monotonic()
+
+        await progress(loaded)
+        return loaded
 
     async def connect(
         self, ctx: commands.Context, channel: VoiceChannel = None
@@ -108,7 +159,7 @@ class MusicHandler:
 
         try:
             vc: wavelink.Player = await utils.get_player(channel or ctx)
-            await vc.connect(cls=wavelink.Player)
+            await vc.connect(cls=SpicierPlayer)
         except AttributeError:
             raise VoiceConnectionError()
 
@@ -138,10 +189,13 @@ class MusicHandler:
         return (vc.track, vc.queue, file)
 
     async def _handle_skip_arg(self, ctx, arg, force_skip, skip_all):
+        # Calling a command directly skips its checks
         if arg.lower() in self.args.all:
+            await skip_all.can_run(ctx)
             return await skip_all(ctx)
 
         if arg.lower() in self.args.force:
+            await force_skip.can_run(ctx)
             return await force_skip(ctx)
 
         raise WrongArgument(message="Invalid argument provided.")
@@ -162,7 +216,7 @@ class MusicHandler:
         next = None
 
         if vc.queue:
-            next = vc.queue.get()
+            next = vc.next()
             await vc.play(next)
 
         else:
@@ -170,6 +224,13 @@ class MusicHandler:
 
         return prev, next
 
+    @use_vc
+    async def vote_skip(
+        self, ctx: commands.Context, skips: SkipManager, vc: wavelink.Player = None
+    ) -> tuple[int, int]:
+        listeners = [member for member in vc.channel.members if not member.bot]
+        return skips.vote(ctx.guild.id, vc.track.id, ctx.author.id, len(listeners))
+
     @use_vc
     async def pause(self, ctx: commands.Context, vc: wavelink.Player = None) -> None:
         await vc.pause()
@@ -215,6 +276,52 @@ class MusicHandler:
 
         return old_queue
 
+    @use_vc
+    async def queue_remove(
+        self,
+        ctx: commands.Context,
+        start: int,
+        end: int = None,
+        vc: wavelink.Player = None,
+    ) -> list[wavelink.abc.Playable]:
+        if vc.queue.is_empty:
+            raise QueueEmpty("Queue is already empty.")
+
+        end = end or start
+        if not 0 < start <= end <= len(vc.queue):
+            raise WrongArgument(
+                message=f"Positions must be between 1 and {len(vc.queue)}."
+            )
+
+        return vc.queue.remove(start - 1, end)
+
+    @use_vc
+    async def queue_move(
+        self,
+        ctx: commands.Context,
+        source: int,
+        destination: int,
+        vc: wavelink.Player = None,
+    ) -> wavelink.abc.Playable:
+        if vc.queue.is_empty:
+            raise QueueEmpty("Queue is already empty.")
+
+        if not (0 < source <= len(vc.queue) and 0 < destination <= len(vc.queue)):
+            raise WrongArgument(
+                message=f"Positions must be between 1 and {len(vc.queue)}."
+            )
+
+        return vc.queue.move(source - 1, destination - 1)
+
+    @use_vc
+    async def queue_dedupe(
+        self, ctx: commands.Context, vc: wavelink.Player = None
+    ) -> list[wavelink.abc.Playable]:
+        if vc.queue.is_empty:
+            raise QueueEmpty("Queue is already empty.")
+
+        return vc.queue.dedupe()
+
     @use_vc
     async def force_skip(
         self, ctx: commands.Context, vc: wavelink.Player = None
@@ -222,12 +329,10 @@ class MusicHandler:
         if not vc.queue or vc.queue.is_empty:
             raise QueueEmpty("Queue is already empty.")
 
+        # The STOPPED track end event plays the next track
         track = vc.track
         await vc.stop()
 
-        if vc.queue and not vc.track:
-            vc.play(vc.queue.get())
-
         return track
 
     async def seek(
@@ -282,3 +387,58 @@ class MusicHandler:
             if filter
             else "Ten filtr nie posiada opisu.",
         )
+
+    def _playlist_name(self, name: str) -> str:
+        if not 0 < len(name) <= 50:
+            raise WrongArgument(message="Playlist name must be 1-50 characters.")
+
+        return name
+
+    async def playlist_save(
+        self, ctx: commands.Context, table: PlaylistTable, name: str
+    ) -> int:
+        vc: wavelink.Player = ctx.voice_client
+        tracks = [vc.track, *vc.queue] if vc and vc.track else []
+        tracks = [t for t in tracks if isinstance(t, (wavelink.Track, QueueEntry))]
+
+        if not tracks:
+            raise QueueEmpty("Nothing to save.")
+
+        await table.save(
+            ctx.author.id,
+            self._playlist_name(name),
+            [(track.id, track.info) for track in tracks],
+        )
+        return len(tracks)
+
+    async def playlist_load(
+        self, ctx: commands.Context, table: PlaylistTable, name: str
+    ) -> tuple[wavelink.Player, int]:
+        playlist = await table.get(ctx.author.id, self._playlist_name(name))
+
+        if not playlist:
+            raise PlaylistNotFound(name)
+
+        vc: wavelink.Player = await utils.get_player(ctx)
+        count = 0
+
+        # Rows go into the queue as they arrive, playback starts with the first
+        async for record in table.tracks(playlist["id"]):
+            # Stop once the player left or another one took its place
+            if not vc.is_connected() or vc.guild.voice_client is not vc:
+                break
+
+            info = json.loads(record["info"])
+            vc.queue.put(QueueEntry.from_info(record["track"], info, ctx.author.id))
+            count += 1
+
+            if not vc.track:
+                await vc.play(vc.next())
+
+        return vc, count
+
+    async def playlist_delete(
+        self, ctx: commands.Context, table: PlaylistTable, name: str
+    ) -> None:
+        if not await table.delete(ctx.author.id, self._playlist_name(name)):
+            raise PlaylistNotFound(name)
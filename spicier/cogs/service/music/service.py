@@ -2,12 +2,13 @@ import logging
 import time
 
 import wavelink
-from discord import Embed, TextChannel
+from discord import Embed, HTTPException, Message, TextChannel
 from discord.ext import commands
-from wavelink.errors import NodeOccupied
 from wavelink.queue import WaitQueue
 
 from spicier.embeds import MusicEmbed
+from spicier.manager.search import Resolution
+from spicier.models import PlayerQueue, playable
 
 from . import CustomFilters, utils
 from .handler import MusicHandler
@@ -19,15 +20,7 @@ class MusicService:
     def __init__(self, bot, filters: CustomFilters, logger: logging.Logger):
         self.bot = bot
         self.filters = filters
-        self.handler = MusicHandler(filters, logger)
-
-    async def create_nodes(self, config):
-        await self.bot.wait_until_ready()
-        try:
-            await wavelink.NodePool.create_node(bot=self.bot, **config)
-            return True
-        except NodeOccupied:
-            pass
+        self.handler = MusicHandler(filters, logger, bot.search_manager)
 
     def is_alone(self, ctx: commands.Context) -> bool:
         return len(ctx.voice_client.channel.members) == 1
@@ -74,20 +67,60 @@ class MusicService:
             description=f"Added by: {ctx.author.mention} | Duration: `{utils.get_time(track.length)}` | Position: `{len(vc.queue)}`",
         )
 
+        if vc.queue:
+            embed.add_field(
+                name="**Plays in**:",
+                value=f"`{utils.get_time(self._plays_in(vc, len(vc.queue) - 1))}`",
+            )
+
         await ctx.reply(embed=embed, mention_author=False)
 
-    async def message_play_multiple(
-        self, ctx: commands.Context, vc: wavelink.Player, tracks: list[wavelink.Track]
-    ):
+    def _playlist_embed(
+        self,
+        ctx: commands.Context,
+        vc: wavelink.Player,
+        resolution: Resolution,
+        loaded: int,
+    ) -> Embed:
         embed = MusicEmbed.success(
             ctx.author,
             f"{ctx.guild.name} | Added to queue",
-            title=f"Playlist of **{len(tracks)}** tracks",
-            url=tracks[0].uri,
-            description=f"Added by: {ctx.author.mention} | Duration: `{utils.get_lenght(tracks)}` | Queue lenght: `{len(vc.queue)}`",
+            title=f"Playlist of **{resolution.total}** tracks",
+            url=resolution.tracks[0].uri,
+            description=f"Added by: {ctx.author.mention} | Duration: `{utils.get_time(resolution.length)}` | Queue lenght: `{len(vc.queue)}`",
+        )
+        embed.add_field(
+            name="**Queue duration**:", value=f"`{utils.get_time(vc.queue.duration)}`"
         )
 
-        await ctx.reply(embed=embed, mention_author=False)
+        if loaded < resolution.total:
+            embed.set_footer(text=f"Adding tracks... {loaded}/{resolution.total}")
+
+        return embed
+
+    async def message_play_multiple(
+        self, ctx: commands.Context, vc: wavelink.Player, resolution: Resolution
+    ) -> Message:
+        embed = self._playlist_embed(ctx, vc, resolution, len(resolution.tracks))
+        return await ctx.reply(embed=embed, mention_author=False)
+
+    async def message_play_progress(
+        self,
+        ctx: commands.Context,
+        message: Message,
+        vc: wavelink.Player,
+        resolution: Resolution,
+        loaded: int,
+    ):
+        embed = self._playlist_embed(ctx, vc, resolution, loaded)
+
+        try:
+            await message.edit(embed=embed)
+        except HTTPException as exception:
+            # The reply was deleted, the tracks are still being added
+            self.handler.logger.warning(
+                f"Failed to update playlist progress: {exception}"
+            )
 
     async def message_queue_is_empty(self, ctx: commands.Context):
         embed = MusicEmbed.warning(
@@ -105,32 +138,82 @@ class MusicService:
 
         await ctx.reply(embed=embed, mention_author=False)
 
-    def _track_fragment(self, track: wavelink.Track, index: int):
+    async def message_queue_removed(
+        self, ctx: commands.Context, removed: list[wavelink.abc.Playable]
+    ):
+        title = (
+            f"`{removed[0].title}`"
+            if len(removed) == 1
+            else f"Removed **{len(removed)}** tracks"
+        )
+        embed = MusicEmbed.success(
+            ctx.author,
+            "Removed from queue",
+            title=title,
+            description=f"Duration: `{utils.get_lenght(removed)}`",
+        )
+
+        await ctx.reply(embed=embed, mention_author=False)
+
+    async def message_queue_moved(
+        self, ctx: commands.Context, track: wavelink.abc.Playable, position: int
+    ):
+        embed = MusicEmbed.success(
+            ctx.author,
+            "Moved in queue",
+            title=f"`{track.title}`",
+            description=f"Position: `{position}`",
+        )
+
+        await ctx.reply(embed=embed, mention_author=False)
+
+    async def message_queue_deduped(
+        self, ctx: commands.Context, removed: list[wavelink.abc.Playable]
+    ):
+        embed = MusicEmbed.success(
+            ctx.author,
+            "Removed duplicates",
+            title=f"Removed **{len(removed)}** duplicate tracks",
+            description=f"Duration: `{utils.get_lenght(removed)}`",
+        )
+
+        await ctx.reply(embed=embed, mention_author=False)
+
+    def _plays_in(self, vc: wavelink.Player, index: int) -> float:
+        """Seconds until the track at the queue position starts"""
+        remaining = vc.track.duration - vc.position if vc.track else 0
+        return remaining + vc.queue.eta(index)
+
+    def _track_fragment(self, track: wavelink.Track, index: int, plays_in: float):
+        track = playable(track)
         return (
             f"`{index + 1}.` [{track.title}]({track.uri}) `{utils.get_time(track.duration)}`\n"
-            + f"<:Reply:1076905179619807242> **Author**: {track.author}"
+            + f"<:Reply:1076905179619807242> **Author**: {track.author} | **Plays in**: `{utils.get_time(plays_in)}`"
         )
 
-    def _get_tracks(self, queue: WaitQueue, pos: int):
-        trakcs = []
-        for index, track in enumerate(queue):
-            if pos <= index and index < pos + 8:
-                trakcs.append(self._track_fragment(track, index))
-        return trakcs
+    def _get_tracks(self, vc: wavelink.Player, pos: int):
+        fragments = []
+        plays_in = self._plays_in(vc, pos)
+
+        for index, track in enumerate(vc.queue.page(pos, 8), start=pos):
+            fragments.append(self._track_fragment(track, index, plays_in))
+            plays_in += track.duration
+
+        return fragments
 
     async def message_queue(
         self,
         ctx: commands.Context,
         current: wavelink.Track,
-        queue: wavelink.WaitQueue,
+        queue: PlayerQueue,
         pos: int,
         file=None,
     ):
-        desc = "\n".join(self._get_tracks(queue, pos))
+        desc = "\n".join(self._get_tracks(ctx.voice_client, pos))
         embed = MusicEmbed.success(
             ctx.author,
             f"{ctx.guild.name} | Queue display",
-            title=f"**{len(queue)}** songs in queue",
+            title=f"**{len(queue)}** songs in queue | `{utils.get_time(queue.duration)}`",
             description=desc,
         )
         embed.add_field(
@@ -173,6 +256,19 @@ class MusicService:
 
         await ctx.reply(embed=embed, mention_author=False)
 
+    async def message_skip_vote(
+        self, ctx: commands.Context, track: wavelink.Track, votes: int, required: int
+    ):
+        embed = MusicEmbed.success(
+            ctx.author,
+            "Vote to skip",
+            title=f"`{track.title}`",
+            url=track.uri,
+            description=f"Votes: `{votes}/{required}` | Use `skip` to vote or `skip force` to skip now",
+        )
+
+        await ctx.reply(embed=embed, mention_author=False)
+
     async def message_skip_all(self, ctx: commands.Context, queue: WaitQueue):
         embed = MusicEmbed.success(
             ctx.author,
@@ -317,3 +413,83 @@ class MusicService:
         )
 
         await channel.send(embed=embed)
+
+    async def message_playlist_saved(
+        self, ctx: commands.Context, name: str, count: int
+    ):
+        embed = MusicEmbed.success(
+            ctx.author,
+            "Playlists",
+            title=f"Saved playlist `{name}`",
+            description=f"<:Reply:1076905179619807242> `{count}` tracks",
+        )
+
+        await ctx.reply(embed=embed, mention_author=False)
+
+    async def message_playlist_loaded(
+        self, ctx: commands.Context, vc: wavelink.Player, name: str, count: int
+    ):
+        embed = MusicEmbed.success(
+            ctx.author,
+            f"{ctx.guild.name} | Added to queue",
+            title=f"Playlist `{name}` of **{count}** tracks",
+            description=f"Added by: {ctx.author.mention} | Queue lenght: `{len(vc.queue)}`",
+        )
+
+        await ctx.reply(embed=embed, mention_author=False)
+
+    async def message_playlists(self, ctx: commands.Context, playlists: list):
+        description = "\n".join(
+            f"`{index + 1}.` **{playlist['name']}** | `{playlist['tracks']}` tracks | `{utils.get_time(playlist['length'])}`"
+            for index, playlist in enumerate(playlists)
+        )
+
+        embed = MusicEmbed.success(
+            ctx.author,
+            "Playlists",
+            title=f"**{len(playlists)}** playlists",
+            description=description or "Use `playlist save` to save the queue.",
+        )
+
+        await ctx.reply(embed=embed, mention_author=False)
+
+    async def message_playlist_deleted(self, ctx: commands.Context, name: str):
+        embed = MusicEmbed.success(
+            ctx.author, "Playlists", title=f"Deleted playlist `{name}`"
+        )
+
+        await ctx.reply(embed=embed, mention_author=False)
+
+    async def message_history(
+        self, ctx: commands.Context, recent: list, plays: int, played: float
+    ):
+        description = "\n".join(
+            f"`{index + 1}.` [{entry['title']}]({entry['uri']}) | <t:{int(entry['ended_at'].timestamp())}:R>"
+            for index, entry in enumerate(recent)
+        )
+
+        embed = MusicEmbed.success(
+            ctx.author,
+            f"{ctx.guild.name} | History",
+            title=f"**{plays}** songs played | `{utils.get_time(played)}` listened",
+            description=description or "Nothing was played yet.",
+        )
+
+        await ctx.reply(embed=embed, mention_author=False)
+
+    async def message_top(
+        self, ctx: commands.Context, top: list, plays: int, played: float
+    ):
+        description = "\n".join(
+            f"`{index + 1}.` [{entry['title']}]({entry['uri']}) | `{entry['plays']}` plays"
+            for index, entry in enumerate(top)
+        )
+
+        embed = MusicEmbed.success(
+            ctx.author,
+            f"{ctx.guild.name} | Top songs",
+            title=f"**{plays}** songs played | `{utils.get_time(played)}` listened",
+            description=description or "Nothing was played yet.",
+        )
+
+        await ctx.reply(embed=embed, mention_author=False)
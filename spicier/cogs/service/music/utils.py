@@ -7,6 +7,7 @@ from discord.ext import commands
 from PIL import Image
 
 from spicier.errors import PlayerNotPlaying
+from spicier.models import SpicierPlayer
 
 
 async def user_connected(ctx: commands.Context) -> bool:
@@ -39,6 +40,18 @@ async def player_check(ctx: commands.Context) -> bool:
     return True
 
 
+async def dj_check(ctx: commands.Context) -> bool:
+    """Check: User requested the current track, has the DJ role or can manage
+    channels"""
+    if getattr(ctx.voice_client.track, "requester", None) == ctx.author.id:
+        return True
+    if ctx.author.guild_permissions.manage_channels:
+        return True
+
+    role = ctx.bot.config.skip["dj_role"]
+    return any(r.name == role for r in ctx.author.roles)
+
+
 async def player_alive(player: wavelink.Player) -> bool:
     """Check: Player is alive"""
     return bool(not player.queue.is_empty or player.track)
@@ -59,13 +72,13 @@ async def get_player(
 ) -> wavelink.Player:
     """Get the player for the guild."""
     if isinstance(case, Guild):
-        return wavelink.NodePool.get_node().get_player(case)
+        return case.voice_client
 
     if not case.voice_client and isinstance(case, VoiceChannel):
-        return await case.connect(cls=wavelink.Player)
+        return await case.connect(cls=SpicierPlayer)
 
     return case.voice_client or await case.author.voice.channel.connect(
-        cls=wavelink.Player
+        cls=SpicierPlayer
     )
 
 
@@ -3,6 +3,8 @@ import os
 
 from .errors import BadConfig
 
+_MISSING = object()
+
 
 class Config:
     """The config class"""
@@ -34,11 +36,13 @@ class Config:
         """Update the langs dict"""
         self.langs = {lang: self._get_lang(lang) for lang in self._get_lang_names()}
 
-    def prop(self, prop: str):
+    def prop(self, prop: str, default=_MISSING):
         """Get a property from the config"""
         try:
             return self.raw[prop]
         except Exception as exception:
+            if default is not _MISSING:
+                return default
             raise BadConfig(exception) from exception
 
     @property
@@ -53,16 +57,26 @@ class Config:
         )
 
     @property
-    def lavalink(self) -> dict:
+    def database_options(self) -> dict:
+        return self.prop("database", {})
+
+    @property
+    def lavalink(self) -> list[dict]:
+        """Lavalink nodes, a single node may be given as an object"""
         prop = self.prop("lavalink")
+        nodes = [dict(node) for node in ([prop] if isinstance(prop, dict) else prop)]
 
         if not os.getenv("LAVALINK_HOST"):
-            return prop
+            return nodes
 
-        prop["host"] = os.getenv("LAVALINK_HOST")
-        prop["port"] = os.getenv("LAVALINK_PORT")
+        nodes[0]["host"] = os.getenv("LAVALINK_HOST")
+        nodes[0]["port"] = os.getenv("LAVALINK_PORT")
 
-        return prop
+        return nodes
+
+    @property
+    def failover(self) -> dict:
+        return {"interval": 5, "grace": 10, **self.prop("failover", {})}
 
     @property
     def prefix(self) -> str:
@@ -80,6 +94,41 @@ class Config:
     def leave_time(self) -> int:
         return self.prop("leave_time")
 
+    @property
+    def cache(self) -> dict:
+        return {"backend": "lru", "size": 10000, **self.prop("cache", {})}
+
+    @property
+    def write_behind(self) -> dict:
+        return {"interval": 5, "max_dirty": 100, **self.prop("write_behind", {})}
+
+    @property
+    def queue(self) -> dict:
+        return {"save_interval": 30, **self.prop("queue", {})}
+
+    @property
+    def skip(self) -> dict:
+        return {
+            "vote": True,
+            "ratio": 0.5,
+            "dj_role": "DJ",
+            "flush_interval": 10,
+            "max_batch": 500,
+            **self.prop("skip", {}),
+        }
+
+    @property
+    def history(self) -> dict:
+        return {"flush_interval": 30, "max_batch": 500, **self.prop("history", {})}
+
+    @property
+    def search(self) -> dict:
+        return {"memory_size": 2048, "ttl": 86400, **self.prop("search", {})}
+
+    @property
+    def metrics(self) -> dict:
+        return {"host": "127.0.0.1", "port": None, **self.prop("metrics", {})}
+
     def lang(self, language: str) -> str:
         self.update_langs()
         return self.langs[language] or self.langs["en"]
@@ -1,6 +1,6 @@
 import logging
 
-from discord import Message
+from discord import Guild, Message
 from discord.ext import commands
 
 from spicier.manager import ServerManager
@@ -25,6 +25,14 @@ class EventHandler(commands.Cog, ErrorService):
     async def on_ready(self):
         pass
 
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: Guild):
+        await self.server_manager.get(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: Guild):
+        self.server_manager.close_state(guild.id)
+
     @commands.Cog.listener()
     async def on_message_edit(self, before: Message, after: Message):
         if before.content != after.content:
@@ -5,7 +5,9 @@ from discord.ext import commands
 from discord.ext.commands import errors as commands_errors
 
 from spicier.errors import (
+    DatabaseUnavailable,
     PlayerNotPlaying,
+    PlaylistNotFound,
     QueueEmpty,
     VoiceConnectionError,
     WrongArgument,
@@ -64,6 +66,16 @@ class ErrorService:
                 ctx, "Before using this command, play something", error, debug=False
             )
 
+        elif isinstance(error, PlaylistNotFound):
+            await self.send_error(
+                ctx, f"Playlist not found: `{error.name}`", error, debug=False
+            )
+
+        elif isinstance(error, DatabaseUnavailable):
+            await self.send_error(
+                ctx, "This command is unavailable right now, try again later", error
+            )
+
         else:
             self.logger.error(str(error))
             return True
@@ -1 +1 @@
-from .db import Database
\ No newline at end of file
+from .db import Database
@@ -1,15 +1,56 @@
+import asyncio
 import logging
 import os
+import random
 import time
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional
 
 import asyncpg
 from asyncpg import Pool
 
-from .tables import PlaylistTable, QueueTable, ServerTable, SkipTable
+from spicier.metrics import REGISTRY
+
+from .executor import Executor
+from .migrate import Migrator
+from .tables import (
+    HistoryTable,
+    PlaylistTable,
+    QueueTable,
+    SearchTable,
+    ServerTable,
+    SkipTable,
+)
 
 database_logger = logging.getLogger("spicier.database")
 
+POOL_DEFAULTS = {
+    "min_size": 2,
+    "max_size": 10,
+    "max_inactive_connection_lifetime": 300.0,
+    "statement_cache_size": 100,
+    "command_timeout": 30.0,
+}
+
+
+@dataclass
+class PoolStats:
+    """Saturation of the connection pool"""
+
+    size: int = 0
+    max_size: int = 0
+    idle: int = 0
+    in_use: int = 0
+    waiters: int = 0
+    acquires: int = 0
+    acquire_time: float = 0.0
+    max_acquire_time: float = 0.0
+
+    @property
+    def avg_acquire_time(self) -> float:
+        return self.acquire_time / self.acquires if self.acquires else 0.0
+
 
 class Database:
     """Database class for interacting with the database"""
@@ -18,68 +59,269 @@ class Database:
     skip: SkipTable
     queue: QueueTable
     playlist: PlaylistTable
+    history: HistoryTable
+    search: SearchTable
 
-    def __init__(self, database_url: str):
+    def __init__(self, database_url: str, options: dict = None):
         self.database_url = database_url
+        self.options = options or {}
         self.pool: Pool = None
+        self._stats = PoolStats()
+        self.executor = Executor(self.options.get("slow_query", 0.5))
+
+        self._acquire_latency = REGISTRY.histogram(
+            "spicier_db_acquire_seconds", "Time spent waiting for a pooled connection"
+        )
+        REGISTRY.gauge(
+            "spicier_db_pool_in_use",
+            "Pooled connections in use",
+            lambda: self._stats.in_use,
+        )
+        REGISTRY.gauge(
+            "spicier_db_pool_waiters",
+            "Tasks waiting for a pooled connection",
+            lambda: self._stats.waiters,
+        )
+        REGISTRY.gauge(
+            "spicier_db_pool_size",
+            "Open pooled connections",
+            lambda: self.pool.get_size() if self.pool else 0,
+        )
+        REGISTRY.gauge(
+            "spicier_db_pool_idle",
+            "Open pooled connections nobody holds",
+            lambda: self.pool.get_idle_size() if self.pool else 0,
+        )
+
+        # Set once the schema is set up and the tables are built
+        self._ready = asyncio.Event()
+        self._reconnect_task: asyncio.Task = None
 
-        # While using docker, bot starts before database is ready
-        self._tries = 10
+        # Dedicated connection for LISTEN, pooled connections are not kept
+        self._listener: asyncpg.Connection = None
+        self._listener_task: asyncio.Task = None
+        self._channels: dict[str, list[Callable[[Optional[str]], None]]] = {}
+
+        # Prefix of every payload we NOTIFY, so we skip our own notifications
+        self.token = os.urandom(4).hex()
+
+    @property
+    def ready(self) -> bool:
+        """Whether the database can be queried"""
+        return self._ready.is_set()
+
+    async def wait_until_ready(self):
+        await self._ready.wait()
+
+    @property
+    def pool_options(self) -> dict:
+        return {**POOL_DEFAULTS, **self.options.get("pool", {})}
+
+    def timeout(self, name: str) -> Optional[float]:
+        """Timeout of a named statement, None uses the pool command_timeout"""
+        return self.options.get("timeouts", {}).get(name)
+
+    def pool_stats(self) -> PoolStats:
+        """Current pool size and usage along with the acquire counters"""
+        if self.pool:
+            self._stats.size = self.pool.get_size()
+            self._stats.max_size = self.pool.get_max_size()
+            self._stats.idle = self.pool.get_idle_size()
+
+        return self._stats
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """Acquire a pooled connection, recording how long we waited for it"""
+        stats = self._stats
+        stats.waiters += 1
+        start = time.perf_counter()
+
+        try:
+            conn = await self.pool.acquire()
+        finally:
+            stats.waiters -= 1
+
+        elapsed = time.perf_counter() - start
+        stats.acquires += 1
+        stats.acquire_time += elapsed
+        stats.max_acquire_time = max(stats.max_acquire_time, elapsed)
+        self._acquire_latency.observe(elapsed)
+        stats.in_use += 1
+
+        if elapsed > self.options.get("slow_acquire", 1.0):
+            database_logger.warning(
+                f"Waited {elapsed:.2f}s for a connection, pool is saturated "
+                f"({stats.in_use}/{self.pool.get_max_size()} in use, "
+                f"{stats.waiters} waiting)"
+            )
+
+        try:
+            yield conn
+        finally:
+            stats.in_use -= 1
+            await self.pool.release(conn)
 
     async def start(self):
         """Start the database connection.
-        Try to connect to the database for a given amount of times.
+        While using docker, bot starts before database is ready, so retry with
+        jittered exponential backoff. Startup only waits until the configured
+        deadline, after that the connection is retried in the background.
         """
-        fail_msg = "Failed to connect to database. Retrying... ({}/{})"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.retry_options["deadline"]
 
-        for i in range(self._tries):
-            if await self._try_connect():
-                break
-            else:
-                database_logger.warning(fail_msg.format(i + 1, self._tries))
-                time.sleep(5)
+        if await self._connect(deadline):
+            await self._connected()
+            return
 
-        if self.pool:
-            database_logger.info("Connected to database")
+        self._reconnect_task = loop.create_task(self._keep_connecting())
 
-    async def setup(self, path: str = "spicier/database/sql"):
-        """Setup database with sql scripts"""
-        sqls = self._get_scripts(path)
+    @property
+    def retry_options(self) -> dict:
+        return {"deadline": 60, "base": 0.5, "cap": 10, **self.options.get("retry", {})}
 
-        database_logger.info(f"Setting up database with {len(sqls)} scripts...")
+    async def _connect(self, deadline: Optional[float] = None) -> bool:
+        """Retry creating the pool until it succeeds or the deadline passes"""
+        retry = self.retry_options
+        loop = asyncio.get_running_loop()
+        attempt = 0
 
-        for sql in sqls:
-            await self._execute_file(path, sql)
+        while True:
+            try:
+                self.pool = await asyncpg.create_pool(
+                    self.database_url, **self.pool_options
+                )
+                return True
+            except Exception as exception:
+                error = exception
 
-        self._build_tables()
+            attempt += 1
 
-        database_logger.info("Database setup complete")
+            # Full jitter, so restarted shards don't retry in lockstep
+            delay = random.uniform(0, min(retry["cap"], retry["base"] * 2**attempt))
+
+            if deadline is not None:
+                remaining = deadline - loop.time()
+
+                if remaining <= 0:
+                    database_logger.error(
+                        f"Failed to connect to database: {error}. Gave up waiting "
+                        f"after {attempt} attempts, retrying in the background"
+                    )
+                    return False
 
-    def _get_scripts(self, path: str) -> list:
-        sqls = [file for file in os.listdir(path) if file.endswith(".sql")]
+                delay = min(delay, remaining)
 
-        if len(sqls) == 0:
-            database_logger.warning("No sql scripts found in given path")
-            return []
+            database_logger.warning(
+                f"Failed to connect to database: {error}. "
+                f"Retrying in {delay:.1f}s... ({attempt})"
+            )
+            await asyncio.sleep(delay)
 
-        return sqls
+    async def _keep_connecting(self):
+        await self._connect()
+        await self._connected()
 
-    async def _execute_file(self, path: str, sql: str):
-        with open(f"{path}/{sql}", "r") as file:
-            return await self.pool.execute(file.read())
+        try:
+            await self.setup()
+        except Exception as exception:
+            database_logger.error(f"Database setup failed: {exception}")
+
+    async def _connected(self):
+        database_logger.info("Connected to database")
+
+        # Retried like a lost connection, receivers drop what they cached
+        # once it is up since changes made meanwhile were not seen
+        if not await self._connect_listener():
+            self._listener_task = asyncio.create_task(self._reconnect_listener())
+
+    async def close(self):
+        """Close the listener connection and the pool"""
+        for task in (self._reconnect_task, self._listener_task):
+            if task:
+                task.cancel()
+
+        if self._listener:
+            self._listener.remove_termination_listener(self._on_listener_lost)
+            await self._listener.close()
+            self._listener = None
+
+        if self.pool:
+            await self.pool.close()
 
-    async def _try_connect(self) -> bool:
+    async def listen(self, channel: str, callback: Callable[[Optional[str]], None]):
+        """Call callback with the payload of every notification on the channel
+        sent by other processes. Called with None when notifications may have
+        been missed, so the receiver has to drop everything it derived from them.
+        """
+        self._channels.setdefault(channel, []).append(callback)
+
+        if self._listener and len(self._channels[channel]) == 1:
+            await self._listener.add_listener(channel, self._dispatch)
+
+    async def _connect_listener(self) -> bool:
         try:
-            self.pool = await asyncpg.create_pool(self.database_url)
-            return True
+            self._listener = await asyncpg.connect(self.database_url)
         except Exception as exception:
-            database_logger.error(f"Failed to connect to database: {exception}")
+            database_logger.error(f"Failed to open LISTEN connection: {exception}")
             return False
 
+        self._listener.add_termination_listener(self._on_listener_lost)
+
+        for channel in self._channels:
+            await self._listener.add_listener(channel, self._dispatch)
+
+        return True
+
+    def _dispatch(self, connection, pid: int, channel: str, payload: str):
+        token, _, payload = payload.partition(":")
+
+        if token == self.token:
+            return
+
+        for callback in self._channels.get(channel, []):
+            callback(payload)
+
+    def _on_listener_lost(self, connection):
+        database_logger.warning("Lost LISTEN connection, reconnecting...")
+        self._listener = None
+
+        for callbacks in self._channels.values():
+            for callback in callbacks:
+                callback(None)
+
+        self._listener_task = asyncio.get_event_loop().create_task(
+            self._reconnect_listener()
+        )
+
+    async def _reconnect_listener(self):
+        while not await self._connect_listener():
+            await asyncio.sleep(5)
+
+        # Notifications sent while we were away are lost
+        for callbacks in self._channels.values():
+            for callback in callbacks:
+                callback(None)
+
+    async def setup(self, path: str = "spicier/database/sql"):
+        """Setup database by applying pending migrations"""
+        applied = await Migrator(self.pool, path).run()
+
+        if applied:
+            database_logger.info(f"Applied {applied} migrations")
+
+        self._build_tables()
+        self._ready.set()
+
+        database_logger.info("Database setup complete")
+
     def _build_tables(self):
         database_logger.info("Creating managers for database tables...")
 
-        self.server = ServerTable(self.pool, "server")
-        self.skip = SkipTable(self.pool, "skip")
-        self.queue = QueueTable(self.pool, "queue")
-        self.playlist = PlaylistTable(self.pool, "playlist")
+        self.server = ServerTable(self, "server", token=self.token)
+        self.skip = SkipTable(self, "skip")
+        self.queue = QueueTable(self, "queue")
+        self.playlist = PlaylistTable(self, "playlist")
+        self.history = HistoryTable(self, "history")
+        self.search = SearchTable(self, "search")
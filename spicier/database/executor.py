@@ -0,0 +1,137 @@
+import logging
+import time
+from typing import AsyncIterator
+
+import asyncpg
+
+from spicier.metrics import REGISTRY, Registry
+
+database_logger = logging.getLogger("spicier.database")
+
+
+class Executor:
+    """Runs the table statements, recording latency, rows and errors per statement"""
+
+    def __init__(self, slow_query: float = 0.5, registry: Registry = REGISTRY):
+        self.slow_query = slow_query
+        self.statements: set[str] = set()
+
+        self.latency = registry.histogram(
+            "spicier_db_query_seconds", "Time spent running a statement"
+        )
+        self.rows = registry.counter(
+            "spicier_db_query_rows_total", "Rows returned by a statement"
+        )
+        self.errors = registry.counter(
+            "spicier_db_query_errors_total", "Statements that raised"
+        )
+
+    async def run(
+        self,
+        conn: asyncpg.Connection,
+        method: str,
+        name: str,
+        query: str,
+        *args,
+        timeout: float = None,
+    ):
+        """Run the query with the connection method, fetch, fetchrow or execute"""
+        self.statements.add(name)
+        start = time.perf_counter()
+
+        try:
+            result = await getattr(conn, method)(query, *args, timeout=timeout)
+        except Exception:
+            self.errors.inc(statement=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.latency.observe(elapsed, statement=name)
+
+        if isinstance(result, list):
+            self.rows.inc(len(result), statement=name)
+        elif result is not None and method == "fetchrow":
+            self.rows.inc(statement=name)
+
+        if elapsed > self.slow_query:
+            database_logger.warning(
+                f"Slow query {name} took {elapsed * 1000:.0f}ms "
+                f"({len(args)} arguments)"
+            )
+
+        return result
+
+    async def copy(
+        self,
+        conn: asyncpg.Connection,
+        name: str,
+        table: str,
+        records: list[tuple],
+        columns: list[str],
+        timeout: float = None,
+    ):
+        """Bulk load records with COPY, recorded like any other statement"""
+        self.statements.add(name)
+        start = time.perf_counter()
+
+        try:
+            await conn.copy_records_to_table(
+                table, records=records, columns=columns, timeout=timeout
+            )
+        except Exception:
+            self.errors.inc(statement=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.latency.observe(elapsed, statement=name)
+
+        self.rows.inc(len(records), statement=name)
+
+        if elapsed > self.slow_query:
+            database_logger.warning(
+                f"Slow copy {name} took {elapsed * 1000:.0f}ms "
+                f"({len(records)} records)"
+            )
+
+    async def cursor(
+        self,
+        conn: asyncpg.Connection,
+        name: str,
+        query: str,
+        *args,
+        prefetch: int = 100,
+        timeout: float = None,
+    ) -> AsyncIterator[asyncpg.Record]:
+        """Stream the rows of the query, the connection must be in a transaction.
+        Latency covers the whole stream, including the time the consumer takes"""
+        self.statements.add(name)
+        start = time.perf_counter()
+        rows = 0
+
+        try:
+            async for record in conn.cursor(
+                query, *args, prefetch=prefetch, timeout=timeout
+            ):
+                rows += 1
+                yield record
+        except Exception:
+            self.errors.inc(statement=name)
+            raise
+        finally:
+            self.latency.observe(time.perf_counter() - start, statement=name)
+            self.rows.inc(rows, statement=name)
+
+    def summary(self) -> list[dict]:
+        """Per statement numbers, slowest first"""
+        summary = [
+            {
+                "statement": name,
+                "count": self.latency.count(statement=name),
+                "mean": self.latency.mean(statement=name),
+                "p95": self.latency.quantile(0.95, statement=name),
+                "rows": int(self.rows.get(statement=name)),
+                "errors": int(self.errors.get(statement=name)),
+            }
+            for name in self.statements
+        ]
+        return sorted(summary, key=lambda stats: stats["mean"], reverse=True)
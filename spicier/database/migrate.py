@@ -0,0 +1,118 @@
+import hashlib
+import logging
+import os
+import re
+from dataclasses import dataclass
+
+import asyncpg
+
+from spicier.errors import MigrationError
+
+database_logger = logging.getLogger("spicier.database")
+
+FILE_PATTERN = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# Arbitrary key for pg_advisory_xact_lock, serializes migrating processes
+LOCK_ID = 0x5350494345
+
+
+@dataclass
+class Migration:
+    """A single versioned sql script"""
+
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode()).hexdigest()
+
+
+class Migrator:
+    """Applies versioned sql scripts, each in its own transaction"""
+
+    def __init__(self, pool: asyncpg.Pool, path: str):
+        self.pool = pool
+        self.path = path
+
+    def load(self) -> list[Migration]:
+        """Read the migrations from disk, ordered by version"""
+        migrations = {}
+
+        for file in os.listdir(self.path):
+            if not (match := FILE_PATTERN.match(file)):
+                continue
+
+            version = int(match.group(1))
+            if version in migrations:
+                raise MigrationError(f"Duplicate migration version {version}")
+
+            with open(os.path.join(self.path, file), "r", encoding="utf-8") as sql:
+                migrations[version] = Migration(version, match.group(2), sql.read())
+
+        return [migrations[version] for version in sorted(migrations)]
+
+    async def applied(self) -> dict[int, str]:
+        """Versions and checksums already applied, the only query when current"""
+        try:
+            rows = await self.pool.fetch(
+                "SELECT version, checksum FROM schema_migrations"
+            )
+        except asyncpg.UndefinedTableError:
+            return {}
+
+        return {row["version"]: row["checksum"] for row in rows}
+
+    async def run(self) -> int:
+        """Apply all pending migrations, returns how many were applied"""
+        migrations = self.load()
+        applied = await self.applied()
+
+        for migration in migrations:
+            checksum = applied.get(migration.version)
+
+            if checksum and checksum != migration.checksum:
+                raise MigrationError(
+                    f"Migration {migration.version}_{migration.name} was "
+                    "changed after it had been applied"
+                )
+
+        pending = [m for m in migrations if m.version not in applied]
+
+        for migration in pending:
+            database_logger.info(
+                f"Applying migration {migration.version}_{migration.name}..."
+            )
+            await self._apply(migration)
+
+        return len(pending)
+
+    async def _apply(self, migration: Migration):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", LOCK_ID)
+                await conn.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        "version" integer NOT NULL PRIMARY KEY,
+                        "name" text NOT NULL,
+                        "checksum" character(64) NOT NULL,
+                        "applied_at" timestamptz NOT NULL DEFAULT now()
+                    )
+                    """)
+
+                # Another process may have applied it while we waited for the lock
+                if await conn.fetchval(
+                    "SELECT 1 FROM schema_migrations WHERE version = $1",
+                    migration.version,
+                ):
+                    return
+
+                await conn.execute(migration.sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) "
+                    "VALUES ($1, $2, $3)",
+                    migration.version,
+                    migration.name,
+                    migration.checksum,
+                )
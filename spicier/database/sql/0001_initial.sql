@@ -0,0 +1,33 @@
+CREATE TABLE IF NOT EXISTS "server" (
+    "id" bigint NOT NULL,
+    "prefix" character varying(10),
+    "channel" bigint,
+    CONSTRAINT "server_pkey" PRIMARY KEY ("id")
+);
+
+CREATE TABLE IF NOT EXISTS "skip" (
+    "id" SERIAL NOT NULL,
+    "server" character varying(50),
+    "user" character varying(50),
+    CONSTRAINT "skip_pkey" PRIMARY KEY ("id")
+);
+
+CREATE TABLE IF NOT EXISTS "queue" (
+    "server" character varying(32) NOT NULL,
+    "index" integer,
+    "isPlaying" boolean,
+    "requester" character varying(50),
+    "textChannel" character varying(50),
+    "track" character varying(128),
+    "title" character varying(512),
+    "duration" integer,
+    CONSTRAINT "queue_pkey" PRIMARY KEY ("server")
+);
+
+CREATE TABLE IF NOT EXISTS "playlist" (
+    "user" character varying(32) NOT NULL,
+    "name" character varying(50),
+    "title" character varying(512),
+    "link" character varying(128),
+    CONSTRAINT "playlist_pkey" PRIMARY KEY ("user")
+);
@@ -0,0 +1 @@
+ALTER TABLE "server" ADD COLUMN IF NOT EXISTS "language" character varying(8);
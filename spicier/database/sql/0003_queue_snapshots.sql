@@ -0,0 +1,19 @@
+-- The original queue table was never used and held one row per server
+DROP TABLE IF EXISTS "queue";
+
+CREATE TABLE "queue" (
+    "server" bigint NOT NULL,
+    "position" integer NOT NULL,
+    "track" text NOT NULL,
+    "info" jsonb NOT NULL,
+    CONSTRAINT "queue_pkey" PRIMARY KEY ("server", "position")
+);
+
+-- Position 0 of the queue is the track that was playing, resumed "elapsed" seconds in
+CREATE TABLE "queue_state" (
+    "server" bigint NOT NULL,
+    "channel" bigint NOT NULL,
+    "elapsed" double precision NOT NULL DEFAULT 0,
+    "saved_at" timestamptz NOT NULL DEFAULT now(),
+    CONSTRAINT "queue_state_pkey" PRIMARY KEY ("server")
+);
@@ -0,0 +1,21 @@
+-- The original playlist table was never used and held one row per user
+DROP TABLE IF EXISTS "playlist";
+
+CREATE TABLE "playlist" (
+    "id" bigint GENERATED ALWAYS AS IDENTITY,
+    "user" bigint NOT NULL,
+    "name" character varying(50) NOT NULL,
+    "tracks" integer NOT NULL DEFAULT 0,
+    "length" double precision NOT NULL DEFAULT 0,
+    "updated_at" timestamptz NOT NULL DEFAULT now(),
+    CONSTRAINT "playlist_pkey" PRIMARY KEY ("id"),
+    CONSTRAINT "playlist_user_name_key" UNIQUE ("user", "name")
+);
+
+CREATE TABLE "playlist_track" (
+    "playlist" bigint NOT NULL REFERENCES "playlist" ("id") ON DELETE CASCADE,
+    "position" integer NOT NULL,
+    "track" text NOT NULL,
+    "info" jsonb NOT NULL,
+    CONSTRAINT "playlist_track_pkey" PRIMARY KEY ("playlist", "position")
+);
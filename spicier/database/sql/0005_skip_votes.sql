@@ -0,0 +1,12 @@
+-- The original skip table was never used and stored ids as text
+DROP TABLE IF EXISTS "skip";
+
+CREATE TABLE "skip" (
+    "server" bigint NOT NULL,
+    "user" bigint NOT NULL,
+    "track" text NOT NULL,
+    "skipped" boolean NOT NULL DEFAULT false,
+    "voted_at" timestamptz NOT NULL
+);
+
+CREATE INDEX "skip_server_voted_at_idx" ON "skip" ("server", "voted_at");
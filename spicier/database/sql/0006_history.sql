@@ -0,0 +1,33 @@
+-- Append-only log of finished tracks, one partition per month created by
+-- HistoryTable before it writes into that month
+CREATE TABLE "history" (
+    "server" bigint NOT NULL,
+    "track" text NOT NULL,
+    "title" text NOT NULL,
+    "uri" text,
+    "played" double precision NOT NULL,
+    "ended_at" timestamptz NOT NULL
+) PARTITION BY RANGE ("ended_at");
+
+CREATE INDEX "history_server_ended_at_idx" ON "history" ("server", "ended_at" DESC);
+
+-- Rollups kept up to date with every batch written to history
+CREATE TABLE "history_top" (
+    "server" bigint NOT NULL,
+    "track" text NOT NULL,
+    "title" text NOT NULL,
+    "uri" text,
+    "plays" integer NOT NULL,
+    "played" double precision NOT NULL,
+    "last_played" timestamptz NOT NULL,
+    CONSTRAINT "history_top_pkey" PRIMARY KEY ("server", "track")
+);
+
+CREATE INDEX "history_top_server_plays_idx" ON "history_top" ("server", "plays" DESC);
+
+CREATE TABLE "history_total" (
+    "server" bigint NOT NULL,
+    "plays" bigint NOT NULL,
+    "played" double precision NOT NULL,
+    CONSTRAINT "history_total_pkey" PRIMARY KEY ("server")
+);
@@ -0,0 +1,10 @@
+-- Lavalink search results shared by every process, keyed by normalized query
+CREATE TABLE "search_cache" (
+    "query" text NOT NULL,
+    "track" text NOT NULL,
+    "info" jsonb NOT NULL,
+    "expires_at" timestamptz NOT NULL,
+    CONSTRAINT "search_cache_pkey" PRIMARY KEY ("query")
+);
+
+CREATE INDEX "search_cache_expires_at_idx" ON "search_cache" ("expires_at");
@@ -1,47 +1,449 @@
+import json
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+
 import asyncpg
 
+if TYPE_CHECKING:
+    from .db import Database
+
 
 class Table:
+    """Base for the tables, hot queries are named in STATEMENTS"""
+
+    STATEMENTS: dict[str, str] = {}
 
-    pool: asyncpg.Pool
+    db: "Database"
     name: str
 
-    def __init__(self, pool: asyncpg.Pool, name: str = ""):
-        self.pool = pool
+    def __init__(self, db: "Database", name: str = ""):
+        self.db = db
         self.name = name
 
+    @property
+    def pool(self) -> asyncpg.Pool:
+        return self.db.pool
+
+    async def _run(self, conn: asyncpg.Connection, method: str, key: str, *args):
+        # Statements are prepared once per connection by asyncpg's statement
+        # cache, keyed by their text
+        name = f"{self.name}_{key}"
+        return await self.db.executor.run(
+            conn,
+            method,
+            name,
+            self.STATEMENTS[key],
+            *args,
+            timeout=self.db.timeout(name),
+        )
+
+    async def fetch(self, key: str, *args, conn: asyncpg.Connection = None):
+        """Run a named statement and return all rows"""
+        if conn:
+            return await self._run(conn, "fetch", key, *args)
+
+        async with self.db.acquire() as conn:
+            return await self._run(conn, "fetch", key, *args)
+
+    async def fetchrow(self, key: str, *args, conn: asyncpg.Connection = None):
+        """Run a named statement and return the first row"""
+        if conn:
+            return await self._run(conn, "fetchrow", key, *args)
+
+        async with self.db.acquire() as conn:
+            return await self._run(conn, "fetchrow", key, *args)
+
+    async def stream(
+        self, key: str, *args, prefetch: int = 100
+    ) -> AsyncIterator[asyncpg.Record]:
+        """Run a named statement and yield its rows as they are fetched"""
+        name = f"{self.name}_{key}"
+
+        async with self.db.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for record in self.db.executor.cursor(
+                    conn,
+                    name,
+                    self.STATEMENTS[key],
+                    *args,
+                    prefetch=prefetch,
+                    timeout=self.db.timeout(name),
+                ):
+                    yield record
+
+    async def copy(
+        self,
+        key: str,
+        records: list[tuple],
+        columns: list[str],
+        conn: asyncpg.Connection,
+        table: str = None,
+    ):
+        """Bulk load records into the table with COPY"""
+        name = f"{self.name}_{key}"
+        await self.db.executor.copy(
+            conn,
+            name,
+            table or self.name,
+            records,
+            columns,
+            timeout=self.db.timeout(name),
+        )
+
 
 class SkipTable(Table):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+
+    COLUMNS = ["server", "user", "track", "skipped", "voted_at"]
+
+    async def insert_many(self, votes: list[tuple]):
+        """Append skip votes, rows are ordered like COLUMNS"""
+        async with self.db.acquire() as conn:
+            await self.copy("copy", votes, self.COLUMNS, conn=conn)
 
 
 class ServerTable(Table):
-    def __init__(self, *args, **kwargs):
+
+    COLUMNS = {"prefix": "varchar", "channel": "bigint", "language": "varchar"}
+    CHANNEL = "server_changed"
+
+    STATEMENTS = {
+        "get": "SELECT * FROM server WHERE id = $1",
+        "get_many": "SELECT * FROM server WHERE id = ANY($1::bigint[])",
+        "get_or_create": """
+            WITH created AS (
+                INSERT INTO server (id) VALUES ($1)
+                ON CONFLICT (id) DO NOTHING
+                RETURNING *
+            )
+            SELECT * FROM created
+            UNION ALL
+            SELECT * FROM server WHERE id = $1
+            LIMIT 1
+        """,
+        "create_many": (
+            "INSERT INTO server (id) SELECT unnest($1::bigint[]) "
+            "ON CONFLICT DO NOTHING"
+        ),
+        "notify": (
+            "SELECT pg_notify($1, $2::text || ':' || id::text) "
+            "FROM unnest($3::bigint[]) AS id"
+        ),
+        **{
+            f"upsert_{column}": (
+                f"INSERT INTO server (id, {column}) "
+                f"SELECT * FROM unnest($1::bigint[], $2::{kind}[]) "
+                f"ON CONFLICT (id) DO UPDATE SET {column} = EXCLUDED.{column}"
+            )
+            for column, kind in COLUMNS.items()
+        },
+    }
+
+    def __init__(self, *args, token: str = "", **kwargs):
         super().__init__(*args, **kwargs)
+        self.token = token
 
-    async def get(self, server_id: str):
-        return await self.pool.fetchrow("SELECT * FROM server WHERE id = $1", server_id)
+    async def get(self, server_id: int):
+        return await self.fetchrow("get", server_id)
 
-    async def create(self, server_id: int):
-        await self.pool.execute("INSERT INTO server (id) VALUES ($1)", server_id)
+    async def get_many(self, server_ids: list[int]):
+        return await self.fetch("get_many", server_ids)
 
-    async def set_channel(self, server_id: int, channel: int):
-        await self.pool.execute(
-            "UPDATE server SET channel = $1 WHERE id = $2", channel, server_id
-        )
+    async def get_or_create(self, server_id: int):
+        """Fetch the server row, inserting an empty one if it does not exist"""
+        return await self.fetchrow("get_or_create", server_id)
 
-    async def set_prefix(self, server_id: int, prefix: str):
-        await self.pool.execute(
-            "UPDATE server SET prefix = $1 WHERE id = $2", prefix, server_id
-        )
+    async def create_many(self, server_ids: list[int]):
+        await self.fetch("create_many", server_ids)
+
+    async def upsert_many(self, changes: dict[str, dict[int, object]]):
+        """Write coalesced column changes, one batched statement per column"""
+        async with self.db.acquire() as conn:
+            async with conn.transaction():
+                for column, rows in changes.items():
+                    if not rows:
+                        continue
+
+                    await self.fetch(
+                        f"upsert_{column}",
+                        list(rows.keys()),
+                        list(rows.values()),
+                        conn=conn,
+                    )
+
+                # Delivered on commit, tells other processes to drop their copy
+                await self.fetch(
+                    "notify",
+                    self.CHANNEL,
+                    self.token,
+                    list(
+                        {server_id for rows in changes.values() for server_id in rows}
+                    ),
+                    conn=conn,
+                )
 
 
 class QueueTable(Table):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+
+    COLUMNS = ["server", "position", "track", "info"]
+    STATE_COLUMNS = ["server", "channel", "elapsed"]
+
+    STATEMENTS = {
+        "load_state": "SELECT * FROM queue_state WHERE server = ANY($1::bigint[])",
+        "load": (
+            "SELECT server, track, info FROM queue "
+            "WHERE server = ANY($1::bigint[]) ORDER BY server, position"
+        ),
+        "delete": "DELETE FROM queue WHERE server = ANY($1::bigint[])",
+        "delete_state": "DELETE FROM queue_state WHERE server = ANY($1::bigint[])",
+        "set_elapsed": """
+            UPDATE queue_state SET elapsed = data.elapsed, saved_at = now()
+            FROM unnest($1::bigint[], $2::double precision[]) AS data(server, elapsed)
+            WHERE queue_state.server = data.server
+        """,
+    }
+
+    async def load(self, server_ids: list[int]):
+        """Saved states and their ordered tracks for the given servers"""
+        async with self.db.acquire() as conn:
+            async with conn.transaction(readonly=True, isolation="repeatable_read"):
+                states = await self.fetch("load_state", server_ids, conn=conn)
+                tracks = await self.fetch("load", server_ids, conn=conn)
+
+        return states, tracks
+
+    async def save(self, states: list[tuple], tracks: list[tuple]):
+        """Replace the snapshots of the servers in states with the given rows"""
+        server_ids = [state[0] for state in states]
+
+        async with self.db.acquire() as conn:
+            async with conn.transaction():
+                await self.fetch("delete", server_ids, conn=conn)
+                await self.fetch("delete_state", server_ids, conn=conn)
+
+                await self.copy(
+                    "copy_state",
+                    states,
+                    self.STATE_COLUMNS,
+                    conn=conn,
+                    table="queue_state",
+                )
+                await self.copy("copy", tracks, self.COLUMNS, conn=conn)
+
+    async def set_elapsed(self, elapsed: dict[int, float]):
+        """Update where the current track of each server is"""
+        await self.fetch("set_elapsed", list(elapsed.keys()), list(elapsed.values()))
+
+    async def delete(self, server_ids: list[int]):
+        async with self.db.acquire() as conn:
+            async with conn.transaction():
+                await self.fetch("delete", server_ids, conn=conn)
+                await self.fetch("delete_state", server_ids, conn=conn)
 
 
 class PlaylistTable(Table):
+
+    COLUMNS = ["playlist", "position", "track", "info"]
+
+    STATEMENTS = {
+        "save": """
+            INSERT INTO playlist ("user", name, tracks, length)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT ("user", name) DO UPDATE
+            SET tracks = EXCLUDED.tracks, length = EXCLUDED.length, updated_at = now()
+            RETURNING id
+        """,
+        "clear": "DELETE FROM playlist_track WHERE playlist = $1",
+        "list": (
+            'SELECT name, tracks, length FROM playlist WHERE "user" = $1 '
+            "ORDER BY name"
+        ),
+        "get": 'SELECT * FROM playlist WHERE "user" = $1 AND name = $2',
+        "tracks": (
+            "SELECT track, info FROM playlist_track WHERE playlist = $1 "
+            "ORDER BY position"
+        ),
+        "delete": ('DELETE FROM playlist WHERE "user" = $1 AND name = $2 RETURNING id'),
+    }
+
+    async def save(self, user_id: int, name: str, tracks: list[tuple[str, dict]]):
+        """Replace the user's playlist with the (track, info) pairs"""
+        length = sum(info.get("length", 0) for _, info in tracks) / 1000
+
+        async with self.db.acquire() as conn:
+            async with conn.transaction():
+                row = await self.fetchrow(
+                    "save", user_id, name, len(tracks), length, conn=conn
+                )
+                await self.fetch("clear", row["id"], conn=conn)
+
+                await self.copy(
+                    "copy",
+                    [
+                        (row["id"], position, track, json.dumps(info))
+                        for position, (track, info) in enumerate(tracks)
+                    ],
+                    self.COLUMNS,
+                    conn=conn,
+                    table="playlist_track",
+                )
+
+    async def user_playlists(self, user_id: int):
+        return await self.fetch("list", user_id)
+
+    async def get(self, user_id: int, name: str):
+        return await self.fetchrow("get", user_id, name)
+
+    async def tracks(self, playlist_id: int) -> AsyncIterator[asyncpg.Record]:
+        """Stream the tracks of the playlist in order"""
+        async for record in self.stream("tracks", playlist_id):
+            yield record
+
+    async def delete(self, user_id: int, name: str) -> bool:
+        return bool(await self.fetchrow("delete", user_id, name))
+
+
+class HistoryTable(Table):
+
+    COLUMNS = ["server", "track", "title", "uri", "played", "ended_at"]
+
+    STATEMENTS = {
+        "recent": (
+            "SELECT title, uri, played, ended_at FROM history WHERE server = $1 "
+            "ORDER BY ended_at DESC LIMIT $2"
+        ),
+        "top": (
+            "SELECT track, title, uri, plays, played FROM history_top "
+            "WHERE server = $1 ORDER BY plays DESC, played DESC LIMIT $2"
+        ),
+        "total": "SELECT plays, played FROM history_total WHERE server = $1",
+        "rollup_top": """
+            INSERT INTO history_top AS top
+                (server, track, title, uri, plays, played, last_played)
+            SELECT * FROM unnest(
+                $1::bigint[], $2::text[], $3::text[], $4::text[],
+                $5::integer[], $6::double precision[], $7::timestamptz[]
+            )
+            ON CONFLICT (server, track) DO UPDATE SET
+                title = EXCLUDED.title,
+                uri = EXCLUDED.uri,
+                plays = top.plays + EXCLUDED.plays,
+                played = top.played + EXCLUDED.played,
+                last_played = greatest(top.last_played, EXCLUDED.last_played)
+        """,
+        "rollup_total": """
+            INSERT INTO history_total AS total (server, plays, played)
+            SELECT * FROM unnest($1::bigint[], $2::bigint[], $3::double precision[])
+            ON CONFLICT (server) DO UPDATE SET
+                plays = total.plays + EXCLUDED.plays,
+                played = total.played + EXCLUDED.played
+        """,
+    }
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self._partitions: set[tuple[int, int]] = set()
+
+    async def _ensure_partition(self, conn: asyncpg.Connection, year: int, month: int):
+        if (year, month) in self._partitions:
+            return
+
+        start = datetime(year, month, 1, tzinfo=timezone.utc)
+        end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+
+        try:
+            await self.db.executor.run(
+                conn,
+                "execute",
+                "history_partition",
+                f'CREATE TABLE IF NOT EXISTS "history_y{year}m{month:02d}" '
+                f"PARTITION OF history "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')",
+            )
+        except (asyncpg.DuplicateTableError, asyncpg.UniqueViolationError):
+            pass  # Created by another process at the same time
+
+        self._partitions.add((year, month))
+
+    @staticmethod
+    def rollup(records: list[tuple]) -> tuple[list[tuple], list[tuple]]:
+        """Plays and seconds of the records summed per server and track, for
+        history_top, and per server, for history_total"""
+        top: dict[tuple[int, str], list] = {}
+        total: dict[int, list] = {}
+
+        for server, track, title, uri, played, ended_at in records:
+            if entry := top.get((server, track)):
+                # Title and uri of the latest play, records may be out of order
+                if ended_at >= entry[4]:
+                    entry[0:2] = title, uri
+                    entry[4] = ended_at
+                entry[2] += 1
+                entry[3] += played
+            else:
+                top[(server, track)] = [title, uri, 1, played, ended_at]
+
+            totals = total.setdefault(server, [0, 0.0])
+            totals[0] += 1
+            totals[1] += played
+
+        return (
+            [(*key, *entry) for key, entry in top.items()],
+            [(server, *totals) for server, totals in total.items()],
+        )
+
+    async def append(self, records: list[tuple]):
+        """Write finished tracks, ordered like COLUMNS, and add them to the rollups"""
+        top, total = self.rollup(records)
+
+        async with self.db.acquire() as conn:
+            for year, month in {(r[5].year, r[5].month) for r in records}:
+                await self._ensure_partition(conn, year, month)
+
+            async with conn.transaction():
+                await self.copy("copy", records, self.COLUMNS, conn=conn)
+
+                await self.fetch(
+                    "rollup_top", *[list(column) for column in zip(*top)], conn=conn
+                )
+                await self.fetch(
+                    "rollup_total", *[list(column) for column in zip(*total)], conn=conn
+                )
+
+    async def recent(self, server_id: int, limit: int = 10):
+        return await self.fetch("recent", server_id, limit)
+
+    async def top(self, server_id: int, limit: int = 10):
+        return await self.fetch("top", server_id, limit)
+
+    async def total(self, server_id: int):
+        return await self.fetchrow("total", server_id)
+
+
+class SearchTable(Table):
+
+    STATEMENTS = {
+        "get": (
+            "SELECT track, info FROM search_cache "
+            "WHERE query = $1 AND expires_at > now()"
+        ),
+        "put": """
+            INSERT INTO search_cache (query, track, info, expires_at)
+            VALUES ($1, $2, $3, now() + make_interval(secs => $4))
+            ON CONFLICT (query) DO UPDATE SET
+                track = EXCLUDED.track,
+                info = EXCLUDED.info,
+                expires_at = EXCLUDED.expires_at
+        """,
+        "purge": "DELETE FROM search_cache WHERE expires_at <= now()",
+    }
+
+    async def get(self, query: str) -> Optional[tuple[str, dict]]:
+        """The cached track for the query, if it has not expired"""
+        row = await self.fetchrow("get", query)
+        return (row["track"], json.loads(row["info"])) if row else None
+
+    async def put(self, query: str, track: str, info: dict, ttl: float):
+        await self.fetch("put", query, track, json.dumps(info), ttl)
+
+    async def purge(self):
+        await self.fetch("purge")
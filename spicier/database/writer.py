@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from discord.ext import tasks
+
+database_logger = logging.getLogger("spicier.database")
+
+
+class BufferedWriter:
+    """Collects records in memory and writes them in batches in the background,
+    so the caller never waits on the database"""
+
+    def __init__(
+        self,
+        name: str,
+        write: Callable[[list[tuple]], Awaitable[None]],
+        ready: Callable[[], bool],
+        interval: float = 10,
+        max_batch: int = 500,
+        max_buffer: int = 50000,
+    ):
+        self.name = name
+        self._write = write
+        self._ready = ready
+        self._interval = interval
+        self._max_batch = max_batch
+        self._max_buffer = max_buffer
+
+        self._buffer: list[tuple] = []
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task = None
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def start(self):
+        self._flush_loop.change_interval(seconds=self._interval)
+        self._flush_loop.start()
+
+    async def close(self):
+        self._flush_loop.cancel()
+        await self.flush()
+
+    @tasks.loop(seconds=10)
+    async def _flush_loop(self):
+        await self.flush()
+
+    def add(self, record: tuple):
+        """Buffer a record, a full batch is written right away"""
+        self._buffer.append(record)
+
+        if len(self._buffer) > self._max_buffer:
+            # The database has been away for a while, keep the newest records
+            overflow = len(self._buffer) - self._max_buffer
+            del self._buffer[:overflow]
+            self.dropped += overflow
+
+        if len(self._buffer) < self._max_batch:
+            return
+
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """Write everything buffered, records are kept if the write fails"""
+        async with self._lock:
+            if not self._buffer or not self._ready():
+                return
+
+            batch, self._buffer = self._buffer, []
+
+            try:
+                await self._write(batch)
+            except Exception as exception:
+                database_logger.error(
+                    f"Failed to write {len(batch)} {self.name} records: {exception}"
+                )
+                self._buffer[:0] = batch
@@ -1,9 +1,11 @@
 from .bot import BadConfig
 from .commands import WrongArgument
+from .database import DatabaseUnavailable, MigrationError
 from .music import (
     PlayerNotPlaying,
     QueueEmpty,
     SearchNotFound,
     VoiceConnectionError,
     InvalidVolume,
+    PlaylistNotFound,
 )
@@ -0,0 +1,9 @@
+from discord.ext.commands.errors import CommandError
+
+
+class MigrationError(Exception):
+    """Raised when the database migrations are inconsistent"""
+
+
+class DatabaseUnavailable(CommandError):
+    """Raised when a command needs the database while it is not ready"""
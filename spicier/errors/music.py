@@ -22,3 +22,11 @@ class PlayerNotPlaying(CommandError):
 
 class InvalidVolume(CommandError):
     """Raised when the volume is below 0 or above max"""
+
+
+class PlaylistNotFound(CommandError):
+    """Raised when the user has no playlist with the given name"""
+
+    def __init__(self, name: str):
+        self.name = name
+        super().__init__(name)
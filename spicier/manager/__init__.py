@@ -1 +1,7 @@
+from .history import HistoryManager
+from .idle import IdleManager
+from .node import NodeManager
+from .queue import QueueManager
+from .search import SearchManager
 from .server import ServerManager
+from .skip import SkipManager
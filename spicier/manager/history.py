@@ -0,0 +1,79 @@
+import time
+from datetime import datetime, timezone
+
+import wavelink
+
+from spicier.config import Config
+from spicier.database import Database
+from spicier.database.writer import BufferedWriter
+
+
+class HistoryManager:
+    """Records finished tracks and reads the per guild rollups"""
+
+    def __init__(self, db: Database, config: Config):
+        self._config = config
+        self._db = db
+
+        options = config.history
+        self._writer = BufferedWriter(
+            "history",
+            self._write,
+            lambda: self._db.ready,
+            interval=options["flush_interval"],
+            max_batch=options["max_batch"],
+        )
+
+        # guild_id -> when the current track started playing
+        self._started: dict[int, float] = {}
+
+    async def start(self):
+        """Start writing the history in the background"""
+        self._writer.start()
+
+    async def close(self):
+        """Write the history that is still buffered"""
+        await self._writer.close()
+
+    async def _write(self, records: list[tuple]):
+        await self._db.history.append(records)
+
+    def started(self, guild_id: int):
+        self._started[guild_id] = time.monotonic()
+
+    def finished(self, guild_id: int, track: wavelink.Track, reason: str):
+        """Record a track that stopped playing"""
+        started = self._started.pop(guild_id, None)
+
+        if reason == "FINISHED":
+            played = track.length
+        elif started is not None:
+            played = time.monotonic() - started
+        else:
+            return
+
+        self.record(guild_id, track, played)
+
+    def record(self, guild_id: int, track: wavelink.Track, played: float):
+        """Remember that the track was played for the given number of seconds"""
+        self._writer.add(
+            (
+                guild_id,
+                track.identifier or track.uri or track.title,
+                track.title,
+                track.uri,
+                min(played, track.length),
+                datetime.now(timezone.utc),
+            )
+        )
+
+    async def recent(self, guild_id: int, limit: int = 10):
+        return await self._db.history.recent(guild_id, limit)
+
+    async def top(self, guild_id: int, limit: int = 10):
+        return await self._db.history.top(guild_id, limit)
+
+    async def total(self, guild_id: int) -> tuple[int, float]:
+        """Tracks played and seconds listened in the guild"""
+        row = await self._db.history.total(guild_id)
+        return (row["plays"], row["played"]) if row else (0, 0.0)
@@ -0,0 +1,137 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Callable, Optional
+
+import discord
+import wavelink
+from discord.ext import tasks
+
+from spicier.config import Config
+from spicier.metrics import REGISTRY
+
+manager_logger = logging.getLogger("spicier.manager")
+
+
+def reapable(player: wavelink.Player) -> bool:
+    """Whether the player is alone in its channel or has nothing left to play"""
+    channel = player.channel
+
+    if channel is not None and not any(not m.bot for m in channel.members):
+        return True
+
+    return player.track is None and player.queue.is_empty
+
+
+class IdleManager:
+    """Disconnects players that stayed alone or idle for leave_time, every
+    deadline is kept in one heap and waited on by a single task"""
+
+    def __init__(
+        self,
+        client: discord.Client,
+        config: Config,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._client = client
+        self._config = config
+        self._clock = clock
+
+        # guild_id -> deadline, heap entries that don't match it are stale
+        self._deadlines: dict[int, float] = {}
+        self._heap: list[tuple[float, int]] = []
+        self._wakeup = asyncio.Event()
+
+        self.disconnects = REGISTRY.counter(
+            "spicier_idle_disconnects_total", "Players disconnected for idling"
+        )
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    async def start(self):
+        """Start waiting on the deadlines"""
+        self._reap_loop.start()
+
+    async def close(self):
+        self._reap_loop.cancel()
+
+    def deadline(self, guild_id: int) -> Optional[float]:
+        return self._deadlines.get(guild_id)
+
+    def update(self, player: wavelink.Player):
+        """Schedule or cancel the disconnect after the player's state changed"""
+        if reapable(player):
+            self.schedule(player.guild.id)
+        else:
+            self.cancel(player.guild.id)
+
+    def schedule(self, guild_id: int, delay: Optional[float] = None):
+        """Disconnect the guild's player after the delay, unless it is already
+        scheduled, the time counts from when it first went idle"""
+        if guild_id in self._deadlines:
+            return
+
+        if delay is None:
+            delay = self._config.leave_time
+
+        deadline = self._clock() + delay
+        self._deadlines[guild_id] = deadline
+
+        # Only an earlier deadline than the one waited on needs a wakeup
+        if not self._heap or deadline < self._heap[0][0]:
+            self._wakeup.set()
+
+        heapq.heappush(self._heap, (deadline, guild_id))
+
+    def cancel(self, guild_id: int):
+        if self._deadlines.pop(guild_id, None) is None:
+            return
+
+        # Stale entries are dropped lazily, rebuild once they outnumber the rest
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, g) for g, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    @tasks.loop(seconds=0)
+    async def _reap_loop(self):
+        self._wakeup.clear()
+        timeout = self._heap[0][0] - self._clock() if self._heap else None
+
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        await self._reap()
+
+    async def _reap(self):
+        now = self._clock()
+
+        while self._heap and self._heap[0][0] <= now:
+            deadline, guild_id = heapq.heappop(self._heap)
+
+            if self._deadlines.get(guild_id) != deadline:
+                continue
+
+            del self._deadlines[guild_id]
+            await self._disconnect(guild_id)
+
+    async def _disconnect(self, guild_id: int):
+        guild = self._client.get_guild(guild_id)
+        player = guild.voice_client if guild else None
+
+        # Someone came back or a track started without an update reaching here
+        if player is None or not reapable(player):
+            return
+
+        try:
+            await player.disconnect()
+        except Exception as exception:
+            manager_logger.error(
+                f"Failed to disconnect idle player of {guild_id}: {exception}"
+            )
+            return
+
+        self.disconnects.inc()
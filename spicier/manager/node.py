@@ -0,0 +1,122 @@
+import logging
+import time
+
+import discord
+import wavelink
+from discord.ext import tasks
+from wavelink.errors import NodeOccupied, ZeroConnectedNodes
+from wavelink.utils import MISSING
+
+from spicier.config import Config
+from spicier.metrics import REGISTRY
+from spicier.models import SpicierPlayer, best_node, decode_events
+
+manager_logger = logging.getLogger("spicier.manager")
+
+
+class NodeManager:
+    """Connects the Lavalink nodes and moves players off nodes that drop"""
+
+    def __init__(self, client: discord.Client, config: Config):
+        self._client = client
+        self._config = config
+
+        # node identifier -> when it was first seen disconnected
+        self._down: dict[str, float] = {}
+        # node identifier -> guilds moved off it, destroyed there once it is back
+        self._moved: dict[str, set[int]] = {}
+
+        self.failovers = REGISTRY.counter(
+            "spicier_lavalink_failovers_total", "Players moved off a dropped node"
+        )
+
+    async def start(self):
+        """Start checking the nodes"""
+        self._health_loop.change_interval(seconds=self._config.failover["interval"])
+        self._health_loop.start()
+
+    async def close(self):
+        self._health_loop.cancel()
+
+    async def connect(self):
+        """Create a node for every configured Lavalink server"""
+        # The bot user is known after login, no need to wait for the gateway
+        for options in self._config.lavalink:
+            try:
+                node = await wavelink.NodePool.create_node(bot=self._client, **options)
+            except NodeOccupied:
+                continue
+
+            decode_events(node)
+
+    @tasks.loop(seconds=5)
+    async def _health_loop(self):
+        for node in list(wavelink.NodePool().nodes.values()):
+            try:
+                await self._check(node)
+            except Exception as exception:
+                manager_logger.error(
+                    f"Failed to check node {node.identifier}: {exception}"
+                )
+
+    async def _check(self, node: wavelink.Node):
+        if node.is_connected():
+            self._down.pop(node.identifier, None)
+            await self._release(node)
+            return
+
+        down = self._down.setdefault(node.identifier, time.monotonic())
+
+        # wavelink only retries after a drop, not when the first connect failed
+        websocket = node._websocket
+        if websocket is not MISSING and websocket.listener is None:
+            await websocket.connect()
+
+        # Lavalink resumes players after a short drop, give it the chance
+        if node.players and time.monotonic() - down >= self._config.failover["grace"]:
+            await self._failover(node)
+
+    async def _failover(self, node: wavelink.Node):
+        moved = self._moved.setdefault(node.identifier, set())
+
+        for player in list(node.players):
+            if not isinstance(player, SpicierPlayer):
+                continue
+
+            try:
+                target = best_node(exclude=node)
+            except ZeroConnectedNodes:
+                manager_logger.warning(
+                    f"Node {node.identifier} is down and no other node is up"
+                )
+                return
+
+            try:
+                await player.switch_node(target)
+            except Exception as exception:
+                manager_logger.error(
+                    f"Failed to move player of {player.guild.id}: {exception}"
+                )
+                continue
+
+            moved.add(player.guild.id)
+            self.failovers.inc()
+
+            manager_logger.info(
+                f"Moved player of {player.guild.id} from node "
+                f"{node.identifier} to {target.identifier}"
+            )
+
+    async def _release(self, node: wavelink.Node):
+        """Destroy the players moved off a node that came back, Lavalink would
+        keep playing them there otherwise"""
+        guilds = self._moved.pop(node.identifier, None)
+
+        if not guilds:
+            return
+
+        # Guilds placed on the node again since then keep their player
+        guilds -= {player.guild.id for player in node.players}
+
+        for guild_id in guilds:
+            await node._websocket.send(op="destroy", guildId=str(guild_id))
@@ -0,0 +1,189 @@
+import json
+import logging
+import time
+
+import discord
+import wavelink
+from discord.ext import tasks
+
+from spicier.config import Config
+from spicier.database import Database
+from spicier.models import QueueEntry, SpicierPlayer
+
+manager_logger = logging.getLogger("spicier.manager")
+
+
+class QueueManager:
+    """Snapshots player queues to the database so they survive a restart"""
+
+    def __init__(self, client: discord.Client, db: Database, config: Config):
+        self._client = client
+        self._config = config
+        self._db = db
+
+        # server_id -> fingerprint of the queue as last saved
+        self._saved: dict[int, int] = {}
+        self._restored = False
+
+    async def start(self):
+        """Start saving the queues periodically"""
+        self._save_loop.change_interval(seconds=self._config.queue["save_interval"])
+        self._save_loop.start()
+
+    async def close(self):
+        """Stop the save loop and save every queue one last time"""
+        self._save_loop.cancel()
+        await self.save()
+
+    @tasks.loop(seconds=30)
+    async def _save_loop(self):
+        await self.save()
+
+    def _players(self) -> list[wavelink.Player]:
+        return [
+            player
+            for player in self._client.voice_clients
+            if isinstance(player, wavelink.Player) and player.is_connected()
+        ]
+
+    @staticmethod
+    def _tracks(player: wavelink.Player) -> list[wavelink.abc.Playable]:
+        tracks = list(player.queue)
+
+        if player.track:
+            tracks.insert(0, player.track)
+
+        return [
+            track for track in tracks if isinstance(track, (wavelink.Track, QueueEntry))
+        ]
+
+    @staticmethod
+    def _info(track: wavelink.abc.Playable) -> dict:
+        # Entries are restored as entries, the title and length are enough
+        if isinstance(track, QueueEntry):
+            return {"title": track.title, "length": int(track.length * 1000)}
+
+        return track.info
+
+    @staticmethod
+    def _fingerprint(player: wavelink.Player, tracks: list) -> int:
+        return hash((player.channel.id, tuple(track.id for track in tracks)))
+
+    async def save(self):
+        """Rewrite the snapshots of queues changed since the last save, only
+        the position in the current track is updated for the others"""
+        if not self._db.ready:
+            return
+
+        start = time.perf_counter()
+        states, rows, elapsed = [], [], {}
+        live = set()
+
+        for player in self._players():
+            server_id = player.guild.id
+            tracks = self._tracks(player)
+
+            if not tracks:
+                continue
+
+            live.add(server_id)
+            position = player.position if player.track else 0
+            fingerprint = self._fingerprint(player, tracks)
+
+            if self._saved.get(server_id) == fingerprint:
+                elapsed[server_id] = position
+                continue
+
+            self._saved[server_id] = fingerprint
+            states.append((server_id, player.channel.id, position))
+            rows.extend(
+                (server_id, index, track.id, json.dumps(self._info(track)))
+                for index, track in enumerate(tracks)
+            )
+
+        stale = [server_id for server_id in self._saved if server_id not in live]
+
+        try:
+            if states:
+                await self._db.queue.save(states, rows)
+            if elapsed:
+                await self._db.queue.set_elapsed(elapsed)
+            if stale:
+                await self._db.queue.delete(stale)
+        except Exception as exception:
+            manager_logger.error(f"Failed to save queues: {exception}")
+
+            # Saved again on the next run
+            for state in states:
+                self._saved.pop(state[0], None)
+            return
+
+        for server_id in stale:
+            self._saved.pop(server_id, None)
+
+        if states:
+            manager_logger.info(
+                f"Saved {len(states)} queues ({len(rows)} tracks) "
+                f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+            )
+
+    async def restore(self) -> list[wavelink.Player]:
+        """Reconnect the players saved before the last shutdown, once"""
+        if self._restored:
+            return []
+
+        self._restored = True
+        await self._db.wait_until_ready()
+
+        start = time.perf_counter()
+        states, rows = await self._db.queue.load(
+            [guild.id for guild in self._client.guilds]
+        )
+
+        tracks: dict[int, list[QueueEntry]] = {}
+        for row in rows:
+            entry = QueueEntry.from_info(row["track"], json.loads(row["info"]))
+            tracks.setdefault(row["server"], []).append(entry)
+
+        players, dropped = [], []
+
+        for state in states:
+            server_id = state["server"]
+            channel = self._client.get_channel(state["channel"])
+            saved = tracks.get(server_id)
+
+            if not saved or not isinstance(channel, discord.VoiceChannel):
+                dropped.append(server_id)
+                continue
+
+            try:
+                player = await self._resume(channel, saved, state)
+            except Exception as exception:
+                manager_logger.error(
+                    f"Failed to restore queue of {server_id}: {exception}"
+                )
+                dropped.append(server_id)
+                continue
+
+            self._saved[server_id] = self._fingerprint(player, saved)
+            players.append(player)
+
+        if dropped:
+            await self._db.queue.delete(dropped)
+
+        manager_logger.info(
+            f"Restored {len(players)} queues ({len(rows)} tracks) "
+            f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+        return players
+
+    async def _resume(
+        self, channel: discord.VoiceChannel, tracks: list[QueueEntry], state
+    ) -> wavelink.Player:
+        player: wavelink.Player = await channel.connect(cls=SpicierPlayer)
+
+        current, rest = tracks[0], tracks[1:]
+        player.queue.extend(rest)
+
+        await player.play(current.decode(), start=int(state["elapsed"] * 1000))
+        return player
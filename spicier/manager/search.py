@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Iterator, Optional
+
+import wavelink
+from cachetools import TTLCache
+from discord.ext import tasks
+from wavelink.errors import LavalinkException, LoadTrackError
+
+from spicier.config import Config
+from spicier.database import Database
+from spicier.metrics import REGISTRY
+from spicier.models import QueueEntry, best_node
+
+manager_logger = logging.getLogger("spicier.manager")
+
+WHITESPACE = re.compile(r"\s+")
+URL = re.compile(r"^<?(https?://[^\s<>]+)>?$", re.IGNORECASE)
+PLAYLIST = re.compile(
+    r"[?&]list=[\w-]+|/sets/[\w-]+|/playlists?/|/album/", re.IGNORECASE
+)
+
+
+class QueryKind(Enum):
+    SEARCH = "search"
+    URL = "url"
+    PLAYLIST = "playlist"
+
+
+def normalize(query: str) -> str:
+    """Searches that only differ in case or spacing share a cache entry"""
+    return WHITESPACE.sub(" ", query).strip().casefold()
+
+
+def classify(query: str) -> tuple[QueryKind, str]:
+    """Tell a direct link, a playlist link and a search apart without Lavalink"""
+    query = query.strip()
+
+    if not (match := URL.match(query)):
+        return QueryKind.SEARCH, query
+
+    url = match.group(1)
+    return (QueryKind.PLAYLIST if PLAYLIST.search(url) else QueryKind.URL), url
+
+
+@dataclass
+class Resolution:
+    """Tracks a play request resolved to and the Lavalink requests it took"""
+
+    kind: QueryKind
+    tracks: list[wavelink.Track] = field(default_factory=list)
+    playlist: Optional[str] = None
+    calls: int = 0
+
+    # Raw Lavalink entries of a playlist that were not turned into tracks yet
+    rest: list[dict] = field(default_factory=list)
+
+    # Duration of every track in seconds, summed once the tracks are known
+    length: float = field(init=False, default=0.0)
+
+    def __post_init__(self):
+        self.measure()
+
+    def measure(self):
+        """Sum the duration of the tracks, playlists can have thousands"""
+        length = sum(track.length for track in self.tracks)
+        self.length = length + sum(e["info"]["length"] for e in self.rest) / 1000
+
+    @property
+    def total(self) -> int:
+        return len(self.tracks) + len(self.rest)
+
+    def chunks(
+        self, size: int, requester: Optional[int] = None
+    ) -> Iterator[list[QueueEntry]]:
+        """Queue entries for the rest of the tracks, a chunk at a time"""
+        for i in range(0, len(self.rest), size):
+            yield [
+                QueueEntry.from_info(entry["track"], entry["info"], requester)
+                for entry in self.rest[i : i + size]
+            ]
+
+
+class SearchManager:
+    """Caches Lavalink search results in memory and in the database"""
+
+    def __init__(self, db: Database, config: Config):
+        self._config = config
+        self._db = db
+
+        options = config.search
+        self._ttl = options["ttl"]
+        self._memory = TTLCache(maxsize=options["memory_size"], ttl=self._ttl)
+
+        # Single-flight: normalized query -> search shared by concurrent requests
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._stores: set[asyncio.Task] = set()
+
+        self.requests = REGISTRY.counter(
+            "spicier_search_requests_total", "Searches by the tier that answered"
+        )
+        self.latency = REGISTRY.histogram(
+            "spicier_search_seconds", "Time to answer a search by tier"
+        )
+        self.saved = REGISTRY.counter(
+            "spicier_search_saved_seconds_total",
+            "Lavalink time avoided by answering searches from the cache",
+        )
+        self.calls = REGISTRY.histogram(
+            "spicier_lavalink_calls_per_request",
+            "Lavalink requests made to resolve one play request",
+            buckets=(0, 1, 2, 3),
+        )
+        self.loads = REGISTRY.counter(
+            "spicier_lavalink_loads_total", "Lavalink load requests by query kind"
+        )
+
+    async def start(self):
+        """Start purging expired results from the database"""
+        self._purge_loop.start()
+
+    async def close(self):
+        self._purge_loop.cancel()
+
+        if self._stores:
+            await asyncio.gather(*self._stores, return_exceptions=True)
+
+    @tasks.loop(hours=1)
+    async def _purge_loop(self):
+        if not self._db.ready:
+            return
+
+        try:
+            await self._db.search.purge()
+        except Exception as exception:
+            manager_logger.error(f"Failed to purge search cache: {exception}")
+
+    async def resolve(self, query: str) -> Resolution:
+        """Resolve the input of a play command with at most one Lavalink load"""
+        kind, query = classify(query)
+        resolution = Resolution(kind)
+
+        if kind is QueryKind.SEARCH:
+            cached, tier = await self._search(query)
+            resolution.calls = int(tier == "lavalink")
+
+            if cached:
+                resolution.tracks.append(self._build(cached))
+        else:
+            resolution.calls = 1
+            await self._load(query, resolution)
+
+        resolution.measure()
+
+        self.calls.observe(resolution.calls, kind=kind.value)
+        self.loads.inc(resolution.calls, kind=kind.value)
+
+        return resolution
+
+    async def _load(self, url: str, resolution: Resolution):
+        # One loadtracks request handles every load type, the public
+        # get_tracks/get_playlist each reject the other's results
+        node = best_node()
+        data, response = await node._get_data("loadtracks", {"identifier": url})
+
+        if response.status != 200:
+            raise LavalinkException("Invalid response from Lavalink server.")
+
+        load_type = data.get("loadType")
+
+        if load_type == "LOAD_FAILED":
+            raise LoadTrackError(data)
+
+        entries = data.get("tracks", [])
+
+        if not entries:
+            return
+
+        selected = 0
+
+        if load_type == "PLAYLIST_LOADED":
+            info = data["playlistInfo"]
+            resolution.playlist = info["name"]
+
+            # watch?v=...&list=... links select a track, the playlist starts
+            # there and wraps around to the tracks before it
+            if 0 <= info.get("selectedTrack", -1) < len(entries):
+                selected = info["selectedTrack"]
+
+            resolution.rest = entries[selected + 1 :] + entries[:selected]
+
+        # Only the first track is built now, so playback can start right away
+        first = entries[selected]
+        resolution.tracks.append(wavelink.YouTubeTrack(first["track"], first["info"]))
+
+    async def search(self, query: str) -> Optional[wavelink.YouTubeTrack]:
+        """First YouTube result for the query"""
+        cached, _ = await self._search(query)
+        return self._build(cached)
+
+    async def _search(self, query: str) -> tuple[Optional[tuple[str, dict]], str]:
+        """Cached result for the query and the tier that answered"""
+        key = normalize(query)
+        start = time.perf_counter()
+
+        if cached := self._memory.get(key):
+            self._hit("memory", start)
+            return cached, "memory"
+
+        inflight = self._inflight.get(key)
+        if inflight:
+            self.requests.inc(tier="coalesced")
+            cached, _ = await asyncio.shield(inflight)
+            return cached, "coalesced"
+
+        task = asyncio.ensure_future(self._fetch(key, query, start))
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        self._inflight[key] = task
+
+        return await asyncio.shield(task)
+
+    async def _fetch(
+        self, key: str, query: str, start: float
+    ) -> tuple[Optional[tuple[str, dict]], str]:
+        """Cached under the normalized key, searched with the text as typed"""
+        if self._db.ready:
+            try:
+                cached = await self._db.search.get(key)
+            except Exception as exception:
+                manager_logger.error(f"Failed to read search cache: {exception}")
+                cached = None
+
+            if cached:
+                self._memory[key] = cached
+                self._hit("database", start)
+                return cached, "database"
+
+        track = await wavelink.YouTubeTrack.search(
+            query=query, node=best_node(), return_first=True
+        )
+
+        self.requests.inc(tier="lavalink")
+        self.latency.observe(time.perf_counter() - start, tier="lavalink")
+
+        if not track:
+            return None, "lavalink"
+
+        result = (track.id, track.info)
+        self._memory[key] = result
+        self._store(key, result)
+
+        return result, "lavalink"
+
+    def _store(self, key: str, result: tuple[str, dict]):
+        # The requester doesn't wait for the write
+        if not self._db.ready:
+            return
+
+        task = asyncio.ensure_future(self._db.search.put(key, *result, self._ttl))
+        task.add_done_callback(self._stored)
+        self._stores.add(task)
+
+    def _stored(self, task: asyncio.Task):
+        self._stores.discard(task)
+
+        if not task.cancelled() and task.exception():
+            manager_logger.error(f"Failed to cache search: {task.exception()}")
+
+    def _hit(self, tier: str, start: float):
+        elapsed = time.perf_counter() - start
+
+        self.requests.inc(tier=tier)
+        self.latency.observe(elapsed, tier=tier)
+
+        if lavalink := self.latency.mean(tier="lavalink"):
+            self.saved.inc(max(0.0, lavalink - elapsed))
+
+    @staticmethod
+    def _build(cached: Optional[tuple[str, dict]]):
+        return wavelink.YouTubeTrack(*cached) if cached else None
@@ -1,7 +1,16 @@
+import asyncio
+import logging
+from collections import Counter
+
+from discord.ext import tasks
+
 from spicier.cache import Cache
 from spicier.config import Config
 from spicier.database import Database
-from spicier.models import Server
+from spicier.database.tables import ServerTable
+from spicier.models import GuildState, Server
+
+manager_logger = logging.getLogger("spicier.manager")
 
 
 class ServerManager:
@@ -12,27 +21,195 @@ class ServerManager:
         self._cache = cache
         self._db = db
 
+        # Write-behind: server_id -> {column: value} not yet persisted
+        self._pending: dict[int, dict[str, object]] = {}
+        # Batch being written, still newer than the rows until it commits
+        self._inflight_changes: dict[int, dict[str, object]] = {}
+        self._max_dirty: int = config.write_behind["max_dirty"]
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task = None
+
+        # Single-flight: server_id -> load shared by concurrent cache misses
+        self._inflight: dict[int, asyncio.Future] = {}
+        self.counters = Counter(hits=0, misses=0, coalesced=0, degraded=0)
+
+        # Registry of guilds with live state (e.g. a connected player)
+        self._guilds: dict[int, GuildState] = {}
+
+    async def start(self):
+        """Start flushing pending changes periodically and listen for changes
+        made by other processes"""
+        await self._db.listen(ServerTable.CHANNEL, self._on_server_changed)
+
+        self._flush_loop.change_interval(seconds=self._config.write_behind["interval"])
+        self._flush_loop.start()
+
+    async def close(self):
+        """Stop the flush loop and persist everything that is pending"""
+        self._flush_loop.cancel()
+        await self.flush()
+
+    def _on_server_changed(self, payload: str):
+        # Shared backends already hold what the other process wrote
+        if self._cache.shared:
+            return
+
+        if payload is None:
+            for state in self._guilds.values():
+                state.server = None
+
+            asyncio.ensure_future(self._cache.clear())
+            return
+
+        if state := self._guilds.get(int(payload)):
+            state.server = None
+
+        asyncio.ensure_future(self._cache.expire_server(int(payload)))
+
+    @tasks.loop(seconds=5)
+    async def _flush_loop(self):
+        await self.flush()
+
+    async def flush(self):
+        """Persist all pending changes as one batch"""
+        async with self._flush_lock:
+            if not self._pending or not self._db.ready:
+                return
+
+            pending, self._pending = self._pending, {}
+            self._inflight_changes = pending
+
+            changes: dict[str, dict[int, object]] = {}
+            for server_id, fields in pending.items():
+                for column, value in fields.items():
+                    changes.setdefault(column, {})[server_id] = value
+
+            try:
+                await self._db.server.upsert_many(changes)
+            except Exception as exception:
+                manager_logger.error(
+                    f"Failed to flush {len(pending)} servers: {exception}"
+                )
+                self._restore_pending(pending)
+            finally:
+                self._inflight_changes = {}
+
+    def _restore_pending(self, pending: dict[int, dict[str, object]]):
+        """Put back changes that failed to flush, newer writes take precedence"""
+        for server_id, fields in pending.items():
+            self._pending[server_id] = {**fields, **self._pending.get(server_id, {})}
+
+    def _mark_dirty(self, server_id: int, column: str, value):
+        self._pending.setdefault(server_id, {})[column] = value
+
+        if len(self._pending) < self._max_dirty:
+            return
+
+        if not self._flush_task or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
     async def get(self, server_id: int) -> Server:
         """Get the server for the given ID"""
-        cached = self._cache.get_server(server_id)
+        cached = await self._cache.get_server(server_id)
         if cached:
+            self.counters["hits"] += 1
             return cached
 
-        result = await self._db.server.get(server_id)
+        # Until the database is up, serve defaults without caching them
+        if not self._db.ready:
+            self.counters["degraded"] += 1
+            server = Server(server_id)
+            self._apply_pending(server)
+            return server
+
+        # Concurrent misses for the same server share a single database load
+        inflight = self._inflight.get(server_id)
+        if inflight:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        self.counters["misses"] += 1
+
+        task = asyncio.ensure_future(self._load(server_id))
+        task.add_done_callback(lambda _: self._inflight.pop(server_id, None))
+        self._inflight[server_id] = task
+
+        return await asyncio.shield(task)
 
-        server = None
+    async def _load(self, server_id: int) -> Server:
+        result = await self._db.server.get_or_create(server_id)
+
+        # A row inserted by a concurrent transaction is not visible to the
+        # statement snapshot, read it again once that transaction committed
         if not result:
-            server = await self.create(server_id)
-        else:
-            server = Server.create(result)
+            result = await self._db.server.get(server_id)
+
+        server = Server.create(result)
 
+        self._apply_pending(server)
         await self.set_cache(server_id, server)
 
         return server
 
+    def _apply_pending(self, server: Server):
+        """Changes not flushed yet are newer than the database row"""
+        for changes in (self._inflight_changes, self._pending):
+            for column, value in changes.get(server.server_id, {}).items():
+                setattr(server, column, value)
+
+    async def warm(self, server_ids: list[int], chunk_size: int = 1000) -> int:
+        """Load the servers with the given IDs into the cache in bulk"""
+        server_ids = list(server_ids)[: self._cache.maxsize]
+
+        for i in range(0, len(server_ids), chunk_size):
+            chunk = server_ids[i : i + chunk_size]
+            results = await self._db.server.get_many(chunk)
+
+            found = {result["id"] for result in results}
+            missing = [server_id for server_id in chunk if server_id not in found]
+
+            if missing:
+                await self._db.server.create_many(missing)
+
+            servers = [Server.create(result) for result in results]
+            servers.extend(Server(server_id) for server_id in missing)
+
+            for server in servers:
+                self._apply_pending(server)
+                await self.set_cache(server.server_id, server)
+
+        return len(server_ids)
+
+    async def open_state(self, server_id: int) -> GuildState:
+        """Get the live state of the given server, registering it if needed"""
+        state = self._guilds.get(server_id)
+
+        if not state:
+            state = self._guilds[server_id] = GuildState(server_id)
+
+        if not state.server:
+            state.server = await self.get(server_id)
+
+        return state
+
+    def state(self, server_id: int) -> GuildState:
+        """Get the live state of the given server if it is registered"""
+        return self._guilds.get(server_id)
+
+    def close_state(self, server_id: int):
+        """Forget the live state of the given server"""
+        self._guilds.pop(server_id, None)
+
     async def set_cache(self, server_id: int, server: Server):
         """Set the cache for the given server"""
-        self._cache.set_server(server_id, server)
+        # Degraded servers only hold defaults, they must not outlive the outage
+        if not self._db.ready:
+            return
+
+        if state := self._guilds.get(server_id):
+            state.server = server
+
+        await self._cache.set_server(server_id, server)
 
     async def get_channel(self, server_id: int) -> int:
         """Get the channel for the given server"""
@@ -40,24 +217,41 @@ class ServerManager:
         return server.channel
 
     async def get_prefix(self, server_id: int) -> str:
-        """Get the prefix for the given server"""
+        """Get the prefix for the given server, falling back to the default"""
         server = await self.get(server_id)
-        return server.prefix
+        return server.prefix or self._config.prefix
 
     async def set_channel(self, server_id: int, channel: int):
         """Set the channel for the given server"""
         server = await self.get(server_id)
         server.channel = channel
 
-        await self._db.server.set_channel(server_id, channel)
+        self._mark_dirty(server_id, "channel", channel)
         await self.set_cache(server_id, server)
 
     async def set_prefix(self, server_id: int, prefix: str):
-        """Set the prefix for the given server"""
+        """Set the prefix for the given server, None restores the default"""
+        # NULL means "use the default", so the default is never stored
+        if prefix == self._config.prefix:
+            prefix = None
+
         server = await self.get(server_id)
         server.prefix = prefix
 
-        await self._db.server.set_prefix(server_id, prefix)
+        self._mark_dirty(server_id, "prefix", prefix)
+        await self.set_cache(server_id, server)
+
+    async def get_language(self, server_id: int) -> str:
+        """Get the language for the given server, falling back to english"""
+        server = await self.get(server_id)
+        return server.language or "en"
+
+    async def set_language(self, server_id: int, language: str):
+        """Set the language for the given server"""
+        server = await self.get(server_id)
+        server.language = language
+
+        self._mark_dirty(server_id, "language", language)
         await self.set_cache(server_id, server)
 
     async def clear_channel(self, server_id: int):
@@ -65,10 +259,5 @@ class ServerManager:
         server = await self.get(server_id)
         server.channel = None
 
-        await self._db.server.clear_channel(server_id)
+        self._mark_dirty(server_id, "channel", None)
         await self.set_cache(server_id, server)
-
-    async def create(self, server_id: int) -> Server:
-        """Create a new server empty server with the given ID"""
-        await self._db.server.create(server_id)
-        return Server(server_id)
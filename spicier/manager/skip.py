@@ -0,0 +1,75 @@
+import math
+from datetime import datetime, timezone
+
+from spicier.config import Config
+from spicier.database import Database
+from spicier.database.writer import BufferedWriter
+
+
+class SkipManager:
+    """Tallies skip votes per guild for the track that is playing"""
+
+    def __init__(self, db: Database, config: Config):
+        self._config = config
+        self._db = db
+
+        # guild_id -> (track id, voters), replaced when the track changes
+        self._votes: dict[int, tuple[str, set[int]]] = {}
+
+        options = config.skip
+        self._writer = BufferedWriter(
+            "skip",
+            self._write,
+            lambda: self._db.ready,
+            interval=options["flush_interval"],
+            max_batch=options["max_batch"],
+        )
+
+    async def start(self):
+        """Start writing the votes in the background"""
+        self._writer.start()
+
+    async def close(self):
+        """Write the votes that are still buffered"""
+        await self._writer.close()
+
+    async def _write(self, votes: list[tuple]):
+        await self._db.skip.insert_many(votes)
+
+    def required(self, listeners: int) -> int:
+        """Votes needed to skip with the given number of listeners"""
+        return max(1, math.ceil(listeners * self._config.skip["ratio"]))
+
+    def vote(
+        self, guild_id: int, track_id: str, user_id: int, listeners: int
+    ) -> tuple[int, int]:
+        """Vote to skip the track, returns the votes and the votes required"""
+        tally = self._votes.get(guild_id)
+
+        if not tally or tally[0] != track_id:
+            tally = self._votes[guild_id] = (track_id, set())
+
+        voters = tally[1]
+        required = self.required(listeners)
+
+        if user_id not in voters:
+            voters.add(user_id)
+            self._writer.add(
+                (
+                    guild_id,
+                    user_id,
+                    track_id,
+                    len(voters) >= required,
+                    datetime.now(timezone.utc),
+                )
+            )
+
+        return len(voters), required
+
+    def retract(self, guild_id: int, user_id: int):
+        """Drop the vote of a listener who left the channel"""
+        if tally := self._votes.get(guild_id):
+            tally[1].discard(user_id)
+
+    def reset(self, guild_id: int):
+        self._votes.pop(guild_id, None)
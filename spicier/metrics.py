@@ -0,0 +1,216 @@
+import bisect
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from aiohttp import web
+
+metrics_logger = logging.getLogger("spicier.metrics")
+
+# Seconds, from a cached lookup up to a stuck query
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format(name: str, labels: Labels, value: float) -> str:
+    if labels:
+        pairs = ",".join(f'{key}="{value}"' for key, value in labels)
+        name = f"{name}{{{pairs}}}"
+
+    return f"{name} {value:g}"
+
+
+class Metric(ABC):
+    """Base for the metrics, one series per set of labels"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]: ...
+
+    def render(self) -> str:
+        header = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        return "\n".join(header + list(self.samples()))
+
+
+class Counter(Metric):
+    """Monotonically increasing value"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self.values: dict[Labels, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels):
+        self.values[_labels(labels)] += amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(_labels(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.values.items():
+            yield _format(self.name, labels, value)
+
+
+class Gauge(Metric):
+    """Value read from a callback every time the metrics are rendered"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def samples(self) -> Iterator[str]:
+        yield _format(self.name, (), self.function())
+
+
+class _Series:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        self.series: dict[Labels, _Series] = {}
+
+    def _series(self, labels: dict) -> _Series:
+        key = _labels(labels)
+
+        if key not in self.series:
+            # The last count is the +Inf bucket
+            self.series[key] = _Series(len(self.buckets) + 1)
+
+        return self.series[key]
+
+    def observe(self, value: float, **labels):
+        series = self._series(labels)
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.count += 1
+        series.sum += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self.series.get(_labels(labels))
+        return series.count if series else 0
+
+    def mean(self, **labels) -> float:
+        series = self.series.get(_labels(labels))
+        return series.sum / series.count if series and series.count else 0.0
+
+    def quantile(self, q: float, **labels) -> float:
+        """Upper bound of the bucket holding the q-th quantile"""
+        series = self.series.get(_labels(labels))
+
+        if not series or not series.count:
+            return 0.0
+
+        rank = q * series.count
+        seen = 0
+
+        for bound, count in zip(self.buckets, series.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+
+        return float("inf")
+
+    def samples(self) -> Iterator[str]:
+        for labels, series in self.series.items():
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + ("+Inf",), series.counts):
+                cumulative += count
+                bucket = labels + (("le", f"{bound:g}" if bound != "+Inf" else bound),)
+                yield _format(f"{self.name}_bucket", bucket, cumulative)
+
+            yield _format(f"{self.name}_sum", labels, series.sum)
+            yield _format(f"{self.name}_count", labels, series.count)
+
+
+class Registry:
+    """Every metric of the process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        # Cogs are reloaded, keep the series collected so far
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self.register(Counter(name, documentation))
+
+    def histogram(self, name: str, documentation: str, **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, **kwargs))
+
+    def gauge(self, name: str, documentation: str, function) -> Gauge:
+        gauge = self.register(Gauge(name, documentation, function))
+        gauge.function = function
+        return gauge
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Exporter:
+    """Serves the registry over HTTP for Prometheus to scrape"""
+
+    def __init__(self, registry: Registry = REGISTRY):
+        self.registry = registry
+        self.runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+        metrics_logger.info(f"Serving metrics on {host}:{port}/metrics")
+
+    async def close(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.registry.render(), content_type="text/plain", charset="utf-8"
+        )
@@ -1 +1,5 @@
+from .guild import GuildState, PlayerSettings
+from .player import SpicierPlayer, best_node, node_load
+from .queue import IndexedList, PlayerQueue
 from .server import Server
+from .track import QueueEntry, decode_events, decode_track, playable
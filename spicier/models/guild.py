@@ -0,0 +1,36 @@
+from typing import Optional
+
+from .server import Server
+
+
+class PlayerSettings:
+    """Player settings kept for a guild between player sessions"""
+
+    __slots__ = ("volume", "filter")
+
+    def __init__(self, volume: int = 100, filter: Optional[str] = None):
+        self.volume = volume
+        self.filter = filter
+
+
+class GuildState:
+    """Everything the bot keeps in memory for an active guild"""
+
+    __slots__ = ("guild_id", "server", "player")
+
+    def __init__(self, guild_id: int, server: Optional[Server] = None):
+        self.guild_id = guild_id
+        self.server = server
+        self.player = PlayerSettings()
+
+    @property
+    def prefix(self) -> Optional[str]:
+        return self.server.prefix if self.server else None
+
+    @property
+    def channel(self) -> Optional[int]:
+        return self.server.channel if self.server else None
+
+    @property
+    def language(self) -> Optional[str]:
+        return self.server.language if self.server else None
@@ -0,0 +1,95 @@
+import contextlib
+from typing import Optional
+
+import wavelink
+from wavelink.abc import Playable
+from wavelink.errors import ZeroConnectedNodes
+
+from .queue import PlayerQueue
+from .track import playable
+
+
+def node_load(node: wavelink.Node) -> float:
+    """Penalty from the node's last stats, which Lavalink sends once a minute,
+    plus the players created on it since"""
+    if not node.stats:
+        return len(node.players)
+
+    return node.stats.penalty.total + max(0, len(node.players) - node.stats.players)
+
+
+def best_node(exclude: Optional[wavelink.Node] = None) -> wavelink.Node:
+    """Connected node with the lowest load"""
+    nodes = [
+        node
+        for node in wavelink.NodePool().nodes.values()
+        if node.is_connected() and node is not exclude
+    ]
+
+    if not nodes:
+        raise ZeroConnectedNodes("There are no connected Nodes on this pool.")
+
+    return min(nodes, key=node_load)
+
+
+class SpicierPlayer(wavelink.Player):
+    """Player with an indexed queue and the next track decoded ahead"""
+
+    def __init__(self, *args, **kwargs):
+        if "node" not in kwargs:
+            kwargs["node"] = best_node()
+
+        super().__init__(*args, **kwargs)
+        self.queue = PlayerQueue()
+
+        # Next queue item and its decoded track
+        self._prefetched: Optional[tuple[Playable, Playable]] = None
+        self.ended_at: Optional[float] = None
+        self.requested_at: Optional[float] = None
+
+    def prefetch(self):
+        """Decode the next queued track while the current one plays"""
+        if self.queue.is_empty:
+            self._prefetched = None
+            return
+
+        item = self.queue[0]
+
+        if not self._prefetched or self._prefetched[0] is not item:
+            self._prefetched = (item, playable(item))
+
+    def next(self) -> Playable:
+        """Take the next queued track, decoded"""
+        item = self.queue.get()
+        prefetched, self._prefetched = self._prefetched, None
+
+        # The queue may have changed since the prefetch
+        if prefetched and prefetched[0] is item:
+            return prefetched[1]
+
+        return playable(item)
+
+    async def switch_node(self, node: wavelink.Node):
+        """Continue on another node from the current position"""
+        position = self.position
+        track = self.track
+
+        with contextlib.suppress(ValueError):
+            self.node._players.remove(self)
+
+        self.node = node
+        node._players.append(self)
+
+        # The new node joins the voice channel with the session we already have
+        await self._dispatch_voice_update(self._voice_state)
+
+        if track:
+            await self.play(
+                track,
+                start=int(position * 1000),
+                volume=self.volume,
+                pause=self.is_paused(),
+            )
+
+        if self.filter:
+            await self.set_filter(self.filter)
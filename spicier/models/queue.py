@@ -0,0 +1,437 @@
+from collections import Counter
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from wavelink import Queue, WaitQueue
+from wavelink.abc import Playable
+from wavelink.errors import QueueFull
+
+
+class Fenwick:
+    """Prefix sums that stay O(log n) to query and update"""
+
+    __slots__ = ("tree",)
+
+    def __init__(self, values: Iterable[int] = ()):
+        self.tree = [0, *values]
+
+        # Each node passes its sum up to its parent, O(n) in total
+        for index in range(1, len(self.tree)):
+            parent = index + (index & -index)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[index]
+
+    def __len__(self) -> int:
+        return len(self.tree) - 1
+
+    def append(self, value: int):
+        # The new node covers the values since the previous power of two
+        index = len(self.tree)
+        low = index & -index
+        self.tree.append(value + self.prefix(index - 1) - self.prefix(index - low))
+
+    def add(self, index: int, delta: int):
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index: int) -> int:
+        """Sum of the first index values"""
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def search(self, value: int) -> tuple[int, int]:
+        """Index of the value the value-th unit falls in and what is left of
+        it there, for non-negative values"""
+        position, step = 0, 1 << (len(self.tree).bit_length())
+
+        while step:
+            following = position + step
+            if following < len(self.tree) and self.tree[following] <= value:
+                position = following
+                value -= self.tree[following]
+            step >>= 1
+
+        return position, value
+
+
+class IndexedList:
+    """List split into blocks, with prefix sums over the block sizes and item
+    weights, so finding a position or the weight before it costs O(log n)
+    plus a block. Keeps a count of the keys of its items for duplicate checks"""
+
+    BLOCK = 64
+
+    def __init__(
+        self,
+        items: Iterable = (),
+        key: Callable[[Any], Any] = lambda item: item.id,
+        weight: Callable[[Any], int] = lambda item: 0,
+    ):
+        self._blocks: list[list] = []
+        self._block_weights: list[int] = []
+        self._sizes = Fenwick()
+        self._weights = Fenwick()
+        self._len = 0
+        self._key = key
+        self._weight = weight
+        self.keys: Counter = Counter()
+        self.total = 0
+
+        self.extend(items)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def __iter__(self) -> Iterator:
+        for block in self._blocks:
+            yield from block
+
+    def __reversed__(self) -> Iterator:
+        for block in reversed(self._blocks):
+            yield from reversed(block)
+
+    def __contains__(self, item) -> bool:
+        return self.has(self._key(item)) and any(
+            item in block for block in self._blocks
+        )
+
+    def __copy__(self) -> "IndexedList":
+        return IndexedList(self, self._key, self._weight)
+
+    def __getitem__(self, index: int):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                raise ValueError("Only contiguous slices are supported")
+            return list(self.slice(start, stop))
+
+        block, offset = self._locate(index)
+        return self._blocks[block][offset]
+
+    def __setitem__(self, index: int, item):
+        block, offset = self._locate(index)
+
+        self._forget(block, self._blocks[block][offset])
+        self._blocks[block][offset] = item
+        self._remember(block, item)
+
+    def __delitem__(self, index: int):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                raise ValueError("Only contiguous slices are supported")
+            self.remove_range(start, stop)
+        else:
+            self.pop(index)
+
+    def _remember(self, block: int, item):
+        weight = self._weight(item)
+
+        self.keys[self._key(item)] += 1
+        self._sizes.add(block, 1)
+        self._weights.add(block, weight)
+        self._block_weights[block] += weight
+        self.total += weight
+        self._len += 1
+
+    def _forget(self, block: Optional[int], item):
+        key = self._key(item)
+        self.keys[key] -= 1
+
+        if not self.keys[key]:
+            del self.keys[key]
+
+        weight = self._weight(item)
+        self.total -= weight
+        self._len -= 1
+
+        # Without a block the sums are rebuilt by the caller
+        if block is not None:
+            self._sizes.add(block, -1)
+            self._weights.add(block, -weight)
+            self._block_weights[block] -= weight
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        """Block and offset in the block of a position"""
+        if index < 0:
+            index += self._len
+
+        if not 0 <= index < self._len:
+            raise IndexError("Queue index out of range")
+
+        return self._sizes.search(index)
+
+    def _reindex(self):
+        """Rebuild the sums after blocks were added or removed in the middle"""
+        self._sizes = Fenwick(len(block) for block in self._blocks)
+        self._weights = Fenwick(self._block_weights)
+
+    def _rebuild(self):
+        items = list(self)
+        self._blocks = [
+            items[i : i + self.BLOCK] for i in range(0, len(items), self.BLOCK)
+        ]
+        self._block_weights = [sum(map(self._weight, block)) for block in self._blocks]
+        self._reindex()
+
+    def _compact(self):
+        # Deletes leave small blocks behind, which make every search longer
+        if len(self._blocks) > 2 * (self._len // self.BLOCK) + 4:
+            self._rebuild()
+
+    def has(self, key) -> bool:
+        return key in self.keys
+
+    def weight_before(self, index: int) -> int:
+        """Total weight of the items before the position"""
+        if index >= self._len:
+            return self.total
+
+        block, offset = self._locate(max(0, index))
+        within = sum(map(self._weight, self._blocks[block][:offset]))
+        return self._weights.prefix(block) + within
+
+    def weight_range(self, start: int, stop: int) -> int:
+        return self.weight_before(stop) - self.weight_before(start)
+
+    def append(self, item):
+        if not self._blocks or len(self._blocks[-1]) >= self.BLOCK:
+            self._blocks.append([])
+            self._block_weights.append(0)
+            self._sizes.append(0)
+            self._weights.append(0)
+
+        self._blocks[-1].append(item)
+        self._remember(len(self._blocks) - 1, item)
+
+    def extend(self, items: Iterable):
+        items = list(items)
+
+        if self._blocks:
+            room = self.BLOCK - len(self._blocks[-1])
+            for item in items[:room]:
+                self.append(item)
+            items = items[room:]
+
+        # The rest goes in whole blocks, summed once per block
+        for i in range(0, len(items), self.BLOCK):
+            block = items[i : i + self.BLOCK]
+            weight = sum(map(self._weight, block))
+
+            self._blocks.append(block)
+            self._block_weights.append(weight)
+            self._sizes.append(len(block))
+            self._weights.append(weight)
+
+            self.keys.update(map(self._key, block))
+            self.total += weight
+            self._len += len(block)
+
+    def insert(self, index: int, item):
+        if index < 0:
+            index = max(0, index + self._len)
+
+        if index >= self._len:
+            return self.append(item)
+
+        block, offset = self._locate(index)
+        items = self._blocks[block]
+        items.insert(offset, item)
+        self._remember(block, item)
+
+        if len(items) > 2 * self.BLOCK:
+            first, second = items[: self.BLOCK], items[self.BLOCK :]
+            weight = sum(map(self._weight, first))
+
+            self._blocks[block : block + 1] = [first, second]
+            self._block_weights[block : block + 1] = [
+                weight,
+                self._block_weights[block] - weight,
+            ]
+            self._reindex()
+
+    def pop(self, index: int = -1):
+        if not self._len:
+            raise IndexError("pop from an empty queue")
+
+        block, offset = self._locate(index)
+        item = self._blocks[block].pop(offset)
+        self._forget(block, item)
+
+        if not self._blocks[block]:
+            del self._blocks[block]
+            del self._block_weights[block]
+            self._reindex()
+
+        self._compact()
+        return item
+
+    def popleft(self):
+        return self.pop(0)
+
+    def index(self, item) -> int:
+        for index, other in enumerate(self):
+            if other == item:
+                return index
+
+        raise ValueError(f"{item!r} is not in the queue")
+
+    def slice(self, start: int, stop: int) -> Iterator:
+        """Items from start to stop, skipping whole blocks before start"""
+        start, stop = max(0, start), min(stop, self._len)
+
+        if start >= stop:
+            return
+
+        block, offset = self._locate(start)
+        remaining = stop - start
+
+        for items in self._blocks[block:]:
+            chunk = items[offset : offset + remaining]
+            yield from chunk
+
+            remaining -= len(chunk)
+            offset = 0
+
+            if not remaining:
+                return
+
+    def remove_range(self, start: int, stop: int) -> list:
+        """Remove and return the items from start to stop"""
+        start, stop = max(0, start), min(stop, self._len)
+
+        if start >= stop:
+            return []
+
+        block, offset = self._locate(start)
+        remaining = stop - start
+        removed = []
+
+        while remaining:
+            items = self._blocks[block]
+            chunk = items[offset : offset + remaining]
+            del items[offset : offset + remaining]
+            removed.extend(chunk)
+            remaining -= len(chunk)
+            self._block_weights[block] -= sum(map(self._weight, chunk))
+
+            if items:
+                block += 1
+            else:
+                del self._blocks[block]
+                del self._block_weights[block]
+            offset = 0
+
+        for item in removed:
+            self._forget(None, item)
+
+        self._reindex()
+        self._compact()
+        return removed
+
+    def move(self, source: int, destination: int):
+        """Move the item at source so it ends up at destination"""
+        item = self.pop(source)
+        self.insert(destination, item)
+        return item
+
+    def dedupe(self) -> list:
+        """Remove every item whose key appeared earlier, return the removed"""
+        if len(self.keys) == self._len:
+            return []
+
+        seen, kept, removed = set(), [], []
+
+        for item in self:
+            key = self._key(item)
+            (removed if key in seen else kept).append(item)
+            seen.add(key)
+
+        self.clear()
+        self.extend(kept)
+        return removed
+
+    def clear(self):
+        self._blocks.clear()
+        self._block_weights.clear()
+        self._sizes = Fenwick()
+        self._weights = Fenwick()
+        self.keys.clear()
+        self.total = 0
+        self._len = 0
+
+
+class _History(Queue):
+    """Played tracks, the oldest is dropped when full"""
+
+    def _drop(self) -> Playable:
+        return self._queue.popleft()
+
+
+class PlayerQueue(WaitQueue):
+    """Player queue backed by an IndexedList, paging and edits don't walk
+    every track"""
+
+    def __init__(
+        self, max_size: Optional[int] = None, history_max_size: Optional[int] = 100
+    ):
+        # The default history keeps every track ever played
+        super().__init__(max_size, history_max_size, history_cls=_History)
+        self._queue = IndexedList(weight=lambda track: int(track.length * 1000))
+
+    def __getitem__(self, index: int) -> Playable:
+        return self._queue[index]
+
+    def __delitem__(self, index: int):
+        del self._queue[index]
+
+    def _insert(self, index: int, item: Playable):
+        self._queue.insert(index, item)
+        self._wakeup_next()
+
+    def extend(self, iterable: Iterable[Playable], *, atomic: bool = True):
+        items = self._check_playable_container(iterable)
+
+        if self.max_size is not None and len(items) + self.count > self.max_size:
+            raise QueueFull(
+                f"Queue has {self.count}/{self.max_size} items, "
+                f"cannot add {len(items)} more."
+            )
+
+        self._queue.extend(items)
+        self._wakeup_next()
+
+    @property
+    def duration(self) -> float:
+        """Seconds of every queued track, kept up to date as it changes"""
+        return self._queue.total / 1000
+
+    def eta(self, index: int) -> float:
+        """Seconds of the queued tracks before the position"""
+        return self._queue.weight_before(index) / 1000
+
+    def page(self, start: int, size: int) -> list[Playable]:
+        return list(self._queue.slice(start, start + size))
+
+    def page_duration(self, start: int, size: int) -> float:
+        return self._queue.weight_range(start, start + size) / 1000
+
+    def has(self, track: Playable) -> bool:
+        """Whether a track with the same encoded id is queued"""
+        return self._queue.has(track.id)
+
+    def remove(self, start: int, stop: Optional[int] = None) -> list[Playable]:
+        return self._queue.remove_range(start, start + 1 if stop is None else stop)
+
+    def move(self, source: int, destination: int) -> Playable:
+        return self._queue.move(source, destination)
+
+    def dedupe(self) -> list[Playable]:
+        return self._queue.dedupe()
@@ -1,15 +1,23 @@
+import json
 from typing import Union
 
 
 class Server:
     """Server model"""
 
+    __slots__ = ("server_id", "channel", "prefix", "language")
+
     def __init__(
-        self, server_id: Union[str, int], channel: int = None, prefix: str = None
+        self,
+        server_id: Union[str, int],
+        channel: int = None,
+        prefix: str = None,
+        language: str = None,
     ):
         self.server_id = server_id
         self.channel = channel
         self.prefix = prefix
+        self.language = language
 
     def __eq__(self, other):
         return self.server_id == other.server_id
@@ -17,12 +25,18 @@ class Server:
     @staticmethod
     def create(result):
         """Create a server from the given db result"""
-        server = Server(result["id"])
-
-        if result["channel"]:
-            server.channel = result["channel"]
+        return Server(
+            result["id"], result["channel"], result["prefix"], result["language"]
+        )
 
-        if result["prefix"]:
-            server.prefix = result["prefix"]
+    def dumps(self) -> bytes:
+        """Serialize the server for shared cache backends"""
+        return json.dumps(
+            [self.server_id, self.channel, self.prefix, self.language],
+            separators=(",", ":"),
+        ).encode()
 
-        return server
+    @staticmethod
+    def loads(data: bytes):
+        """Create a server from the output of dumps"""
+        return Server(*json.loads(data))
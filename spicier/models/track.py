@@ -0,0 +1,174 @@
+import base64
+import struct
+from typing import Optional, Union
+
+import wavelink
+from wavelink.abc import Playable
+
+
+class _Reader:
+    """Reads the fields of a lavaplayer encoded track"""
+
+    __slots__ = ("data", "offset")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def read(self, fmt: str):
+        (value,) = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return value
+
+    def text(self) -> str:
+        size = self.read(">H")
+        raw = self.data[self.offset : self.offset + size]
+        self.offset += size
+
+        # Java's modified UTF-8 writes characters outside the BMP as surrogates
+        text = raw.decode("utf-8", "surrogatepass")
+        return text.encode("utf-16", "surrogatepass").decode("utf-16")
+
+    def nullable_text(self) -> Optional[str]:
+        return self.text() if self.read(">?") else None
+
+
+def decode_track(encoded: str) -> dict:
+    """Lavalink track info read from the encoded track, without a request"""
+    reader = _Reader(base64.b64decode(encoded))
+
+    flags = reader.read(">I") >> 30
+    version = reader.read(">B") if flags & 1 else 1
+
+    title = reader.text()
+    author = reader.text()
+    length = reader.read(">q")
+    identifier = reader.text()
+    stream = reader.read(">?")
+
+    if version == 1:
+        uri = None
+    elif version in (2, 3):
+        uri = reader.nullable_text()
+    else:
+        raise ValueError(f"Unsupported track version {version}")
+
+    if version == 3:
+        # Artwork url and ISRC, not part of the track info wavelink builds
+        reader.nullable_text()
+        reader.nullable_text()
+
+    source = reader.text()
+
+    # Source specific fields come next, the position always ends the message
+    (position,) = struct.unpack_from(">q", reader.data, len(reader.data) - 8)
+
+    return {
+        "identifier": identifier,
+        "isSeekable": not stream,
+        "author": author,
+        "length": length,
+        "isStream": stream,
+        "position": position,
+        "title": title,
+        "uri": uri,
+        "sourceName": source,
+    }
+
+
+def _text(text: str) -> bytes:
+    # Split characters outside the BMP into surrogates, like Java does
+    units = text.encode("utf-16-be")
+    chars = struct.unpack(f">{len(units) // 2}H", units)
+    raw = "".join(map(chr, chars)).encode("utf-8", "surrogatepass")
+    return struct.pack(">H", len(raw)) + raw
+
+
+def encode_track(info: dict) -> str:
+    """Encoded track for the info, the inverse of decode_track"""
+    body = b"".join(
+        (
+            struct.pack(">B", 2),
+            _text(info["title"]),
+            _text(info["author"]),
+            struct.pack(">q", info["length"]),
+            _text(info["identifier"]),
+            struct.pack(">?", info["isStream"]),
+            struct.pack(">?", info["uri"] is not None),
+            _text(info["uri"]) if info["uri"] is not None else b"",
+            _text(info["sourceName"]),
+            struct.pack(">q", info.get("position", 0)),
+        )
+    )
+    header = struct.pack(">I", 1 << 30 | len(body))
+    return base64.b64encode(header + body).decode()
+
+
+class QueueEntry:
+    """Queued track keeping only what the queue shows, the full track is
+    decoded from the encoded string when it is played or displayed"""
+
+    __slots__ = ("id", "title", "length", "requester")
+
+    def __init__(
+        self, id: str, title: str, length: float, requester: Optional[int] = None
+    ):
+        self.id = id
+        self.title = title
+        self.length = length
+        self.requester = requester
+
+    def __repr__(self) -> str:
+        return f"<QueueEntry title={self.title!r} length={self.length}>"
+
+    @property
+    def duration(self) -> float:
+        return self.length
+
+    @property
+    def info(self) -> dict:
+        try:
+            return decode_track(self.id)
+        except (ValueError, struct.error):
+            # Lavalink only needs the encoded track to play it
+            return {"title": self.title, "length": int(self.length * 1000)}
+
+    @classmethod
+    def from_info(
+        cls, id: str, info: dict, requester: Optional[int] = None
+    ) -> "QueueEntry":
+        return cls(id, info.get("title"), info.get("length", 0) / 1000, requester)
+
+    @classmethod
+    def from_track(
+        cls, track: wavelink.Track, requester: Optional[int] = None
+    ) -> "QueueEntry":
+        return cls(track.id, track.title, track.length, requester)
+
+    def decode(self) -> wavelink.YouTubeTrack:
+        track = wavelink.YouTubeTrack(self.id, self.info)
+        track.requester = self.requester
+        return track
+
+
+# Accepted by the wavelink queue, which only takes Playable items
+Playable.register(QueueEntry)
+
+
+def decode_events(node: wavelink.Node):
+    """Build the tracks of the node's events from the encoded string, instead
+    of a decodetrack request to Lavalink before every event"""
+    remote = node.build_track
+
+    async def build_track(cls, identifier: str):
+        try:
+            return cls(identifier, decode_track(identifier))
+        except (ValueError, struct.error):
+            return await remote(cls, identifier)
+
+    node.build_track = build_track
+
+
+def playable(item: Union[QueueEntry, Playable]) -> Playable:
+    """Full track for a queue item, entries are decoded"""
+    return item.decode() if isinstance(item, QueueEntry) else item
@@ -0,0 +1,164 @@
+import asyncio
+import os
+from multiprocessing import shared_memory
+
+import pytest
+
+from spicier.cache import LRUBackend, RedisBackend, SharedMemoryBackend
+from spicier.models import Server
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+class RedisStandIn:
+    """Just enough of a Redis server to run RedisBackend against"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.server = None
+        self.stalled = asyncio.Event()
+        self.stalled.set()
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                count = int((await reader.readuntil(b"\r\n"))[1:-2])
+                args = []
+                for _ in range(count):
+                    size = int((await reader.readuntil(b"\r\n"))[1:-2])
+                    args.append((await reader.readexactly(size + 2))[:-2])
+
+                # A stalled server answers late, once released
+                await self.stalled.wait()
+                writer.write(self._execute(args[0].upper(), *args[1:]))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    def _execute(self, command, *args):
+        if command == b"HGET":
+            value = self.hashes.get(args[0], {}).get(args[1])
+            if value is None:
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+
+        if command == b"HSET":
+            fields = self.hashes.setdefault(args[0], {})
+            added = args[1] not in fields
+            fields[args[1]] = args[2]
+            return b":%d\r\n" % added
+
+        if command == b"HLEN":
+            return b":%d\r\n" % len(self.hashes.get(args[0], {}))
+
+        if command == b"HRANDFIELD":
+            field = next(iter(self.hashes.get(args[0], {})), None)
+            if field is None:
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(field), field)
+
+        if command == b"HDEL":
+            return b":%d\r\n" % int(
+                self.hashes.get(args[0], {}).pop(args[1], None) is not None
+            )
+
+        if command == b"DEL":
+            return b":%d\r\n" % int(self.hashes.pop(args[0], None) is not None)
+
+        return b"-ERR unknown command\r\n"
+
+
+async def check_backend(backend):
+    assert await backend.get(1) is None
+
+    await backend.set(1, Server(1, 10, "!"))
+    server = await backend.get(1)
+    assert (server.server_id, server.channel, server.prefix) == (1, 10, "!")
+
+    await backend.set(1, Server(1, 11, None))
+    assert (await backend.get(1)).channel == 11
+
+    await backend.delete(1)
+    assert await backend.get(1) is None
+
+    await backend.set(2, Server(2))
+    await backend.clear()
+    assert await backend.get(2) is None
+
+    stats = await backend.stats()
+    assert (stats.hits, stats.misses) == (2, 3)
+
+
+@pytest.mark.asyncio
+async def test_lru_backend():
+    backend = LRUBackend(maxsize=2)
+    await check_backend(backend)
+
+    for server_id in range(3):
+        await backend.set(server_id, Server(server_id))
+
+    assert (await backend.stats()).evictions == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_memory_backend():
+    name = f"spicer-test-{os.getpid()}"
+    backend = SharedMemoryBackend(name=name, slots=64)
+    other = SharedMemoryBackend(name=name, slots=64)
+
+    try:
+        await check_backend(backend)
+
+        await backend.set(5, Server(5, 50))
+        assert (await other.get(5)).channel == 50
+    finally:
+        await other.close()
+        await backend.close()
+        shared_memory.SharedMemory(name).unlink()
+
+
+@pytest.mark.asyncio
+async def test_redis_backend():
+    stand_in = RedisStandIn()
+    backend = RedisBackend(port=await stand_in.start(), maxsize=2)
+
+    try:
+        await check_backend(backend)
+
+        # Only servers this cache dropped count as its evictions
+        for server_id in range(1, 4):
+            await backend.set(server_id, Server(server_id))
+
+        assert len(stand_in.hashes[b"spicer:servers"]) == 2
+        assert (await backend.stats()).evictions == 1
+    finally:
+        await backend.close()
+        await stand_in.stop()
+
+
+@pytest.mark.asyncio
+async def test_redis_stall_is_a_miss():
+    stand_in = RedisStandIn()
+    backend = RedisBackend(port=await stand_in.start(), timeout=0.05)
+
+    try:
+        await backend.set(1, Server(1, 10))
+        await backend.set(2, Server(2, 20))
+
+        stand_in.stalled.clear()
+        assert await backend.get(1) is None
+
+        # The late reply to the timed out command is not read as this one's
+        stand_in.stalled.set()
+        assert (await backend.get(2)).channel == 20
+    finally:
+        await backend.close()
+        await stand_in.stop()
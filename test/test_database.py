@@ -1,10 +1,14 @@
+import asyncio
+import logging
 from os import path
 
+import asyncpg
 import pytest
 from asyncpg import Pool
 
 from spicier.config import Config
 from spicier.database import Database
+from spicier.metrics import REGISTRY
 
 pytest_plugins = ("pytest_asyncio",)
 
@@ -42,3 +46,117 @@ async def test_tables():
     await pool.close()
 
     assert len(tables) > 0
+
+
+class FailingCreatePool:
+    """create_pool that fails the given number of times before it succeeds"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    async def __call__(self, dsn, **options):
+        self.calls += 1
+
+        if self.calls <= self.failures:
+            raise OSError("Connection refused")
+        return "pool"
+
+
+def retrying_database():
+    return Database("postgres://", {"retry": {"base": 0.001, "cap": 0.002}})
+
+
+@pytest.mark.asyncio
+async def test_connect_retries_until_pool(monkeypatch, caplog):
+    create_pool = FailingCreatePool(3)
+    monkeypatch.setattr(asyncpg, "create_pool", create_pool)
+    database = retrying_database()
+
+    with caplog.at_level(logging.WARNING, "spicier.database"):
+        assert await database._connect()
+
+    assert create_pool.calls == 4
+    assert database.pool == "pool"
+    assert [record.levelname for record in caplog.records] == ["WARNING"] * 3
+
+
+@pytest.mark.asyncio
+async def test_connect_gives_up_at_deadline(monkeypatch, caplog):
+    create_pool = FailingCreatePool(float("inf"))
+    monkeypatch.setattr(asyncpg, "create_pool", create_pool)
+    database = retrying_database()
+    deadline = asyncio.get_running_loop().time() + 0.05
+
+    with caplog.at_level(logging.ERROR, "spicier.database"):
+        assert not await database._connect(deadline)
+
+    assert create_pool.calls > 1
+    assert database.pool is None
+    assert len(caplog.records) == 1
+    assert f"after {create_pool.calls} attempts" in caplog.records[0].message
+
+
+class FakePool:
+    """Pool of two connections, acquire waits until it is let through"""
+
+    def __init__(self):
+        self.idle = ["conn1", "conn2"]
+        self.opened = asyncio.Event()
+
+    async def acquire(self):
+        await self.opened.wait()
+        return self.idle.pop()
+
+    async def release(self, conn):
+        self.idle.append(conn)
+
+    def get_size(self):
+        return 2
+
+    def get_max_size(self):
+        return 10
+
+    def get_idle_size(self):
+        return len(self.idle)
+
+
+def gauge(name):
+    return REGISTRY.metrics[name].function()
+
+
+@pytest.mark.asyncio
+async def test_acquire_records_pool_stats():
+    database = Database("postgres://")
+    database.pool = pool = FakePool()
+
+    async def hold(acquired, release):
+        async with database.acquire():
+            acquired.set()
+            await release.wait()
+
+    acquired, release = asyncio.Event(), asyncio.Event()
+    task = asyncio.create_task(hold(acquired, release))
+
+    await asyncio.sleep(0.02)
+    assert database.pool_stats().waiters == gauge("spicier_db_pool_waiters") == 1
+
+    pool.opened.set()
+    await acquired.wait()
+
+    stats = database.pool_stats()
+    assert (stats.size, stats.max_size, stats.idle, stats.in_use) == (2, 10, 1, 1)
+    assert gauge("spicier_db_pool_in_use") == 1
+    assert gauge("spicier_db_pool_idle") == 1
+    assert gauge("spicier_db_pool_waiters") == 0
+
+    # The wait for the pool counts as acquire time
+    assert stats.acquires == 1
+    assert stats.max_acquire_time >= 0.02
+    assert stats.avg_acquire_time == stats.max_acquire_time
+
+    release.set()
+    await task
+
+    assert database.pool_stats().in_use == gauge("spicier_db_pool_in_use") == 0
+    assert database.pool_stats().idle == gauge("spicier_db_pool_idle") == 2
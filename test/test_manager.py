@@ -0,0 +1,629 @@
+import asyncio
+import os
+from multiprocessing import shared_memory
+
+import pytest
+import wavelink
+
+from spicier.cache import Cache, SharedMemoryBackend
+from spicier.manager import (
+    IdleManager,
+    NodeManager,
+    QueueManager,
+    SearchManager,
+    ServerManager,
+    SkipManager,
+)
+from spicier.manager.search import QueryKind, classify
+from spicier.models import QueueEntry, SpicierPlayer
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+class FakeServerTable:
+    CHANNEL = "server_changed"
+
+    def __init__(self):
+        self.rows = {}
+        self.batches = []
+        self.queries = 0
+
+    async def get(self, server_id):
+        return self.rows.get(server_id)
+
+    async def get_many(self, server_ids):
+        self.queries += 1
+        return [self.rows[i] for i in server_ids if i in self.rows]
+
+    async def get_or_create(self, server_id):
+        if server_id not in self.rows:
+            await self.create(server_id)
+        return await self.get(server_id)
+
+    async def create(self, server_id):
+        self.rows[server_id] = {
+            "id": server_id,
+            "channel": None,
+            "prefix": None,
+            "language": None,
+        }
+
+    async def create_many(self, server_ids):
+        for server_id in server_ids:
+            await self.create(server_id)
+
+    async def upsert_many(self, changes):
+        self.batches.append(changes)
+        for column, rows in changes.items():
+            for server_id, value in rows.items():
+                self.rows.setdefault(server_id, {"id": server_id})[column] = value
+
+
+class FakeSkipTable:
+    def __init__(self):
+        self.batches = []
+
+    async def insert_many(self, votes):
+        self.batches.append(votes)
+
+
+class FakeSearchTable:
+    def __init__(self):
+        self.rows = {}
+
+    async def get(self, query):
+        return self.rows.get(query)
+
+    async def put(self, query, track, info, ttl):
+        self.rows[query] = (track, info)
+
+
+class FakeQueueTable:
+    def __init__(self):
+        self.saves = []
+        self.elapsed = []
+        self.loads = 0
+
+    async def save(self, states, rows):
+        self.saves.append((states, rows))
+
+    async def set_elapsed(self, elapsed):
+        self.elapsed.append(elapsed)
+
+    async def delete(self, server_ids):
+        pass
+
+    async def load(self, server_ids):
+        self.loads += 1
+        return [], []
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.server = FakeServerTable()
+        self.skip = FakeSkipTable()
+        self.search = FakeSearchTable()
+        self.queue = FakeQueueTable()
+        self.listeners = {}
+        self.ready = True
+
+    async def listen(self, channel, callback):
+        self.listeners[channel] = callback
+
+    async def wait_until_ready(self):
+        pass
+
+
+class FakeConfig:
+    prefix = "?"
+    write_behind = {"interval": 5, "max_dirty": 100}
+    skip = {"vote": True, "ratio": 0.5, "flush_interval": 10, "max_batch": 3}
+    search = {"memory_size": 10, "ttl": 60}
+    leave_time = 0.05
+    failover = {"interval": 5, "grace": 10}
+
+
+def make_manager(cache=None):
+    db = FakeDatabase()
+    return ServerManager(cache or Cache(), db, FakeConfig()), db
+
+
+@pytest.mark.asyncio
+async def test_write_behind_coalesces():
+    manager, db = make_manager()
+
+    for channel in range(10):
+        await manager.set_channel(1, channel)
+    await manager.set_prefix(2, "!")
+
+    assert db.server.batches == []
+    assert await manager.get_channel(1) == 9
+
+    await manager.flush()
+
+    assert len(db.server.batches) == 1
+    assert db.server.batches[0] == {"channel": {1: 9}, "prefix": {2: "!"}}
+    assert db.server.rows[1]["channel"] == 9
+
+
+@pytest.mark.asyncio
+async def test_pending_survives_cache_expiry():
+    manager, db = make_manager()
+
+    await manager.set_channel(1, 42)
+    await manager._cache.expire_server(1)
+
+    assert await manager.get_channel(1) == 42
+
+
+@pytest.mark.asyncio
+async def test_flushing_changes_survive_cache_expiry():
+    manager, db = make_manager()
+    committed = asyncio.Event()
+    upsert = db.server.upsert_many
+
+    async def slow_upsert(changes):
+        await committed.wait()
+        await upsert(changes)
+
+    db.server.upsert_many = slow_upsert
+
+    await manager.set_channel(1, 42)
+    flush = asyncio.create_task(manager.flush())
+    await asyncio.sleep(0)
+
+    # Read while the batch is being written, the row is still the old one
+    await manager._cache.expire_server(1)
+    assert await manager.get_channel(1) == 42
+
+    committed.set()
+    await flush
+    assert manager._inflight_changes == {}
+    assert db.server.rows[1]["channel"] == 42
+
+
+@pytest.mark.asyncio
+async def test_warm_loads_in_chunks():
+    manager, db = make_manager()
+    db.server.rows[1] = {"id": 1, "channel": 10, "prefix": "!", "language": None}
+
+    warmed = await manager.warm(range(1, 251), chunk_size=100)
+
+    assert warmed == 250
+    assert db.server.queries == 3
+    assert (await manager._cache.get_server(1)).prefix == "!"
+    assert await manager._cache.get_server(250) is not None
+    assert 250 in db.server.rows
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    manager, db = make_manager()
+    db.server.rows[1] = {"id": 1, "channel": 10, "prefix": None, "language": None}
+
+    loads = 0
+    get_or_create = db.server.get_or_create
+
+    async def slow_get_or_create(server_id):
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.01)
+        return await get_or_create(server_id)
+
+    db.server.get_or_create = slow_get_or_create
+
+    servers = await asyncio.gather(*(manager.get(1) for _ in range(20)))
+
+    assert loads == 1
+    assert all(server.channel == 10 for server in servers)
+    assert manager.counters["coalesced"] == 19
+    assert not manager._inflight
+
+
+@pytest.mark.asyncio
+async def test_default_prefix_is_not_stored():
+    manager, db = make_manager()
+
+    assert await manager.get_prefix(1) == "?"
+
+    await manager.set_prefix(1, "?")
+    await manager.flush()
+
+    assert db.server.rows[1]["prefix"] is None
+    assert await manager.get_prefix(1) == "?"
+
+
+@pytest.mark.asyncio
+async def test_notification_invalidates_cache():
+    manager, db = make_manager()
+    await manager.start()
+
+    await manager.get(1)
+    await manager.get(2)
+
+    db.listeners["server_changed"]("1")
+    await asyncio.sleep(0)
+    assert await manager._cache.get_server(1) is None
+    assert await manager._cache.get_server(2) is not None
+
+    db.listeners["server_changed"](None)
+    await asyncio.sleep(0)
+    assert await manager._cache.get_server(2) is None
+
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_notification_invalidates_shared_memory():
+    name = f"spicer-test-notify-{os.getpid()}"
+    manager, db = make_manager(Cache(SharedMemoryBackend(name=name, slots=64)))
+    await manager.start()
+
+    try:
+        # Another host changed the server, this host's table still has it
+        await manager.get(1)
+        db.listeners["server_changed"]("1")
+        await asyncio.sleep(0)
+        assert await manager._cache.get_server(1) is None
+    finally:
+        await manager.close()
+        await manager._cache.close()
+        shared_memory.SharedMemory(name).unlink()
+
+
+@pytest.mark.asyncio
+async def test_guild_state_follows_server():
+    manager, db = make_manager()
+    await manager.start()
+
+    state = await manager.open_state(1)
+    await manager.set_channel(1, 5)
+    assert state.channel == 5
+
+    db.listeners["server_changed"]("1")
+    assert state.server is None
+    assert (await manager.open_state(1)) is state
+
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_degraded_until_database_ready():
+    manager, db = make_manager()
+    db.ready = False
+
+    await manager.set_prefix(1, "!")
+    await manager.flush()
+
+    assert await manager.get_prefix(1) == "!"
+    assert db.server.rows == {}
+
+    db.ready = True
+    await manager.flush()
+
+    assert db.server.rows[1]["prefix"] == "!"
+
+
+@pytest.mark.asyncio
+async def test_skip_votes():
+    db = FakeDatabase()
+    skips = SkipManager(db, FakeConfig())
+
+    assert skips.vote(1, "a", 10, listeners=4) == (1, 2)
+    assert skips.vote(1, "a", 10, listeners=4) == (1, 2)
+
+    skips.retract(1, 10)
+    assert skips.vote(1, "a", 11, listeners=3) == (1, 2)
+    assert skips.vote(1, "a", 12, listeners=3) == (2, 2)
+
+    # The third vote filled a batch, written without waiting for the interval
+    await asyncio.sleep(0)
+    assert [vote[:4] for vote in db.skip.batches[0]] == [
+        (1, 10, "a", False),
+        (1, 11, "a", False),
+        (1, 12, "a", True),
+    ]
+
+    # A new track starts a new tally
+    assert skips.vote(1, "b", 12, listeners=3) == (1, 2)
+
+    await skips.close()
+    assert len(db.skip.batches) == 2
+
+
+@pytest.mark.asyncio
+async def test_search_tiers(monkeypatch):
+    db = FakeDatabase()
+    searches = SearchManager(db, FakeConfig())
+    queries = []
+
+    async def search(query, node, return_first):
+        queries.append(query)
+        await asyncio.sleep(0.01)
+        return wavelink.YouTubeTrack("encoded", {"title": query, "length": 1000})
+
+    monkeypatch.setattr(wavelink.YouTubeTrack, "search", search)
+    monkeypatch.setattr("spicier.manager.search.best_node", lambda: None)
+
+    # Concurrent identical searches share one Lavalink request, which is
+    # sent the text as typed
+    results = await asyncio.gather(
+        searches.search("Never Gonna"), searches.search("never  gonna ")
+    )
+    assert queries == ["Never Gonna"]
+    assert [track.id for track in results] == ["encoded", "encoded"]
+
+    await searches.close()
+    assert db.search.rows["never gonna"][0] == "encoded"
+
+    assert (await searches.search("NEVER GONNA")).title == "Never Gonna"
+    assert searches.requests.get(tier="memory") == 1
+
+    # Another process finds it in the database
+    other = SearchManager(db, FakeConfig())
+    assert (await other.search("never gonna")).id == "encoded"
+    assert other.requests.get(tier="database") == 1
+    assert queries == ["Never Gonna"]
+
+
+class FakeResponse:
+    status = 200
+
+
+class FakeLoadNode:
+    def __init__(self, data):
+        self.data = data
+
+    async def _get_data(self, endpoint, params):
+        return self.data, FakeResponse()
+
+
+@pytest.mark.asyncio
+async def test_playlist_starts_at_selected_track(monkeypatch):
+    entries = [
+        {"track": f"track{i}", "info": {"title": f"Track {i}", "length": 1000}}
+        for i in range(5)
+    ]
+    data = {
+        "loadType": "PLAYLIST_LOADED",
+        "playlistInfo": {"name": "Mix", "selectedTrack": 2},
+        "tracks": entries,
+    }
+    monkeypatch.setattr("spicier.manager.search.best_node", lambda: FakeLoadNode(data))
+    searches = SearchManager(FakeDatabase(), FakeConfig())
+
+    url = "https://www.youtube.com/watch?v=abc&list=PL123"
+    resolution = await searches.resolve(url)
+
+    assert resolution.playlist == "Mix"
+    assert resolution.tracks[0].id == "track2"
+    assert [entry["track"] for entry in resolution.rest] == [
+        "track3",
+        "track4",
+        "track0",
+        "track1",
+    ]
+
+    # Without a selected track the playlist starts at the top
+    data["playlistInfo"]["selectedTrack"] = -1
+    resolution = await searches.resolve(url)
+
+    assert resolution.tracks[0].id == "track0"
+    assert resolution.total == 5
+    assert resolution.length == 5
+
+
+class FakeMember:
+    def __init__(self, bot=False):
+        self.bot = bot
+
+
+class FakeQueue:
+    def __init__(self):
+        self.is_empty = True
+
+
+class FakePlayer:
+    def __init__(self, guild):
+        self.guild = guild
+        self.channel = type("Channel", (), {"members": [FakeMember(bot=True)]})()
+        self.queue = FakeQueue()
+        self.track = None
+        self.disconnected = False
+
+    async def disconnect(self):
+        self.disconnected = True
+
+
+class FakeGuild:
+    def __init__(self, id):
+        self.id = id
+        self.voice_client = FakePlayer(self)
+
+
+class FakeClient:
+    def __init__(self, guilds):
+        self.guilds = {guild.id: guild for guild in guilds}
+
+    def get_guild(self, id):
+        return self.guilds.get(id)
+
+
+@pytest.mark.asyncio
+async def test_idle_players_are_disconnected():
+    now = 0.0
+    guilds = [FakeGuild(i) for i in range(3)]
+    idle = IdleManager(FakeClient(guilds), FakeConfig(), clock=lambda: now)
+
+    # Alone in the channel, then someone rejoins while a track plays
+    rejoined = guilds[0].voice_client
+    idle.update(rejoined)
+    rejoined.channel.members.append(FakeMember())
+    rejoined.track = "playing"
+    idle.update(rejoined)
+
+    # Idle with an empty queue, then an earlier deadline is added after it
+    for guild in guilds[1:]:
+        guild.voice_client.channel.members.append(FakeMember())
+    idle.update(guilds[1].voice_client)
+    idle.schedule(2, delay=0.01)
+    assert len(idle) == 2
+
+    # Updates while still idle keep the first deadline
+    now = 0.04
+    idle.update(guilds[1].voice_client)
+    assert idle.deadline(1) == FakeConfig.leave_time
+
+    await idle._reap()
+    assert guilds[2].voice_client.disconnected
+    assert not guilds[1].voice_client.disconnected
+
+    now = FakeConfig.leave_time
+    await idle._reap()
+    assert guilds[1].voice_client.disconnected
+    assert not rejoined.disconnected
+    assert len(idle) == 0
+
+
+class FakeVoicePlayer(wavelink.Player):
+    guild = channel = track = position = queue = None
+
+    def __init__(self, guild, tracks):
+        self.guild = guild
+        self.channel = type("Channel", (), {"id": guild.id + 100})()
+        self.queue = tracks
+        self.position = 0
+
+    def is_connected(self):
+        return True
+
+
+@pytest.mark.asyncio
+async def test_queue_saved_only_when_changed():
+    db = FakeDatabase()
+    tracks = [QueueEntry(f"track{i}", f"Track {i}", 60) for i in range(3)]
+    player = FakeVoicePlayer(FakeGuild(1), tracks)
+    player.track = QueueEntry("current", "Current", 60)
+    client = type("Client", (), {"voice_clients": [player], "guilds": []})()
+    queues = QueueManager(client, db, FakeConfig())
+
+    await queues.save()
+    states, rows = db.queue.saves[0]
+    assert states == [(1, 101, 0)]
+    assert [row[2] for row in rows] == ["current", "track0", "track1", "track2"]
+
+    # Unchanged, only the position in the current track is written
+    player.position = 12
+    await queues.save()
+    assert len(db.queue.saves) == 1
+    assert db.queue.elapsed[-1] == {1: 12}
+
+    tracks.append(QueueEntry("track3", "Track 3", 60))
+    await queues.save()
+    assert len(db.queue.saves) == 2
+    assert len(db.queue.saves[1][1]) == 5
+
+    # Restored once, a second node coming up doesn't restore again
+    assert await queues.restore() == []
+    assert await queues.restore() == []
+    assert db.queue.loads == 1
+
+
+class FakeWebsocket:
+    def __init__(self):
+        self.listener = object()
+        self.sent = []
+
+    async def send(self, **data):
+        self.sent.append(data)
+
+
+class FakeLavalinkNode:
+    def __init__(self, identifier):
+        self.identifier = identifier
+        self.connected = True
+        self.stats = None
+        self._players = []
+        self._websocket = FakeWebsocket()
+
+    @property
+    def players(self):
+        return self._players
+
+    def is_connected(self):
+        return self.connected
+
+
+class FailoverPlayer(SpicierPlayer):
+    guild = None
+
+    def __init__(self, guild_id, node):
+        super().__init__(node=node)
+        self.guild = FakeGuild(guild_id)
+
+    async def switch_node(self, node):
+        self.node._players.remove(self)
+        self.node = node
+        node._players.append(self)
+
+
+@pytest.mark.asyncio
+async def test_failover_moves_players_and_releases_them(monkeypatch):
+    primary, backup = FakeLavalinkNode("primary"), FakeLavalinkNode("backup")
+    monkeypatch.setattr(
+        wavelink.NodePool, "_nodes", {"primary": primary, "backup": backup}
+    )
+    players = [FailoverPlayer(guild_id, primary) for guild_id in (1, 2)]
+    nodes = NodeManager(None, FakeConfig())
+    failovers = nodes.failovers.get()
+
+    # Within the grace period Lavalink may still resume the players
+    primary.connected = False
+    await nodes._check(primary)
+    assert primary.players == players
+
+    nodes._down["primary"] -= FakeConfig.failover["grace"]
+    await nodes._check(primary)
+
+    assert primary.players == [] and backup.players == players
+    assert nodes.failovers.get() == failovers + 2
+
+    # Back up, the moved players are destroyed there unless placed there again
+    players[1].node = primary
+    primary._players.append(players[1])
+    primary.connected = True
+    await nodes._check(primary)
+
+    assert primary._websocket.sent == [{"op": "destroy", "guildId": "1"}]
+    assert "primary" not in nodes._down and "primary" not in nodes._moved
+
+
+@pytest.mark.asyncio
+async def test_failover_waits_for_another_node(monkeypatch):
+    primary = FakeLavalinkNode("primary")
+    monkeypatch.setattr(wavelink.NodePool, "_nodes", {"primary": primary})
+    player = FailoverPlayer(1, primary)
+    nodes = NodeManager(None, FakeConfig())
+
+    primary.connected = False
+    await nodes._failover(primary)
+
+    assert primary.players == [player]
+    assert nodes._moved["primary"] == set()
+
+
+def test_classify():
+    assert classify(" never gonna give you up ") == (
+        QueryKind.SEARCH,
+        "never gonna give you up",
+    )
+    assert classify("<https://youtu.be/dQw4w9WgXcQ>") == (
+        QueryKind.URL,
+        "https://youtu.be/dQw4w9WgXcQ",
+    )
+    assert classify("https://www.youtube.com/playlist?list=PL123-abc")[0] is (
+        QueryKind.PLAYLIST
+    )
+    assert classify("https://soundcloud.com/artist/sets/mix")[0] is QueryKind.PLAYLIST
+    assert classify("https://soundcloud.com/artist/track")[0] is QueryKind.URL
+    assert classify("look at https://youtu.be/x")[0] is QueryKind.SEARCH
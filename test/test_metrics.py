@@ -0,0 +1,76 @@
+import logging
+
+import pytest
+
+from spicier.database.executor import Executor
+from spicier.metrics import Metric, Registry
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+def test_histogram():
+    registry = Registry()
+    latency = registry.histogram("query_seconds", "Latency", buckets=(0.1, 1))
+
+    for value in (0.05, 0.05, 0.5, 5):
+        latency.observe(value, statement="get")
+
+    assert latency.count(statement="get") == 4
+    assert latency.quantile(0.5, statement="get") == 0.1
+    assert latency.quantile(0.75, statement="get") == 1
+    assert latency.quantile(1, statement="get") == float("inf")
+    assert latency.count(statement="other") == 0
+
+    text = registry.render()
+    assert 'query_seconds_bucket{statement="get",le="0.1"} 2' in text
+    assert 'query_seconds_bucket{statement="get",le="+Inf"} 4' in text
+    assert 'query_seconds_count{statement="get"} 4' in text
+
+
+def test_register_keeps_series():
+    registry = Registry()
+    registry.counter("rows_total", "Rows").inc(3, statement="get")
+
+    counter = registry.counter("rows_total", "Rows")
+    counter.inc(statement="get")
+
+    assert counter.get(statement="get") == 4
+    assert "# TYPE rows_total counter" in registry.render()
+
+
+def test_metric_needs_samples():
+    with pytest.raises(TypeError):
+        Metric("untyped", "No samples")
+
+
+class FakeConnection:
+    async def fetch(self, query, *args, timeout=None):
+        return [{"id": 1}, {"id": 2}]
+
+    async def fetchrow(self, query, *args, timeout=None):
+        raise ValueError("broken")
+
+
+@pytest.mark.asyncio
+async def test_executor_records_statements(caplog):
+    conn = FakeConnection()
+    executor = Executor(slow_query=60, registry=Registry())
+
+    with caplog.at_level(logging.WARNING, logger="spicier.database"):
+        assert len(await executor.run(conn, "fetch", "server_get", "SELECT")) == 2
+    assert not caplog.records
+
+    with pytest.raises(ValueError):
+        await executor.run(conn, "fetchrow", "server_get", "SELECT")
+
+    assert executor.latency.count(statement="server_get") == 2
+    assert executor.rows.get(statement="server_get") == 2
+    assert executor.errors.get(statement="server_get") == 1
+
+    # Above the threshold the statement is logged as slow
+    executor.slow_query = 0
+    with caplog.at_level(logging.WARNING, logger="spicier.database"):
+        await executor.run(conn, "fetch", "server_get", "SELECT", 1)
+
+    assert "Slow query server_get" in caplog.text
+    assert "1 arguments" in caplog.text
@@ -0,0 +1,116 @@
+from contextlib import asynccontextmanager
+
+import asyncpg
+import pytest
+
+from spicier.database.migrate import Migrator
+from spicier.errors import MigrationError
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.pool.log.append("begin")
+        yield
+        self.pool.log.append("commit")
+
+    async def execute(self, sql, *args):
+        if "schema_migrations" in sql and "CREATE TABLE" in sql:
+            self.pool.created = True
+        elif sql.startswith("INSERT INTO schema_migrations"):
+            self.pool.rows[args[0]] = args[2]
+        elif "pg_advisory_xact_lock" not in sql:
+            self.pool.log.append(sql)
+
+    async def fetchval(self, sql, version):
+        return 1 if version in self.pool.rows else None
+
+
+class FakePool:
+    def __init__(self):
+        self.created = False
+        self.rows = {}
+        self.log = []
+
+    async def fetch(self, sql):
+        if not self.created:
+            raise asyncpg.UndefinedTableError("schema_migrations does not exist")
+
+        return [
+            {"version": version, "checksum": checksum}
+            for version, checksum in self.rows.items()
+        ]
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeConnection(self)
+
+
+def write(path, files):
+    for name, sql in files.items():
+        (path / name).write_text(sql)
+
+
+@pytest.mark.asyncio
+async def test_migrations_apply_in_order(tmp_path):
+    write(
+        tmp_path,
+        {
+            "0010_later.sql": "SELECT 10",
+            "0002_second.sql": "SELECT 2",
+            "0001_first.sql": "SELECT 1",
+            "notes.txt": "ignored",
+        },
+    )
+    pool = FakePool()
+
+    assert await Migrator(pool, str(tmp_path)).run() == 3
+
+    # One transaction per migration
+    assert pool.log == [
+        *("begin", "SELECT 1", "commit"),
+        *("begin", "SELECT 2", "commit"),
+        *("begin", "SELECT 10", "commit"),
+    ]
+    assert sorted(pool.rows) == [1, 2, 10]
+
+
+@pytest.mark.asyncio
+async def test_applied_migrations_are_skipped(tmp_path):
+    write(tmp_path, {"0001_first.sql": "SELECT 1"})
+    pool = FakePool()
+    await Migrator(pool, str(tmp_path)).run()
+
+    write(tmp_path, {"0002_second.sql": "SELECT 2"})
+    pool.log.clear()
+
+    assert await Migrator(pool, str(tmp_path)).run() == 1
+    assert pool.log == ["begin", "SELECT 2", "commit"]
+
+    pool.log.clear()
+    assert await Migrator(pool, str(tmp_path)).run() == 0
+    assert pool.log == []
+
+
+@pytest.mark.asyncio
+async def test_changed_migration_is_rejected(tmp_path):
+    write(tmp_path, {"0001_first.sql": "SELECT 1"})
+    pool = FakePool()
+    await Migrator(pool, str(tmp_path)).run()
+
+    write(tmp_path, {"0001_first.sql": "SELECT 1; SELECT 2"})
+
+    with pytest.raises(MigrationError):
+        await Migrator(pool, str(tmp_path)).run()
+
+
+def test_duplicate_version_is_rejected(tmp_path):
+    write(tmp_path, {"0001_first.sql": "SELECT 1", "001_again.sql": "SELECT 1"})
+
+    with pytest.raises(MigrationError):
+        Migrator(FakePool(), str(tmp_path)).load()
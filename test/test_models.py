@@ -0,0 +1,212 @@
+import base64
+import random
+import struct
+
+import pytest
+
+import wavelink
+from wavelink.queue import WaitQueue
+
+from spicier.models import (
+    IndexedList,
+    PlayerQueue,
+    QueueEntry,
+    SpicierPlayer,
+    best_node,
+    decode_track,
+    playable,
+)
+from spicier.models.track import _text, encode_track
+
+# Example track from the Lavalink documentation
+ENCODED = (
+    "QAAAjQIAJVJpY2sgQXN0bGV5IC0gTmV2ZXIgR29ubmEgR2l2ZSBZb3UgVXAADlJpY2tBc3RsZXlWRVZP"
+    "AAAAAAADPCAAC2RRdzR3OVdnWGNRAAEAK2h0dHBzOi8vd3d3LnlvdXR1YmUuY29tL3dhdGNoP3Y9ZFF3"
+    "NHc5V2dYY1EAB3lvdXR1YmUAAAAAAAAAAA=="
+)
+
+
+def test_decode_track():
+    info = decode_track(ENCODED)
+
+    assert info["title"] == "Rick Astley - Never Gonna Give You Up"
+    assert info["author"] == "RickAstleyVEVO"
+    assert info["length"] == 212000
+    assert info["identifier"] == "dQw4w9WgXcQ"
+    assert info["uri"] == "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    assert info["sourceName"] == "youtube"
+    assert info["isSeekable"] and not info["isStream"]
+
+    assert encode_track(info) == ENCODED
+
+
+def _encode(version: int, *fields: bytes) -> str:
+    body = bytes([version]) + b"".join(fields) + struct.pack(">q", 0)
+    return base64.b64encode(struct.pack(">I", 1 << 30 | len(body)) + body).decode()
+
+
+def test_decode_track_versions():
+    head = (
+        _text("Title"),
+        _text("Author"),
+        struct.pack(">q", 1000),
+        _text("id"),
+        struct.pack(">?", False),
+    )
+    uri = (b"\x01", _text("https://youtu.be/id"))
+
+    # Version 1 has no uri
+    info = decode_track(_encode(1, *head, _text("youtube")))
+    assert info["uri"] is None and info["sourceName"] == "youtube"
+
+    # Version 3 adds a nullable artwork url and ISRC before the source
+    artwork = (b"\x01", _text("https://img/a.jpg"), b"\x00")
+    info = decode_track(_encode(3, *head, *uri, *artwork, _text("youtube")))
+    assert info["uri"] == "https://youtu.be/id"
+    assert info["sourceName"] == "youtube"
+    assert info["title"] == "Title" and info["length"] == 1000
+
+    # Unknown versions fall back to a decodetrack request
+    with pytest.raises(ValueError):
+        decode_track(_encode(4, *head, *uri, _text("youtube")))
+
+
+def test_decode_track_outside_bmp():
+    info = decode_track(ENCODED)
+    info["title"] = "Zażółć 🎵"
+
+    assert decode_track(encode_track(info))["title"] == "Zażółć 🎵"
+
+
+def test_queue_entry():
+    entry = QueueEntry.from_info(ENCODED, {"title": "Rick", "length": 212000}, 1)
+
+    queue = WaitQueue()
+    queue.put(entry)
+
+    track = playable(queue.get())
+    assert isinstance(track, wavelink.Track)
+    assert track.id == ENCODED
+    assert track.uri == "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    assert track.length == entry.length == 212
+
+    # Undecodable entries still play, Lavalink only needs the encoded track
+    broken = QueueEntry("not a track", "Title", 10)
+    assert broken.decode().title == "Title"
+
+
+def test_indexed_list(monkeypatch):
+    random.seed(7)
+    monkeypatch.setattr(IndexedList, "BLOCK", 4)
+
+    items = IndexedList(key=lambda item: item % 10, weight=lambda item: item)
+    expected = []
+
+    for step in range(2000):
+        operation = random.random()
+        index = random.randint(0, len(expected))
+
+        if operation < 0.4:
+            items.insert(index, step)
+            expected.insert(index, step)
+        elif operation < 0.6 and expected:
+            index = min(index, len(expected) - 1)
+            assert items.pop(index) == expected.pop(index)
+        elif operation < 0.7:
+            stop = index + random.randint(0, 10)
+            assert items.remove_range(index, stop) == expected[index:stop]
+            del expected[index:stop]
+        elif operation < 0.75:
+            batch = list(range(step, step + random.randint(0, 10)))
+            items.extend(batch)
+            expected.extend(batch)
+        elif operation < 0.8 and expected:
+            source = random.randrange(len(expected))
+            destination = random.randrange(len(expected))
+            items.move(source, destination)
+            expected.insert(destination, expected.pop(source))
+        else:
+            assert items[index : index + 8] == expected[index : index + 8]
+            assert items.weight_before(index) == sum(expected[:index])
+
+        assert len(items) == len(expected)
+        assert items.total == sum(expected)
+
+    assert list(items) == expected
+    assert set(items.keys) == {item % 10 for item in expected}
+
+
+def test_player_queue():
+    queue = PlayerQueue()
+    entries = [QueueEntry(f"track{i % 3}", f"Track {i}", 60) for i in range(9)]
+    queue.extend(entries)
+
+    assert [entry.title for entry in queue.page(3, 2)] == ["Track 3", "Track 4"]
+    assert queue.has(entries[0])
+    assert queue.duration == 540
+    assert queue.eta(3) == queue.page_duration(0, 3) == 180
+
+    queue.move(8, 0)
+    assert queue[0].title == "Track 8"
+
+    removed = queue.dedupe()
+    assert [entry.title for entry in queue] == ["Track 8", "Track 0", "Track 1"]
+    assert len(removed) == 6
+
+    assert [entry.title for entry in queue.remove(1, 3)] == ["Track 0", "Track 1"]
+    assert queue.get().title == "Track 8"
+    assert queue.is_empty
+
+
+class FakeStats:
+    def __init__(self, players: int, penalty: float):
+        self.players = players
+        self.penalty = type("Penalty", (), {"total": penalty})
+
+
+class FakeNode:
+    """Just enough of a node to create a player without Lavalink"""
+
+    def __init__(self, connected: bool = True, stats: FakeStats = None):
+        self._players = []
+        self.connected = connected
+        self.stats = stats
+
+    @property
+    def players(self) -> list:
+        return self._players
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+
+def test_player_prefetch():
+    player = SpicierPlayer(node=FakeNode())
+    entries = [QueueEntry(ENCODED, f"Track {i}", 60) for i in range(3)]
+    player.queue.extend(entries)
+
+    player.prefetch()
+    prefetched = player._prefetched[1]
+    assert player.next() is prefetched
+
+    # A prefetch for an item no longer first is not used
+    player.prefetch()
+    stale = player._prefetched[1]
+    player.queue.move(1, 0)
+    track = player.next()
+    assert track is not stale and track.id == ENCODED
+    assert player.queue.get() is entries[1]
+
+
+def test_best_node(monkeypatch):
+    busy = FakeNode(stats=FakeStats(players=10, penalty=10))
+    idle = FakeNode(stats=FakeStats(players=0, penalty=0))
+    down = FakeNode(connected=False)
+    monkeypatch.setattr(wavelink.NodePool, "_nodes", {"a": busy, "b": idle, "c": down})
+
+    assert best_node() is idle
+    assert best_node(exclude=idle) is busy
+
+    # Players created since the last stats count against the node
+    idle._players.extend(object() for _ in range(11))
+    assert best_node() is busy
@@ -0,0 +1,435 @@
+import asyncio
+import json
+import logging
+
+import pytest
+from discord.ext import commands
+from wavelink.errors import LoadTrackError
+
+from spicier.cogs.music import MusicCog
+from spicier.cogs.service.music import utils
+from spicier.cogs.service.music.handler import MusicHandler
+from spicier.errors import VoiceConnectionError, WrongArgument
+from spicier.manager.search import QueryKind, Resolution
+from spicier.models import PlayerQueue, QueueEntry
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+class FakeQueue:
+    def __init__(self, player):
+        self.player = player
+        self.chunks = []
+
+    def extend(self, chunk):
+        self.chunks.append(chunk)
+        self.player.on_chunk(len(self.chunks))
+
+
+class FakePlayer:
+    def __init__(self, guild):
+        self.guild = guild
+        self.queue = FakeQueue(self)
+        self.connected = True
+        self.disconnected = False
+        self.on_chunk = lambda count: None
+
+    def is_connected(self):
+        return self.connected
+
+    async def disconnect(self, force=False):
+        self.disconnected = True
+        self.connected = False
+        self.guild.voice_client = None
+
+
+class FakeGuild:
+    def __init__(self):
+        self.voice_client = None
+
+
+def make_player():
+    guild = FakeGuild()
+    guild.voice_client = FakePlayer(guild)
+    return guild.voice_client
+
+
+def playlist(count):
+    rest = [
+        {"track": f"track{i}", "info": {"title": f"Track {i}", "length": 1000}}
+        for i in range(count)
+    ]
+    return Resolution(QueryKind.PLAYLIST, rest=rest)
+
+
+def make_handler(searches=None):
+    return MusicHandler(None, logging.getLogger("test"), searches)
+
+
+@pytest.mark.asyncio
+async def test_enqueue_rest_in_chunks():
+    player = make_player()
+    reported = []
+
+    async def progress(loaded):
+        reported.append(loaded)
+
+    loaded = await make_handler().enqueue_rest(
+        player, playlist(10), 7, progress, chunk_size=3, interval=60
+    )
+
+    assert loaded == 10
+    assert [len(chunk) for chunk in player.queue.chunks] == [3, 3, 3, 1]
+
+    entries = [entry for chunk in player.queue.chunks for entry in chunk]
+    assert [entry.id for entry in entries] == [f"track{i}" for i in range(10)]
+    assert {entry.requester for entry in entries} == {7}
+    assert reported == [10]
+
+
+@pytest.mark.asyncio
+async def test_enqueue_rest_stops_without_player():
+    async def progress(loaded):
+        pass
+
+    # Disconnected after the second chunk
+    player = make_player()
+
+    def disconnect(count):
+        player.connected = count < 2
+
+    player.on_chunk = disconnect
+
+    await make_handler().enqueue_rest(player, playlist(10), 7, progress, chunk_size=3)
+    assert len(player.queue.chunks) == 2
+
+    # Replaced by a new player after the first chunk
+    player = make_player()
+
+    def replace(count):
+        player.guild.voice_client = FakePlayer(player.guild)
+
+    player.on_chunk = replace
+
+    await make_handler().enqueue_rest(player, playlist(10), 7, progress, chunk_size=3)
+    assert len(player.queue.chunks) == 1
+
+
+class FakeContext:
+    """Context of a play command from someone in a voice channel"""
+
+    def __init__(self, join):
+        self.guild = FakeGuild()
+        self.author = self
+        self.voice = self
+        self.channel = self
+        self.id = 1
+        self._join = join
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+    async def connect(self, cls):
+        await self._join()
+        self.guild.voice_client = FakePlayer(self.guild)
+        return self.guild.voice_client
+
+
+class FakeSearches:
+    def __init__(self, resolve):
+        self.resolve = resolve
+
+
+@pytest.mark.asyncio
+async def test_failed_resolve_leaves_the_channel():
+    async def join():
+        pass
+
+    async def resolve(track):
+        await asyncio.sleep(0.01)
+        raise LoadTrackError({"exception": {"message": "unavailable"}})
+
+    ctx = FakeContext(join)
+
+    with pytest.raises(WrongArgument):
+        await make_handler(FakeSearches(resolve)).play(ctx, "song", None, None)
+
+    assert ctx.voice_client is None
+
+
+@pytest.mark.asyncio
+async def test_failed_join_cancels_the_resolve():
+    resolving = asyncio.Event()
+    cancelled = False
+
+    async def join():
+        await resolving.wait()
+        raise VoiceConnectionError(message="No permission to join.")
+
+    async def resolve(track):
+        nonlocal cancelled
+        resolving.set()
+
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+
+    ctx = FakeContext(join)
+
+    with pytest.raises(VoiceConnectionError):
+        await make_handler(FakeSearches(resolve)).play(ctx, "song", None, None)
+
+    assert cancelled
+    assert ctx.voice_client is None
+
+
+class FakePlaylistTable:
+    def __init__(self, rows, on_row=lambda count: None):
+        self.rows = rows
+        self.on_row = on_row
+        self.deleted = []
+
+    async def get(self, user_id, name):
+        return {"id": 5}
+
+    async def tracks(self, playlist_id):
+        for count, row in enumerate(self.rows):
+            self.on_row(count)
+            yield row
+
+    async def delete(self, user_id, name):
+        self.deleted.append(name)
+        return True
+
+
+class FakePlayingPlayer:
+    def __init__(self, guild=None):
+        self.guild = guild
+        self.queue = PlayerQueue()
+        self.track = None
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    def next(self):
+        return self.queue.get()
+
+    async def play(self, track):
+        self.track = track
+
+
+def playlist_rows(count):
+    return [
+        {
+            "track": f"track{i}",
+            "info": json.dumps({"title": f"Track {i}", "length": 60000}),
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_playlist_load_keeps_order():
+    rows = playlist_rows(4)
+    ctx = FakeContext(None)
+    ctx.guild.voice_client = player = FakePlayingPlayer(ctx.guild)
+
+    vc, count = await make_handler().playlist_load(ctx, FakePlaylistTable(rows), "mix")
+
+    assert vc is player and count == 4
+
+    # The first row plays right away, the rest are queued in order
+    assert isinstance(player.track, QueueEntry)
+    assert player.track.id == "track0"
+    assert [entry.id for entry in player.queue] == ["track1", "track2", "track3"]
+    assert [entry.title for entry in player.queue] == ["Track 1", "Track 2", "Track 3"]
+    assert {entry.length for entry in player.queue} == {60}
+    assert {entry.requester for entry in player.queue} == {ctx.author.id}
+
+
+@pytest.mark.asyncio
+async def test_playlist_load_stops_without_player():
+    ctx = FakeContext(None)
+    ctx.guild.voice_client = player = FakePlayingPlayer(ctx.guild)
+
+    # Disconnected after the second row
+    def disconnect(count):
+        player.connected = count < 2
+
+    table = FakePlaylistTable(playlist_rows(5), disconnect)
+    _, count = await make_handler().playlist_load(ctx, table, "mix")
+    assert count == 2
+
+    # Replaced by a new player after the first row
+    ctx.guild.voice_client = player = FakePlayingPlayer(ctx.guild)
+
+    def replace(count):
+        if count == 1:
+            ctx.guild.voice_client = FakePlayingPlayer(ctx.guild)
+
+    table = FakePlaylistTable(playlist_rows(5), replace)
+    _, count = await make_handler().playlist_load(ctx, table, "mix")
+    assert count == 1
+    assert player.track.id == "track0"
+    assert ctx.guild.voice_client.track is None
+
+
+@pytest.mark.asyncio
+async def test_playlist_delete_checks_name():
+    ctx = FakeContext(None)
+    table = FakePlaylistTable([])
+
+    with pytest.raises(WrongArgument):
+        await make_handler().playlist_delete(ctx, table, "x" * 51)
+
+    assert table.deleted == []
+
+
+class FakeSkipPlayer(FakePlayingPlayer):
+    def __init__(self, tracks):
+        super().__init__()
+        self.guild = FakeGuild()
+        self.guild.id = 1
+        self.guild.voice_client = self
+        self.track = tracks[0]
+        self.queue.extend(tracks[1:])
+        self.ended_at = None
+
+    async def stop(self):
+        self.track = None
+
+
+class FakeManager:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class FakeCog:
+    """What the track end listener uses of the cog"""
+
+    def __init__(self):
+        self.bot = FakeManager()
+        self.bot.skip_manager = self.bot.history_manager = FakeManager()
+        self.bot.idle_manager = FakeManager()
+        self.server_manager = self
+        self.gap = FakeManager()
+        self.messages = []
+
+    async def get_channel(self, guild_id):
+        return None
+
+    async def message_queue_empty(self, channel):
+        self.messages.append("empty")
+
+    async def message_next_track(self, channel, player, track):
+        self.messages.append(track.id)
+
+
+@pytest.mark.asyncio
+async def test_force_skip_moves_queue_by_one():
+    entries = [QueueEntry(f"track{i}", f"Track {i}", 60) for i in range(4)]
+    player = FakeSkipPlayer(entries)
+    ctx = FakeContext(None)
+    ctx.guild = player.guild
+    cog = FakeCog()
+
+    async def force_skip():
+        skipped = await make_handler().force_skip(ctx)
+
+        # Lavalink reports the stopped track once the stop went through
+        await MusicCog.on_wavelink_track_end(cog, player, skipped, "STOPPED")
+
+    await force_skip()
+    assert player.track.id == "track1"
+    assert [entry.id for entry in player.queue] == ["track2", "track3"]
+
+    await force_skip()
+    await force_skip()
+    assert player.track.id == "track3"
+    assert player.queue.is_empty
+    assert cog.messages == ["track1", "track2", "track3"]
+
+
+class FakeMember:
+    def __init__(self, id, roles=(), manage=False):
+        self.id = id
+        self.roles = [FakeRole(name) for name in roles]
+        self.guild_permissions = FakePermissions(manage)
+        self.voice = None
+
+
+class FakeRole:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakePermissions:
+    def __init__(self, manage_channels):
+        self.manage_channels = manage_channels
+
+
+class FakeConfig:
+    skip = {"vote": True, "dj_role": "DJ"}
+
+
+class FakeBot:
+    config = FakeConfig()
+
+
+class FakeMemberContext:
+    """Context of a command from the member while the player plays a track"""
+
+    def __init__(self, member, requester=1):
+        self.bot = FakeBot()
+        self.author = member
+        self.guild = FakeGuild()
+        self.guild.id = 1
+        self.guild.voice_client = FakeSkipPlayer([QueueEntry("a", "A", 60, requester)])
+
+        # The playing track is decoded from the queue entry
+        player = self.guild.voice_client
+        player.track = player.track.decode()
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+
+@pytest.mark.asyncio
+async def test_force_skip_needs_requester_or_dj():
+    assert await utils.dj_check(FakeMemberContext(FakeMember(1)))
+    assert await utils.dj_check(FakeMemberContext(FakeMember(2, roles=["DJ"])))
+    assert await utils.dj_check(FakeMemberContext(FakeMember(2, manage=True)))
+
+    assert not await utils.dj_check(FakeMemberContext(FakeMember(2)))
+    assert not await utils.dj_check(FakeMemberContext(FakeMember(2, roles=["Fan"])))
+
+
+class FakeVoteCog:
+    def __init__(self):
+        self.config = FakeConfig()
+        self.handler = make_handler()
+        self.bot = FakeManager()
+        self.bot.skip_manager = self
+
+        self.votes = []
+
+    def vote(self, *args):
+        self.votes.append(args)
+        return 1, 2
+
+
+@pytest.mark.asyncio
+async def test_vote_skip_needs_listener():
+    cog = FakeVoteCog()
+    ctx = FakeMemberContext(FakeMember(2))
+
+    # Not in the player's channel
+    with pytest.raises(commands.CheckFailure):
+        await MusicCog.skip_command.callback(cog, ctx, None)
+
+    assert cog.votes == []
@@ -0,0 +1,101 @@
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import pytest
+
+from spicier.database.executor import Executor
+from spicier.database.tables import HistoryTable, PlaylistTable
+from spicier.metrics import Registry
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+class FakeConnection:
+    """Keeps copied rows per table, the cursor returns them by position"""
+
+    def __init__(self):
+        self.tables = {}
+        self.queries = []
+
+    @asynccontextmanager
+    async def transaction(self, **options):
+        yield
+
+    async def fetchrow(self, query, *args, timeout=None):
+        self.queries.append(query)
+        return {"id": 5}
+
+    async def fetch(self, query, *args, timeout=None):
+        self.queries.append(query)
+
+        if "DELETE FROM playlist_track" in query:
+            self.tables["playlist_track"] = []
+        return []
+
+    async def copy_records_to_table(self, table, records, columns, timeout=None):
+        self.tables.setdefault(table, []).extend(
+            dict(zip(columns, record)) for record in records
+        )
+
+    async def cursor(self, query, *args, prefetch=None, timeout=None):
+        rows = [
+            row for row in self.tables["playlist_track"] if row["playlist"] == args[0]
+        ]
+
+        for row in sorted(rows, key=lambda row: row["position"]):
+            yield row
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.conn = FakeConnection()
+        self.executor = Executor(registry=Registry())
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+    def timeout(self, name):
+        return None
+
+
+def at(minute: int) -> datetime:
+    return datetime(2024, 1, 1, 12, minute, tzinfo=timezone.utc)
+
+
+def test_history_rollup():
+    records = [
+        (1, "a", "A", "uri-a", 100.0, at(0)),
+        (2, "a", "A", "uri-a", 50.0, at(1)),
+        (1, "b", "B", None, 30.0, at(2)),
+        (1, "a", "A (live)", "uri-a2", 80.0, at(3)),
+        (1, "a", "A", "uri-a", 20.0, at(1)),
+    ]
+
+    top, total = HistoryTable.rollup(records)
+
+    # The same track in two guilds is counted apart, the latest play names it
+    assert sorted(top) == [
+        (1, "a", "A (live)", "uri-a2", 3, 200.0, at(3)),
+        (1, "b", "B", None, 1, 30.0, at(2)),
+        (2, "a", "A", "uri-a", 1, 50.0, at(1)),
+    ]
+    assert sorted(total) == [(1, 4, 230.0), (2, 1, 50.0)]
+
+
+@pytest.mark.asyncio
+async def test_playlist_save_and_stream():
+    db = FakeDatabase()
+    table = PlaylistTable(db, "playlist")
+    tracks = [(f"track{i}", {"title": f"Track {i}", "length": 1000}) for i in range(5)]
+
+    await table.save(1, "mix", tracks)
+    await table.save(1, "mix", tracks[::-1])
+
+    # Saving again replaces the tracks instead of adding to them
+    records = [record async for record in table.tracks(5)]
+    assert [record["track"] for record in records] == [
+        f"track{i}" for i in range(4, -1, -1)
+    ]
+    assert json.loads(records[0]["info"]) == {"title": "Track 4", "length": 1000}